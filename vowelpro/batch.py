@@ -0,0 +1,154 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os.path
+import sys
+from vowelpro.vowel import FILE_TYPES, FORMANTS, VOWELS, get_file_ext, rate_vowel
+
+
+JOB_FIELDS = ('file', 'vowel', 'dialect', 'file_type')
+
+
+def make_job(job, vowel=None, dialect=None):
+
+    """
+    Normalize a job to a dict with `file`, `vowel`, `dialect` and `file_type`.
+
+    `job` may be a dict or a (file, vowel, dialect[, file_type]) sequence.
+    `vowel` and `dialect` fill in whatever the job leaves out. Any other
+    keys of a dict (eg. `speaker`) are kept as they are.
+    """
+
+    if not isinstance(job, dict):
+        job = dict(zip(JOB_FIELDS, job))
+
+    normalized = dict(job)
+    normalized.update({
+        'file': job.get('file') or None,
+        'vowel': job.get('vowel') or vowel,
+        'dialect': job.get('dialect') or dialect,
+        'file_type': job.get('file_type') or None
+    })
+    return normalized
+
+
+def get_job_file(job):
+
+    """
+    Get the file of a job, raising if it has none (eg. a manifest row with
+    an empty `file`).
+    """
+
+    if not job['file']:
+        raise Exception('No file given.')
+    return job['file']
+
+
+def rate_job(job):
+
+    """
+    Rate a single job. Errors are reported in the result rather than raised
+    so that one bad file does not abort a batch.
+    """
+
+    result = {
+        'file': job['file'],
+        'vowel': job['vowel'],
+        'dialect': job['dialect']
+    }
+
+    try:
+        result['rating'] = rate_vowel(get_job_file(job), job['vowel'], job['dialect'], job['file_type'])
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+
+def rate_vowels(jobs, workers=None):
+
+    """
+    Rate many vowels, yielding results in completion order.
+
+    Jobs are spread over a pool of `workers` processes (one per CPU by
+    default). With a single worker they are rated in this process.
+    """
+
+    jobs = (make_job(job) for job in jobs)
+    workers = workers or multiprocessing.cpu_count()
+
+    if workers == 1:
+        for job in jobs:
+            yield rate_job(job)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(rate_job, jobs):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def read_manifest(manifest_path, vowel=None, dialect=None):
+
+    """
+    Read jobs from a CSV (with a file,vowel,dialect header) or JSONL
+    manifest. Relative file paths are taken relative to the manifest. Rows
+    without a file are kept, to be reported as errors when rated.
+    """
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    with open(manifest_path, 'rb') as f:
+        if get_file_ext(manifest_path) == 'csv':
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    jobs = []
+    for row in rows:
+        job = make_job(row, vowel, dialect)
+        if job['file']:
+            job['file'] = os.path.join(manifest_dir, job['file'])
+        jobs.append(job)
+
+    return jobs
+
+
+def read_directory(directory, vowel, dialect):
+
+    """
+    Get a job for every audio file in a directory.
+    """
+
+    return [
+        make_job((os.path.join(directory, filename), vowel, dialect))
+        for filename in sorted(os.listdir(directory))
+        if get_file_ext(filename) in FILE_TYPES
+    ]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Rate many English vowels, writing one JSON result per line in completion order.')
+    parser.add_argument('source', help='Manifest (CSV with a file,vowel,dialect header, or JSONL with the same keys) or directory of files to rate.')
+    parser.add_argument('--vowel', help='Vowel for directories and manifest rows without one. Must be one of: %s' % VOWELS.keys())
+    parser.add_argument('--dialect', help='Dialect for directories and manifest rows without one. Must be one of: %s' % FORMANTS.keys())
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: one per CPU).')
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        if not (args.vowel and args.dialect):
+            parser.error('--vowel and --dialect are required when rating a directory.')
+        jobs = read_directory(args.source, args.vowel, args.dialect)
+    else:
+        jobs = read_manifest(args.source, args.vowel, args.dialect)
+
+    for result in rate_vowels(jobs, args.workers):
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
@@ -0,0 +1,269 @@
+"""
+Microbenchmarks for each stage of the analysis.
+
+Every stage is timed over the test recordings (surrounded by low noise so
+that they segment like words) and over synthetic long and high sample rate
+recordings. Results can be saved as a JSON baseline, and later runs
+compared against it:
+
+    PYTHONPATH=. python -m vowelpro.bench --save bench.json
+    PYTHONPATH=. python -m vowelpro.bench --baseline bench.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import timeit
+import wave
+import numpy as np
+from vowelpro.vowel import Signal, decimate, get_chunked_formants, get_formants, get_signal, rate_vowel, read_file, trim_silence
+
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test', 'files')
+
+STAGES = ('read_file', 'get_signal', 'trim_silence', 'Signal', 'get_humps', 'get_main_vowel_signal', 'get_formants', 'get_chunked_formants', 'rate_vowel')
+
+# Each timed sample loops over a fast stage for at least this long (in
+# seconds), to stay well above the timer's resolution.
+MIN_SAMPLE_SEC = 1e-3
+
+# Slowdowns below this (in seconds) and peak memory increases below this
+# (in kB) are noise, not regressions.
+TIME_SLACK_SEC = 20e-6
+MEMORY_SLACK_KB = 1024
+
+
+def make_word(signal, fs, duration=None):
+
+    """
+    Surround a vowel with low noise, a quarter of a second on each side or
+    centered in `duration` seconds.
+    """
+
+    pad = fs / 4
+    if duration:
+        pad = max(int(duration * fs) - len(signal), 0) / 2
+    noise = (np.random.RandomState(0).randn(2 * pad) * 30).astype(np.int16)
+    return np.concatenate((noise[:pad], signal, noise[pad:]))
+
+
+def resample(signal, fs, new_fs):
+    x = np.arange(int(len(signal) * float(new_fs) / fs)) * float(fs) / new_fs
+    return np.interp(x, np.arange(len(signal)), signal).astype(np.int16)
+
+
+def write_wav(path, signal, fs):
+    w = wave.open(path, 'wb')
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(fs)
+    w.writeframes(signal.astype('<i2').tostring())
+    w.close()
+
+
+def write_word(path, vowel_file):
+
+    """
+    Write a WAV recording of a vowel (eg. a test file, which holds only the
+    vowel) surrounded by low noise (see make_word), so that it segments
+    like a word.
+    """
+
+    signal, fs = get_signal(vowel_file, 'wav')
+    write_wav(path, make_word(signal, fs), fs)
+
+
+def make_cases(directory, files_dir=TEST_FILES_DIR):
+
+    """
+    Write the benchmark recordings to `directory`. Returns a list of
+    (name, path, signal, fs).
+    """
+
+    cases = []
+
+    def add(name, signal, fs):
+        path = os.path.join(directory, name + '.wav')
+        write_wav(path, signal, fs)
+        cases.append((name, path, signal, fs))
+
+    for filename in sorted(os.listdir(files_dir)):
+        if not filename.endswith('.wav'):
+            continue
+        signal, fs = get_signal(os.path.join(files_dir, filename), 'wav')
+        name = os.path.splitext(filename)[0]
+        add(name, make_word(signal, fs), fs)
+
+        # Synthetic cases, from the first recording.
+        if len(cases) == 1:
+            add('long', make_word(signal, fs, duration=10.), fs)
+            add('48khz', make_word(resample(signal, fs, 48000), 48000), 48000)
+
+    return cases
+
+
+def get_stages(path, signal, fs):
+
+    """
+    Get (name, function) pairs timing each stage on a recording. Work the
+    stage depends on is done here, outside of the timing.
+    """
+
+    vowel_signal, vowel_fs = decimate(Signal(signal, fs).get_main_vowel_signal(), fs)
+
+    return [
+        ('read_file', lambda: read_file(path, 'wav')),
+        ('get_signal', lambda: get_signal(path, 'wav')),
+        ('trim_silence', lambda: trim_silence(signal, fs)),
+        ('Signal', lambda: Signal(signal, fs)),
+        ('get_humps', lambda: Signal(signal, fs).get_humps()),
+        ('get_main_vowel_signal', lambda: Signal(signal, fs).get_main_vowel_signal()),
+        ('get_formants', lambda: get_formants(vowel_signal, vowel_fs)),
+        ('get_chunked_formants', lambda: get_chunked_formants(signal, fs, fs / 100)),
+        ('rate_vowel', lambda: rate_vowel(path, 'ae', 'california', 'wav'))
+    ]
+
+
+def time_stage(function, repeat):
+
+    """
+    Time `repeat` samples of a function, after a warm-up call. Fast
+    functions are called several times per sample (see MIN_SAMPLE_SEC).
+    Returns the mean, median and 95th percentile time per call, in seconds.
+    """
+
+    start = timeit.default_timer()
+    function()
+    number = int(min(max(MIN_SAMPLE_SEC / max(timeit.default_timer() - start, 1e-9), 1), 1000))
+
+    times = []
+    for i in xrange(repeat):
+        start = timeit.default_timer()
+        for j in xrange(number):
+            function()
+        times.append((timeit.default_timer() - start) / number)
+    return float(np.mean(times)), float(np.median(times)), float(np.percentile(times, 95))
+
+
+def read_status(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+
+def measure_memory(function, connection):
+    try:
+        # Reset the peak resident size (Linux), so that it reflects this
+        # call only.
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        start = read_status('VmRSS')
+        function()
+        peak = read_status('VmHWM')
+    except IOError:
+        start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        function()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connection.send(max(peak - start, 0))
+    connection.close()
+
+
+def get_peak_memory(function):
+
+    """
+    Get how much a call of a function raises peak resident memory, in kB.
+    The call is made in a forked process, so that earlier calls do not
+    hide it.
+    """
+
+    parent, child = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=measure_memory, args=(function, child))
+    process.start()
+    peak = parent.recv()
+    process.join()
+    return peak
+
+
+def run(repeat=20, memory=True, files_dir=TEST_FILES_DIR, out=None):
+
+    """
+    Benchmark every stage on every recording. Returns
+    {case: {stage: {'mean': sec, 'median': sec, 'p95': sec, 'peak_kb': kB}}}.
+    """
+
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        for name, path, signal, fs in make_cases(directory, files_dir):
+            results[name] = {}
+            for stage, function in get_stages(path, signal, fs):
+                mean, median, p95 = time_stage(function, repeat)
+                result = {'mean': mean, 'median': median, 'p95': p95}
+                if memory:
+                    result['peak_kb'] = get_peak_memory(function)
+                results[name][stage] = result
+                if out:
+                    out.write('%-8s %-22s mean %9.3f ms  p95 %9.3f ms%s\n' % (
+                        name, stage, mean * 1000, p95 * 1000,
+                        '  peak %7d kB' % result['peak_kb'] if memory else ''))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+
+    """
+    Compare results with a baseline. Returns a list of regressions, as
+    (case, stage, measure, baseline value, value), where a stage's median
+    time (steadier than the mean) or peak memory grew by more than
+    `tolerance` (a fraction). Cases and stages missing from either side are
+    skipped.
+    """
+
+    regressions = []
+    for case in sorted(results):
+        for stage in STAGES:
+            result = results[case].get(stage)
+            expected = baseline.get(case, {}).get(stage)
+            if not result or not expected:
+                continue
+            if result['median'] > max(expected['median'] * (1. + tolerance), expected['median'] + TIME_SLACK_SEC):
+                regressions.append((case, stage, 'median', expected['median'], result['median']))
+            if 'peak_kb' in result and 'peak_kb' in expected:
+                if result['peak_kb'] > max(expected['peak_kb'] * (1. + tolerance), expected['peak_kb'] + MEMORY_SLACK_KB):
+                    regressions.append((case, stage, 'peak_kb', expected['peak_kb'], result['peak_kb']))
+    return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark each stage of the vowel analysis.')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed calls per stage and recording (default: 20).')
+    parser.add_argument('--no-memory', action='store_true', help='Skip peak memory measurement.')
+    parser.add_argument('--save', help='Write the results to this JSON file, as a baseline.')
+    parser.add_argument('--baseline', help='Compare the results with this JSON baseline, exiting with an error on regression.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown or memory growth over the baseline, as a fraction (default: 0.25).')
+
+    args = parser.parse_args()
+
+    results = run(args.repeat, not args.no_memory, out=sys.stdout)
+
+    if args.save:
+        with open(args.save, 'wb') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, 'rb') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for case, stage, measure, expected, actual in regressions:
+            sys.stderr.write('Regression: %s %s %s %g -> %g\n' % (case, stage, measure, expected, actual))
+        if regressions:
+            sys.exit(1)
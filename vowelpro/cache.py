@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def hash_file(f, chunk_size=1 << 16, copy_to=None):
+
+    """
+    Get the SHA-1 hex digest of a file object's contents, optionally
+    copying them to another file object in the same pass.
+    """
+
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        digest.update(chunk)
+        if copy_to is not None:
+            copy_to.write(chunk)
+    return digest.hexdigest()
+
+
+class LRUCache(object):
+
+    """
+    Thread-safe least-recently-used cache of JSON-serializable values.
+
+    Bounded both by entry count and by total size (of the values as JSON).
+    When `path` is given, values are also written there, one file per key,
+    and read back on a memory miss, so they survive restarts. The directory
+    itself is not size bounded.
+    """
+
+    suffix = '.json'
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if path and not os.path.isdir(path):
+            os.makedirs(path)
+
+
+    def get(self, key):
+
+        """
+        Get a cached value, or None.
+        """
+
+        with self.lock:
+            if key in self.entries:
+                value, size = self.entries.pop(key)
+                self.entries[key] = (value, size)
+                self.hits += 1
+                return value
+
+        value = self.read(key)
+
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        self.put(key, value, persist=False)
+        return value
+
+
+    def put(self, key, value, persist=True):
+        data = self.dumps(value)
+
+        if persist and self.path:
+            self.write(key, data)
+
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+
+            if len(data) > self.max_bytes:
+                return
+
+            self.entries[key] = (value, len(data))
+            self.bytes += len(data)
+
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest_key, (oldest_value, oldest_size) = self.entries.popitem(last=False)
+                self.bytes -= oldest_size
+
+
+    def dumps(self, value):
+        return json.dumps(value)
+
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+    def get_file_path(self, key):
+        return os.path.join(self.path, key + self.suffix)
+
+
+    def read(self, key):
+        if not self.path:
+            return None
+        try:
+            with open(self.get_file_path(key), 'rb') as f:
+                return self.loads(f.read())
+        except (IOError, ValueError):
+            return None
+
+
+    def write(self, key, data):
+        # Write then rename so that readers never see a partial file.
+        handle, temp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.rename(temp_path, self.get_file_path(key))
+
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class BytesLRUCache(LRUCache):
+
+    """
+    LRUCache of byte strings (eg. rendered images), kept as they are.
+    """
+
+    suffix = '.bin'
+
+    def dumps(self, value):
+        return value
+
+
+    def loads(self, data):
+        return data
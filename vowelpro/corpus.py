@@ -0,0 +1,231 @@
+"""
+Pre-decoded corpora, for re-scoring many recordings (eg. after changing
+FORMANTS or the segmentation) without decoding them again.
+
+A corpus is two files: `<name>.pcm`, the int16 samples of all recordings
+back to back, and `<name>.jsonl`, the index, one line per recording with
+its `offset` and `length` (in samples), `fs`, and the manifest's `file`,
+`vowel`, `dialect` and any other metadata (eg. `speaker`). The samples are
+memory mapped when reading, so recordings are handed to the analysis as
+views, without reading or copying them:
+
+    PYTHONPATH=. python -m vowelpro.corpus pack manifest.csv corpus
+    PYTHONPATH=. python -m vowelpro.corpus rate corpus --workers 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os.path
+import sys
+import numpy as np
+from vowelpro.batch import get_job_file, make_job, read_directory, read_manifest
+from vowelpro.vowel import FORMANTS, VOWELS, get_signal, rate_signal, validate_file_type
+
+
+SAMPLE_DTYPE = np.dtype('<i2')
+
+# Index keys that locate a recording in the samples, rather than describe it.
+LOCATION_KEYS = ('offset', 'length', 'fs')
+
+
+def get_paths(corpus_path):
+    return corpus_path + '.pcm', corpus_path + '.jsonl'
+
+
+def decode_job(job):
+
+    """
+    Decode a job's file, in full. Returns the job and its signal and sample
+    rate, or the error.
+    """
+
+    try:
+        file_type = validate_file_type(get_job_file(job), job['file_type'])
+        signal, fs = get_signal(job['file'], file_type, max_duration=None)
+        return job, signal, fs, None
+    except Exception as e:
+        return job, None, None, str(e)
+
+
+def pack(jobs, corpus_path, workers=None):
+
+    """
+    Decode recordings (jobs, as for batch.rate_vowels) into a corpus at
+    `corpus_path`. Files are decoded by a pool of `workers` processes (one
+    per CPU by default) and written in the order of the jobs.
+
+    Returns the number of recordings packed and a list of (file, error)
+    for those that could not be decoded.
+    """
+
+    jobs = (make_job(job) for job in jobs)
+    workers = workers or multiprocessing.cpu_count()
+    samples_path, index_path = get_paths(corpus_path)
+
+    pool = None
+    if workers == 1:
+        decoded = (decode_job(job) for job in jobs)
+    else:
+        pool = multiprocessing.Pool(workers)
+        decoded = pool.imap(decode_job, jobs)
+
+    count = 0
+    offset = 0
+    errors = []
+    try:
+        with open(samples_path, 'wb') as samples_file, open(index_path, 'wb') as index_file:
+            for job, signal, fs, error in decoded:
+                if error is not None:
+                    errors.append((job['file'], error))
+                    continue
+                signal.astype(SAMPLE_DTYPE).tofile(samples_file)
+                entry = dict(job)
+                entry.update({
+                    'offset': offset,
+                    'length': len(signal),
+                    'fs': fs
+                })
+                index_file.write(json.dumps(entry, sort_keys=True) + '\n')
+                offset += len(signal)
+                count += 1
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return count, errors
+
+
+class Corpus(object):
+
+    """
+    A packed corpus (see pack), memory mapped.
+    """
+
+    def __init__(self, corpus_path):
+        samples_path, index_path = get_paths(corpus_path)
+        with open(index_path, 'rb') as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+        if os.path.getsize(samples_path):
+            self.samples = np.memmap(samples_path, dtype=SAMPLE_DTYPE, mode='r')
+        else:
+            # Empty files cannot be mapped.
+            self.samples = np.zeros(0, dtype=SAMPLE_DTYPE)
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def get_signal(self, index):
+
+        """
+        Get a recording's signal (a view of the mapped samples) and sample
+        rate.
+        """
+
+        entry = self.entries[index]
+        return self.samples[entry['offset']:entry['offset'] + entry['length']], entry['fs']
+
+
+    def get_metadata(self, index):
+        return dict((key, value) for key, value in self.entries[index].items() if not key in LOCATION_KEYS)
+
+
+CORPUS = None
+
+
+def open_corpus(corpus_path):
+
+    """
+    Worker initializer: map the corpus once per worker process.
+    """
+
+    global CORPUS
+    CORPUS = Corpus(corpus_path)
+
+
+def rate_entry(args):
+
+    """
+    Rate a recording of the worker's corpus. As in batch.rate_job, errors
+    are reported in the result.
+    """
+
+    index, vowel, dialect = args
+    result = CORPUS.get_metadata(index)
+    result['vowel'] = vowel or result.get('vowel')
+    result['dialect'] = dialect or result.get('dialect')
+
+    try:
+        signal, fs = CORPUS.get_signal(index)
+        result['rating'] = rate_signal(signal, fs, result['vowel'], result['dialect'])
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+
+def rate_corpus(corpus_path, workers=None, vowel=None, dialect=None):
+
+    """
+    Rate every recording of a corpus, yielding results (with the
+    recordings' metadata) in completion order, as batch.rate_vowels does.
+    `vowel` and `dialect` override those of the index.
+    """
+
+    workers = workers or multiprocessing.cpu_count()
+    jobs = ((index, vowel, dialect) for index in xrange(len(Corpus(corpus_path))))
+
+    if workers == 1:
+        open_corpus(corpus_path)
+        for job in jobs:
+            yield rate_entry(job)
+        return
+
+    pool = multiprocessing.Pool(workers, initializer=open_corpus, initargs=(corpus_path,))
+    try:
+        for result in pool.imap_unordered(rate_entry, jobs, chunksize=16):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Pack recordings into a pre-decoded corpus, or rate a corpus.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    pack_parser = subparsers.add_parser('pack', help='Decode recordings into a corpus.')
+    pack_parser.add_argument('source', help='Manifest (CSV or JSONL, as for vowelpro.batch) or directory of files to pack.')
+    pack_parser.add_argument('corpus', help='Corpus path, without extension.')
+    pack_parser.add_argument('--vowel', help='Vowel for directories and manifest rows without one. Must be one of: %s' % VOWELS.keys())
+    pack_parser.add_argument('--dialect', help='Dialect for directories and manifest rows without one. Must be one of: %s' % FORMANTS.keys())
+    pack_parser.add_argument('--workers', type=int, default=None, help='Number of decoding processes (default: one per CPU).')
+
+    rate_parser = subparsers.add_parser('rate', help='Rate every recording of a corpus, writing one JSON result per line in completion order.')
+    rate_parser.add_argument('corpus', help='Corpus path, without extension.')
+    rate_parser.add_argument('--vowel', help='Vowel to rate all recordings for, instead of their own.')
+    rate_parser.add_argument('--dialect', help='Dialect to rate all recordings against, instead of their own.')
+    rate_parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: one per CPU).')
+
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        if os.path.isdir(args.source):
+            jobs = read_directory(args.source, args.vowel, args.dialect)
+        else:
+            jobs = read_manifest(args.source, args.vowel, args.dialect)
+        count, errors = pack(jobs, args.corpus, args.workers)
+        for filename, error in errors:
+            sys.stderr.write('%s: %s\n' % (filename, error))
+        sys.stderr.write('Packed %d recordings.\n' % count)
+    else:
+        for result in rate_corpus(args.corpus, args.workers, args.vowel, args.dialect):
+            sys.stdout.write(json.dumps(result) + '\n')
+            sys.stdout.flush()
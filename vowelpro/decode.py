@@ -0,0 +1,295 @@
+"""
+Decoding of compressed recordings (MP3, Ogg) through a warm pool of
+ffmpeg (or avconv) processes.
+
+pydub starts a converter for every file, once its input is written to a
+temporary file, and reads the result back from another. Here converter
+processes are started ahead of time, waiting on their stdin: a file is
+piped into one and its PCM read from its stdout straight into a NumPy
+array, with no temporary files, while a replacement starts on a
+background thread. ffmpeg decodes a single input per process, so a
+process is not reused for another file, but its start-up is kept out of
+the way.
+"""
+
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+import numpy as np
+from vowelpro.wav import parse_header
+
+
+# Converters, in order of preference (as pydub).
+CONVERTERS = ('avconv', 'ffmpeg')
+
+# Processes kept waiting per input format and duration limit.
+SPARES = 2
+
+# Decoded output is read into a buffer of this many bytes, doubled as
+# needed.
+BUFFER_BYTES = 1024 * 1024
+
+# Bytes read from files and written to converters at a time.
+CHUNK_BYTES = 64 * 1024
+
+
+class DecoderUnavailable(Exception):
+    pass
+
+
+def which(program):
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, program)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+
+
+def find_converter():
+    for converter in CONVERTERS:
+        path = which(converter)
+        if path:
+            return path
+
+
+def feed(vowel_file, pipe):
+
+    """
+    Write a file (a path or file object) to a converter's stdin. The
+    converter may stop reading early (once it has decoded enough).
+    """
+
+    try:
+        if isinstance(vowel_file, basestring):
+            with open(vowel_file, 'rb') as f:
+                shutil.copyfileobj(f, pipe, CHUNK_BYTES)
+        else:
+            vowel_file.seek(0)
+            shutil.copyfileobj(vowel_file, pipe, CHUNK_BYTES)
+    except (IOError, OSError):
+        pass
+    finally:
+        try:
+            pipe.close()
+        except (IOError, OSError):
+            pass
+
+
+def read_pcm(pipe):
+
+    """
+    Read a converter's WAV output as int16 samples and their sample rate.
+
+    The output is read into a growing buffer that the samples are then
+    viewed over, without another copy. The data chunk size in the header
+    is ignored: converters writing to a pipe cannot fill it in.
+    """
+
+    buf = bytearray(BUFFER_BYTES)
+    length = 0
+    while True:
+        if length == len(buf):
+            buf.extend(bytearray(len(buf)))
+        read = pipe.readinto(memoryview(buf)[length:])
+        if not read:
+            break
+        length += read
+
+    fmt, offset, data_len = parse_header(bytes(buf[:min(length, 4096)]))
+    if (fmt['channels'], fmt['bits']) != (1, 16):
+        raise Exception('Unexpected converter output (%d channels, %d bits).' % (fmt['channels'], fmt['bits']))
+
+    return np.frombuffer(buf, dtype='<i2', count=(length - offset) // 2, offset=offset), fmt['fs']
+
+
+class DecoderPool(object):
+
+    """
+    Converter processes started ahead of time, `spares` at a time for each
+    input format and duration limit asked for (see decode()), by a
+    background thread.
+
+    Processes are started here and must be used in this process: after a
+    fork, get_decoder_pool() gives the child a pool of its own.
+    """
+
+    def __init__(self, converter=None, spares=SPARES):
+        self.converter = converter or find_converter()
+        self.spares = spares
+        self.idle = {}
+        self.starting = {}
+        self.closed = False
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+
+    def get_args(self, file_type, max_duration=None):
+
+        """
+        Get the converter command line: `file_type` in on stdin, mono
+        16-bit WAV out on stdout, at the input's sample rate. Decoding stops
+        a little past `max_duration` seconds, so that longer files can be
+        told apart.
+        """
+
+        args = [self.converter, '-v', 'error', '-f', file_type, '-i', 'pipe:0', '-vn', '-ac', '1', '-acodec', 'pcm_s16le']
+        if max_duration is not None:
+            args += ['-t', '%g' % (max_duration + 1.)]
+        return args + ['-f', 'wav', 'pipe:1']
+
+
+    def start(self, file_type, max_duration=None):
+        with open(os.devnull, 'wb') as devnull:
+            # Other converters must not hold this one's stdin open.
+            return subprocess.Popen(self.get_args(file_type, max_duration), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=devnull, close_fds=True)
+
+
+    def acquire(self, file_type, max_duration=None):
+
+        """
+        Take a waiting converter process, or start one if none is left, and
+        have replacements started in the background (see refill()). Only
+        when the spares have run out is a process started here.
+        """
+
+        key = (file_type, max_duration)
+        process = None
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            while idle and process is None:
+                process = idle.pop(0)
+                if process.poll() is not None:
+                    process = None
+            needed = self.spares - len(idle) - self.starting.get(key, 0)
+            if needed > 0:
+                self.starting[key] = self.starting.get(key, 0) + needed
+
+        if needed > 0:
+            thread = threading.Thread(target=self.refill, args=(key, needed))
+            thread.daemon = True
+            thread.start()
+
+        if process is None:
+            process = self.start(file_type, max_duration)
+        return process
+
+
+    def refill(self, key, count):
+
+        """
+        Start `count` spare processes for a (file type, duration limit), in
+        a background thread. Failures to start are left for acquire() to
+        raise.
+        """
+
+        for i in xrange(count):
+            try:
+                process = self.start(*key)
+            except OSError:
+                process = None
+            with self.lock:
+                self.starting[key] -= 1
+                if process is not None and not self.closed:
+                    self.idle.setdefault(key, []).append(process)
+                    process = None
+            if process is not None:
+                process.kill()
+                process.wait()
+
+
+    def decode(self, vowel_file, file_type, max_duration=None):
+
+        """
+        Decode a file (a path or file object) as a mono int16 signal.
+        Returns it and its sample rate. At most about `max_duration`
+        seconds (plus one) are decoded.
+        """
+
+        if not self.converter:
+            raise DecoderUnavailable('No ffmpeg or avconv found.')
+        try:
+            process = self.acquire(file_type, max_duration)
+        except OSError as e:
+            raise DecoderUnavailable('Could not start %s: %s' % (self.converter, e))
+
+        feeder = threading.Thread(target=feed, args=(vowel_file, process.stdin))
+        feeder.daemon = True
+        feeder.start()
+        try:
+            signal, fs = read_pcm(process.stdout)
+        except Exception:
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            feeder.join()
+            status = process.wait()
+
+        if status != 0:
+            raise Exception('Decoding failed. %s returned error code %d.' % (os.path.basename(self.converter), status))
+        return signal, fs
+
+
+    def get_idle(self):
+        with self.lock:
+            idle = [process for processes in self.idle.values() for process in processes]
+            self.idle = {}
+        return idle
+
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        for process in self.get_idle():
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+
+    def forget(self):
+
+        """
+        Let go of a pool inherited through fork, closing its pipes (which
+        would otherwise keep its converters from seeing their input end).
+        Its processes are left to the parent.
+        """
+
+        # Not under the lock: it may have been held, at the fork, by a
+        # thread that did not come along.
+        for processes in self.idle.values():
+            for process in processes:
+                process.stdin.close()
+                process.stdout.close()
+        self.idle = {}
+
+
+POOL = None
+POOL_LOCK = threading.Lock()
+
+
+def get_decoder_pool():
+
+    """
+    Get this process's decoder pool, started on first use.
+    """
+
+    global POOL
+    with POOL_LOCK:
+        if POOL is None or POOL.pid != os.getpid():
+            if POOL is not None:
+                POOL.forget()
+            POOL = DecoderPool()
+            atexit.register(POOL.close)
+        return POOL
+
+
+def decode_file(vowel_file, file_type, max_duration=None):
+
+    """
+    Decode a compressed file with this process's decoder pool (see
+    DecoderPool.decode). Raises DecoderUnavailable if there is no converter
+    to decode with.
+    """
+
+    return get_decoder_pool().decode(vowel_file, file_type, max_duration)
@@ -0,0 +1,173 @@
+"""
+Batched linear prediction.
+
+Every function works on the last axis, so a 2-D array of frames (one frame
+per row) is analyzed in a single pass.
+"""
+
+import numpy as np
+
+
+def next_pow_2(n):
+    return 1 << int(max(n - 1, 0)).bit_length()
+
+
+def autocorrelation(x, order):
+
+    """
+    Get the biased autocorrelation of x (divided by its length) for lags
+    0 to order, computed with an FFT. Lags beyond the length of x are 0.
+    """
+
+    x = np.asarray(x, dtype=float)
+    n = x.shape[-1]
+    # Long enough for every lag up to `order` not to wrap around.
+    nfft = next_pow_2(max(2 * n - 1, n + order))
+    spectrum = np.fft.rfft(x, nfft)
+    r = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, nfft)
+    return r[..., :order + 1] / n
+
+
+def levinson(r, order):
+
+    """
+    Levinson-Durbin recursion.
+
+    Solves the Toeplitz normal equations defined by the autocorrelation r
+    for the order + 1 prediction polynomial coefficients (a[0] is 1).
+    Returns the coefficients, the prediction error and the reflection
+    coefficients. Rows with zero energy (r[0] == 0) come back as NaN.
+    """
+
+    r = np.asarray(r, dtype=float)
+    shape = r.shape[:-1]
+
+    a = np.zeros(shape + (order + 1,))
+    a[..., 0] = 1.
+    k = np.zeros(shape + (order,))
+    e = r[..., 0].copy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(1, order + 1):
+            acc = r[..., i] + np.sum(a[..., 1:i] * r[..., i - 1:0:-1], axis=-1)
+            k_i = -acc / e
+            a[..., 1:i] = a[..., 1:i] + k_i[..., np.newaxis] * a[..., i - 1:0:-1]
+            a[..., i] = k_i
+            k[..., i - 1] = k_i
+            e = e * (1. - k_i ** 2)
+
+    return a, e, k
+
+
+def lpc(x, order):
+
+    """
+    Get LPC coefficients of x (autocorrelation method) and the prediction
+    error.
+
+    Batches go through the Levinson-Durbin recursion, vectorized across
+    frames. A single signal takes a faster path: the autocorrelation is a
+    direct correlation (cheaper than an FFT for the few lags LPC needs) and
+    the Toeplitz normal equations are solved with LAPACK, which at LPC
+    orders beats running the recursion one Python step at a time.
+    """
+
+    x = np.asarray(x, dtype=float)
+
+    if x.ndim > 1:
+        a, e, k = levinson(autocorrelation(x, order), order)
+        return a, e
+
+    r = np.correlate(np.concatenate((x, np.zeros(order))), x, 'valid') / len(x)
+    if r[0] == 0:
+        # Silence.
+        return np.concatenate(([1.], np.full(order, np.nan))), 0.
+
+    toeplitz = r[np.abs(np.subtract.outer(np.arange(order), np.arange(order)))]
+    try:
+        a = np.concatenate(([1.], np.linalg.solve(toeplitz, -r[1:])))
+    except np.linalg.LinAlgError:
+        # Perfectly predictable (eg. constant) signal.
+        return np.concatenate(([1.], np.full(order, np.nan))), 0.
+    e = r[0] + np.dot(a[1:], r[1:])
+    return a, e
+
+
+def roots(a):
+
+    """
+    Get the roots of prediction polynomials as the eigenvalues of their
+    companion matrices (what np.roots does for a single polynomial).
+    Rows containing NaN give NaN roots.
+    """
+
+    a = np.asarray(a, dtype=float)
+    shape = a.shape[:-1]
+    order = a.shape[-1] - 1
+
+    if order < 1:
+        return np.zeros(shape + (0,), dtype=complex)
+
+    companion = np.zeros(shape + (order, order))
+    companion[..., 0, :] = -a[..., 1:] / a[..., :1]
+    companion[..., np.arange(1, order), np.arange(order - 1)] = 1.
+
+    valid = np.all(np.isfinite(companion.reshape(shape + (-1,))), axis=-1)
+    rts = np.full(shape + (order,), np.nan, dtype=complex)
+    rts[valid] = np.linalg.eigvals(companion[valid])
+    return rts
+
+
+def burg(x, order):
+
+    """
+    Get LPC coefficients of x with Burg's method and the prediction error.
+
+    Reflection coefficients are estimated from the forward and backward
+    prediction errors directly, which is more stable than the
+    autocorrelation method on short frames.
+    """
+
+    x = np.asarray(x, dtype=float)
+    shape = x.shape[:-1]
+
+    a = np.zeros(shape + (order + 1,))
+    a[..., 0] = 1.
+    e = np.mean(x ** 2, axis=-1)
+
+    f = x
+    b = x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(order):
+            f, b = f[..., 1:], b[..., :-1]
+            k_i = -2. * np.sum(f * b, axis=-1) / np.sum(f ** 2 + b ** 2, axis=-1)
+            f, b = f + k_i[..., np.newaxis] * b, b + k_i[..., np.newaxis] * f
+            a[..., 1:i + 2] = a[..., 1:i + 2] + k_i[..., np.newaxis] * a[..., i::-1]
+            e = e * (1. - k_i ** 2)
+
+    return a, e
+
+
+# LPC methods by name. A method takes (x, order), where x is a signal or a
+# 2-D array of frames, and returns the order + 1 coefficients and the
+# prediction error.
+METHODS = {
+    'autocorrelation': lpc,
+    'burg': burg
+}
+
+
+def get_method(method):
+
+    """
+    Get an LPC method by name. Callables are passed through as-is.
+    """
+
+    if callable(method):
+        return method
+
+    if not method in METHODS:
+        raise Exception('LPC method not recognized. Must be one of: %s' % METHODS.keys())
+
+    return METHODS[method]
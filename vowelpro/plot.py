@@ -0,0 +1,100 @@
+from StringIO import StringIO
+import numpy as np
+from vowelpro.vowel import decimate, get_fft, track_formants
+
+
+# Formats diagnostics can be rendered in, and their content types.
+DIAGNOSTICS_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+
+def draw_diagnostics(fig, signal, analysis=None):
+
+    """
+    Draw diagnostics of a Signal on a matplotlib Figure: maxes, waveform
+    with vowel segmentation, FFT of the vowel and spectrogram with formant
+    tracks.
+
+    `analysis` holds what was found while rating the signal: its
+    `main_hump` and `vowel_range` (sample ranges within the signal) and,
+    optionally, the vowel's `formants`, marked on the FFT (see
+    vowel.analyze_vowel, of which the signal is the trimmed recording).
+    Without it, the main hump and vowel range are found from the signal.
+    """
+
+    if analysis is None:
+        hump = signal.get_main_hump()
+        analysis = {
+            'main_hump': [hump['start'], hump['end']],
+            'vowel_range': signal.get_main_vowel_range()
+        }
+
+    # Plot maxes.
+    ax = fig.add_subplot(411)
+    maxes_x, maxes = signal.get_maxes()
+    ax.plot(maxes_x, maxes)
+    ax.axhline(signal.get_floor(), lw=1, color='red')
+
+    # Plot waveform, main hump and vowel range.
+    ax = fig.add_subplot(412)
+    ax.plot(signal.signal_x, signal.signal)
+    max_val = np.abs(signal.signal).max() if signal.len else 1
+    ax.vlines(signal.get_sec(np.array(analysis['main_hump'])), -max_val, max_val, lw=1, color='green')
+    ax.vlines(signal.get_sec(np.array(analysis['vowel_range'])), -max_val, max_val, lw=2, color='red', linestyles='dashed')
+
+    # Plot FFT of the vowel, and its formants.
+    ax = fig.add_subplot(413)
+    vowel_range = analysis['vowel_range']
+    vowel_signal = signal.signal[vowel_range[0]:vowel_range[1]]
+    fft = get_fft(vowel_signal)
+    ax.plot(np.fft.rfftfreq(len(vowel_signal), 1. / signal.fs), fft)
+    if analysis.get('formants'):
+        ax.vlines(analysis['formants'], 0, np.max(fft) if len(fft) else 1, lw=1, color='red', linestyles='dotted')
+
+    # Plot spectrogram and formants every 10 ms, at the analysis rate, as
+    # one collection.
+    ax = fig.add_subplot(414)
+    with np.errstate(divide='ignore'):
+        # Silence has no power to take the log of.
+        ax.specgram(signal.signal, Fs=signal.fs, scale_by_freq=True, sides='default')
+    ax.set_ylim(0, 5000)
+    decimated, fs = decimate(signal.signal, signal.fs)
+    times, formants = track_formants(decimated, fs)
+    times = np.repeat(times, formants.shape[1])
+    formants = formants.ravel()
+    found = np.isfinite(formants)
+    ax.scatter(times[found], formants[found], s=4, color='r')
+
+
+def render_diagnostics(signal, analysis=None, fmt='png'):
+
+    """
+    Render diagnostics of a Signal (see draw_diagnostics) without a
+    display, as PNG or SVG data (see DIAGNOSTICS_FORMATS).
+    """
+
+    if fmt not in DIAGNOSTICS_FORMATS:
+        raise Exception('Format not supported. Must be one of: %s' % DIAGNOSTICS_FORMATS.keys())
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(10, 10))
+    FigureCanvasAgg(fig)
+    draw_diagnostics(fig, signal, analysis)
+    out = StringIO()
+    fig.savefig(out, format=fmt)
+    return out.getvalue()
+
+
+def plot_signal(signal, analysis=None):
+
+    """
+    Show diagnostics of a Signal (see draw_diagnostics) interactively.
+    """
+
+    import matplotlib.pyplot as plt
+    draw_diagnostics(plt.figure(), signal, analysis)
+    plt.show()
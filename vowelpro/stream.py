@@ -0,0 +1,188 @@
+import numpy as np
+from vowelpro.vowel import ANALYSIS_FS, Signal, analyze_hump, segment_signal
+
+
+# Sample ranges of hump analyses (see vowel.get_hump_ranges).
+RANGES = ('main_hump', 'vowel_range', 'diphthong_range')
+
+
+def analyze_hump_samples(samples, fs, analysis_fs=ANALYSIS_FS, multi_frame=False):
+
+    """
+    Analyze a hump given as its own samples (see vowel.analyze_hump). Its
+    sample ranges are from the start of the hump.
+    """
+
+    return analyze_hump(Signal(samples, fs), {'start': 0, 'end': len(samples)}, analysis_fs, multi_frame=multi_frame)
+
+
+class VowelStream(object):
+
+    """
+    Incremental vowel analysis over audio pushed in chunks as it is
+    recorded.
+
+    Each chunk extends a bucket-max envelope (see Signal.get_maxes) and
+    runs hump detection against a running floor (a quarter of the standard
+    deviation of the maxes so far). As soon as a hump closes, its vowel is
+    analyzed, so the LPC work is done while the speaker is still recording.
+    `analyze` analyzes a hump's samples, as analyze_hump_samples (the
+    default, in this thread) does; eg. in a worker process.
+
+    finish() trims and segments the whole recording exactly as
+    analyze_vowel does, with the floor of the complete envelope. If that
+    picks a hump already analyzed online, the analysis is returned without
+    further LPC. Provisional analyses (see get_provisional_analysis) are of
+    the untrimmed recording.
+    """
+
+    def __init__(self, fs, bucket_size=200, analysis_fs=ANALYSIS_FS, analyze=analyze_hump_samples):
+        self.fs = fs
+        self.bucket_size = bucket_size
+        self.analysis_fs = analysis_fs
+        self.analyze = analyze
+        self.buffer = np.zeros(fs, dtype=np.int16)
+        self.len = 0
+
+        # Envelope state: maxes of complete buckets and running sums for
+        # their standard deviation.
+        self.maxes = []
+        self.num_buckets = 0
+        self.maxes_sum = 0.
+        self.maxes_sum_sq = 0.
+        self.last_max = None
+        self.hump_start = None
+
+        # Areas (sums of maxes) of the humps closed so far, and their
+        # analyses, by (start, end) sample index.
+        self.hump_areas = {}
+        self.hump_analyses = {}
+
+
+    def push(self, samples):
+
+        """
+        Add int16 samples. Returns the humps that closed with them, as
+        (start, end) sample indexes.
+
+        The humps are analyzed once the samples are in, so if analyzing
+        raises, the samples are still added and the humps closed, only not
+        analyzed (finish() analyzes the main hump if needed).
+        """
+
+        samples = np.asarray(samples, dtype=np.int16)
+        self.append(samples)
+
+        # Maxes of the buckets these samples complete (the bucket in
+        # progress is picked up by a later push or by finish()).
+        first_bucket = self.num_buckets
+        num_buckets = self.len // self.bucket_size - first_bucket
+        if num_buckets <= 0:
+            return []
+
+        buckets = self.buffer[first_bucket * self.bucket_size:(first_bucket + num_buckets) * self.bucket_size]
+        maxes = np.where(buckets > 0, buckets, 1).reshape(num_buckets, self.bucket_size).max(axis=1).astype(int)
+
+        closed = []
+        for index, current_max in enumerate(maxes, first_bucket):
+            self.maxes.append(current_max)
+            self.num_buckets += 1
+            self.maxes_sum += current_max
+            self.maxes_sum_sq += current_max ** 2
+            floor = self.get_floor()
+
+            if self.last_max is not None:
+                if self.last_max <= floor and current_max > floor:
+                    self.hump_start = index - 1
+                elif self.last_max > floor and current_max < floor and self.hump_start is not None:
+                    closed.append(self.close_hump(self.hump_start, index - 1))
+                    self.hump_start = None
+
+            self.last_max = current_max
+
+        for key in closed:
+            self.hump_analyses[key] = self.analyze_hump(key)
+        return closed
+
+
+    def append(self, samples):
+        if self.len + len(samples) > len(self.buffer):
+            buffer = np.zeros(max(2 * len(self.buffer), self.len + len(samples)), dtype=np.int16)
+            buffer[:self.len] = self.buffer[:self.len]
+            self.buffer = buffer
+        self.buffer[self.len:self.len + len(samples)] = samples
+        self.len += len(samples)
+
+
+    def get_floor(self):
+        mean = self.maxes_sum / self.num_buckets
+        variance = max(self.maxes_sum_sq / self.num_buckets - mean ** 2, 0.)
+        return np.sqrt(variance) * 0.25
+
+
+    def get_signal(self):
+        return Signal(self.buffer[:self.len], self.fs)
+
+
+    def close_hump(self, start_bucket, end_bucket):
+        key = (start_bucket * self.bucket_size, end_bucket * self.bucket_size)
+        self.hump_areas[key] = sum(self.maxes[start_bucket:end_bucket])
+        return key
+
+
+    def analyze_hump(self, key):
+
+        """
+        Analyze a hump, by (start, end) sample index, with `analyze`.
+        """
+
+        start, end = key
+        analysis = self.analyze(self.buffer[start:end].copy(), self.fs, self.analysis_fs)
+        for name in RANGES:
+            analysis[name] = [index + start for index in analysis[name]]
+        return analysis
+
+
+    def get_provisional_analysis(self):
+
+        """
+        Get the analysis of the largest hump closed and analyzed so far (by
+        the running floor), or None.
+        """
+
+        if not self.hump_analyses:
+            return None
+
+        key = max(self.hump_analyses, key=self.hump_areas.get)
+        return self.get_analysis(self.hump_analyses[key])
+
+
+    def get_analysis(self, hump_analysis):
+        analysis = {
+            'fs': self.fs,
+            'num_samples': self.len,
+            'trim': [0, self.len]
+        }
+        analysis.update(hump_analysis)
+        return analysis
+
+
+    def finish(self):
+
+        """
+        Get the analysis of the whole recording, as analyze_vowel would:
+        its sample ranges are offsets into the trimmed recording.
+        """
+
+        signal, main_hump, analysis = segment_signal(self.buffer[:self.len], self.fs)
+        trim_start = analysis['trim'][0]
+        key = (trim_start + main_hump['start'], trim_start + main_hump['end'])
+
+        hump_analysis = self.hump_analyses.get(key)
+        if hump_analysis is None:
+            hump_analysis = self.analyze_hump(key)
+
+        analysis.update(hump_analysis)
+        for name in RANGES:
+            analysis[name] = [index - trim_start for index in hump_analysis[name]]
+        return analysis
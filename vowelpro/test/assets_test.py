@@ -0,0 +1,96 @@
+import unittest
+from vowelpro.web.assets import AssetStore, fingerprint, parse_accept_encoding, parse_range
+from StringIO import StringIO
+import gzip
+import shutil
+import tempfile
+import os
+
+
+class AssetStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.static_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.static_dir, 'js'))
+        self.script = 'var x = 1;\n' * 100
+        with open(os.path.join(self.static_dir, 'js', 'app.js'), 'wb') as f:
+            f.write(self.script)
+        with open(os.path.join(self.static_dir, 'word.mp3'), 'wb') as f:
+            f.write('\xff\xfb' * 500)
+        self.store = AssetStore(self.static_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.static_dir)
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint('js/app.js', 'abc'), 'js/app.abc.js')
+        url = self.store.get_url('js/app.js')
+        self.assertTrue(url.startswith('static/js/app.') and url.endswith('.js'))
+        self.assertEqual(self.store.rewrite('<script src="static/js/app.js"></script><img src="static/none.png">'), '<script src="%s"></script><img src="static/none.png">' % url)
+
+    def test_accept_encoding(self):
+        self.assertEqual(parse_accept_encoding('gzip;q=0.5, br;q=0, Deflate'), set(['gzip', 'deflate']))
+        self.assertEqual(parse_accept_encoding(None), set())
+
+    def test_respond(self):
+        url = self.store.get_url('js/app.js')[len('static/'):]
+        status, headers, body = self.store.respond(url, 'gzip')
+        self.assertEqual((status, headers['Content-Encoding'], headers['Vary']), (200, 'gzip', 'Accept-Encoding'))
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(body)).read(), self.script)
+        self.assertTrue('immutable' in headers['Cache-Control'])
+
+        # Each encoding has its own ETag.
+        status, plain_headers, body = self.store.respond('js/app.js')
+        self.assertEqual((status, body, plain_headers['Cache-Control']), (200, self.script, 'no-cache'))
+        self.assertNotEqual(plain_headers['ETag'], headers['ETag'])
+        self.assertEqual(self.store.respond('js/app.js', 'gzip', headers['ETag'])[0], 304)
+        self.assertEqual(self.store.respond('js/app.js', None, headers['ETag'])[0], 200)
+
+        # Compressed formats are sent as they are.
+        status, headers, body = self.store.respond('word.mp3', 'gzip')
+        self.assertEqual((headers['Content-Type'], 'Content-Encoding' in headers, 'Vary' in headers), ('audio/mpeg', False, False))
+        self.assertEqual(self.store.respond('missing.js')[0], 404)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=2-5', 10), (2, 6))
+        self.assertEqual(parse_range('bytes=2-', 10), (2, 10))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 10))
+        self.assertEqual(parse_range('bytes=4-20', 10), (4, 10))
+        # Unsatisfiable.
+        self.assertEqual(parse_range('bytes=10-', 10), (10, 10))
+        # Ignored.
+        for header in [None, 'bytes=5-2', 'bytes=0-1,4-5', 'bytes=a-', 'items=0-1']:
+            self.assertEqual(parse_range(header, 10), None, header)
+
+    def test_range(self):
+        data = '\xff\xfb' * 500
+        status, headers, body = self.store.respond('word.mp3', None, None, 'bytes=0-1')
+        self.assertEqual((status, headers['Content-Range'], headers['Accept-Ranges'], body), (206, 'bytes 0-1/1000', 'bytes', '\xff\xfb'))
+        self.assertEqual(self.store.respond('word.mp3', None, None, 'bytes=1000-')[:2], (416, dict(headers, **{'Content-Range': 'bytes */1000'})))
+
+        # If-Range: only the ETag of the variant gets a part.
+        self.assertEqual(self.store.respond('word.mp3', None, None, 'bytes=998-', headers['ETag'])[2], data[998:])
+        self.assertEqual(self.store.respond('word.mp3', None, None, 'bytes=998-', '"other"')[::2], (200, data))
+
+        # Encoded variants are sent whole.
+        status, headers, body = self.store.respond('js/app.js', 'gzip', None, 'bytes=0-1')
+        self.assertEqual((status, 'Accept-Ranges' in headers), (200, False))
+        self.assertEqual(self.store.respond('js/app.js', None, None, 'bytes=0-1')[::2], (206, self.script[:2]))
+
+    def test_write(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            page = os.path.join(self.static_dir, 'index.html')
+            with open(page, 'wb') as f:
+                f.write('<script src="static/js/app.js"></script>')
+            self.store.write(out_dir, [page])
+            url = self.store.get_url('js/app.js')
+            for path in [url, url + '.gz', 'static/js/app.js', 'index.html']:
+                self.assertTrue(os.path.isfile(os.path.join(out_dir, path)), path)
+            with open(os.path.join(out_dir, 'index.html'), 'rb') as f:
+                self.assertTrue(url in f.read())
+        finally:
+            shutil.rmtree(out_dir)
+
+if __name__ == '__main__':
+    unittest.main()
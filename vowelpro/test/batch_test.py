@@ -0,0 +1,68 @@
+import unittest
+from vowelpro.batch import rate_vowels, read_manifest, read_directory
+from vowelpro.bench import write_word
+import shutil
+import tempfile
+import os
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+
+
+class BatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        write_word(os.path.join(self.dir, 'bat.wav'), os.path.join(TEST_FILES_DIR, 'bat.wav'))
+        write_word(os.path.join(self.dir, 'beat.wav'), os.path.join(TEST_FILES_DIR, 'beat.wav'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_rate_vowels(self):
+        jobs = [
+            (os.path.join(self.dir, 'bat.wav'), 'ae', 'california'),
+            {'file': os.path.join(self.dir, 'beat.wav'), 'vowel': 'i', 'dialect': 'california'},
+            (os.path.join(self.dir, 'missing.wav'), 'i', 'california'),
+            # Bare vowel with no surrounding silence: nothing to segment.
+            (os.path.join(TEST_FILES_DIR, 'boot.wav'), 'u', 'california')
+        ]
+        for workers in [1, 2]:
+            results = dict((os.path.basename(result['file']), result) for result in rate_vowels(jobs, workers))
+            self.assertEqual(sorted(results.keys()), ['bat.wav', 'beat.wav', 'boot.wav', 'missing.wav'])
+            self.assertTrue(0 <= results['bat.wav']['rating']['score'] <= 100)
+            self.assertTrue(0 <= results['beat.wav']['rating']['score'] <= 100)
+            self.assertTrue('error' in results['missing.wav'])
+            self.assertEqual(results['boot.wav']['error'], 'No vowel signal detected.')
+
+    def test_read_manifest(self):
+        csv_path = os.path.join(self.dir, 'manifest.csv')
+        with open(csv_path, 'wb') as f:
+            f.write('file,vowel,dialect\nbat.wav,ae,michigan\nbeat.wav,i,\n')
+        jsonl_path = os.path.join(self.dir, 'manifest.jsonl')
+        with open(jsonl_path, 'wb') as f:
+            f.write('{"file": "bat.wav", "vowel": "ae", "dialect": "michigan"}\n\n{"file": "beat.wav", "vowel": "i"}\n')
+        for path in [csv_path, jsonl_path]:
+            jobs = read_manifest(path, dialect='california')
+            self.assertEqual([(job['file'], job['vowel'], job['dialect']) for job in jobs], [
+                (os.path.join(self.dir, 'bat.wav'), 'ae', 'michigan'),
+                (os.path.join(self.dir, 'beat.wav'), 'i', 'california')
+            ])
+
+    def test_row_without_file(self):
+        csv_path = os.path.join(self.dir, 'manifest.csv')
+        with open(csv_path, 'wb') as f:
+            f.write('file,vowel,dialect\nbat.wav,ae,california\n,i,california\n')
+        jsonl_path = os.path.join(self.dir, 'manifest.jsonl')
+        with open(jsonl_path, 'wb') as f:
+            f.write('{"file": "bat.wav", "vowel": "ae", "dialect": "california"}\n{"vowel": "i", "dialect": "california"}\n')
+        for path in [csv_path, jsonl_path]:
+            results = sorted(rate_vowels(read_manifest(path), 1), key=lambda result: result['file'])
+            self.assertEqual((results[0]['file'], results[0]['error']), (None, 'No file given.'))
+            self.assertTrue('rating' in results[1])
+
+    def test_read_directory(self):
+        jobs = read_directory(self.dir, 'i', 'california')
+        self.assertEqual([os.path.basename(job['file']) for job in jobs], ['bat.wav', 'beat.wav'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from vowelpro.bench import STAGES, compare, get_peak_memory, run
+import numpy as np
+
+
+def allocate():
+	np.ones(8 * 1024 * 1024).sum()
+
+
+class BenchTests(unittest.TestCase):
+
+    def test_run(self):
+        results = run(repeat=1, memory=False)
+        self.assertTrue(set(['bat', 'long', '48khz']) <= set(results))
+        for case in results.values():
+            self.assertEqual(sorted(case), sorted(STAGES))
+            for result in case.values():
+                self.assertTrue(0 < result['median'] <= result['p95'])
+
+    def test_peak_memory(self):
+        # 64 MB of doubles.
+        self.assertTrue(get_peak_memory(allocate) > 60 * 1024)
+
+    def test_compare(self):
+        baseline = {'bat': {
+            'get_humps': {'mean': 1e-3, 'median': 1e-3, 'p95': 2e-3, 'peak_kb': 4096},
+            'rate_vowel': {'mean': 1e-3, 'median': 1e-3, 'p95': 2e-3, 'peak_kb': 4096}
+        }}
+        results = {'bat': {
+            'get_humps': {'mean': 2e-3, 'median': 1.2e-3, 'p95': 4e-3, 'peak_kb': 4096 + 1000},
+            'rate_vowel': {'mean': 1e-3, 'median': 1.5e-3, 'p95': 2e-3, 'peak_kb': 8192}
+        }, 'new': {}}
+        self.assertEqual(compare(results, baseline, 0.25), [
+            ('bat', 'rate_vowel', 'median', 1e-3, 1.5e-3),
+            ('bat', 'rate_vowel', 'peak_kb', 4096, 8192)
+        ])
+        self.assertEqual(compare(results, baseline, 1.), [])
+
+if __name__ == '__main__':
+    unittest.main()
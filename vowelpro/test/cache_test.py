@@ -0,0 +1,69 @@
+import unittest
+from vowelpro.cache import BytesLRUCache, LRUCache, hash_file
+from StringIO import StringIO
+import hashlib
+import shutil
+import tempfile
+import json
+
+
+class LRUCacheTests(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = LRUCache()
+        self.assertEqual(cache.get('a'), None)
+        cache.put('a', {'formants': [1.5, 2.5]})
+        self.assertEqual(cache.get('a'), {'formants': [1.5, 2.5]})
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+        self.assertEqual(stats['bytes'], len(json.dumps({'formants': [1.5, 2.5]})))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual([cache.get(key) for key in ['a', 'b', 'c']], [1, None, 3])
+
+    def test_bytes_bound(self):
+        cache = LRUCache(max_bytes=20)
+        cache.put('a', 'x' * 10)
+        cache.put('b', 'y' * 10)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), 'y' * 10)
+        cache.put('c', 'z' * 100)
+        self.assertEqual(cache.get('c'), None)
+        self.assertTrue(cache.stats()['bytes'] <= 20)
+
+    def test_persistence(self):
+        path = tempfile.mkdtemp()
+        try:
+            LRUCache(path=path).put('a', [1, 2])
+            cache = LRUCache(path=path)
+            self.assertEqual(cache.get('a'), [1, 2])
+            self.assertEqual(cache.stats()['entries'], 1)
+        finally:
+            shutil.rmtree(path)
+
+    def test_bytes(self):
+        path = tempfile.mkdtemp()
+        try:
+            data = '\x89PNG\x00\xff' * 10
+            cache = BytesLRUCache(max_bytes=100, path=path)
+            cache.put('a-png', data)
+            self.assertEqual(cache.stats()['bytes'], len(data))
+            self.assertEqual(BytesLRUCache(path=path).get('a-png'), data)
+            # Kept apart from JSON values of the same key.
+            self.assertEqual(LRUCache(path=path).get('a-png'), None)
+        finally:
+            shutil.rmtree(path)
+
+    def test_hash_file(self):
+        data = 'abc' * 100000
+        copy = StringIO()
+        self.assertEqual(hash_file(StringIO(data), copy_to=copy), hashlib.sha1(data).hexdigest())
+        self.assertEqual(copy.getvalue(), data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from vowelpro.bench import write_word
+from vowelpro.corpus import Corpus, pack, rate_corpus
+from vowelpro.vowel import get_signal, rate_vowel
+import numpy as np
+import shutil
+import tempfile
+import os
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+
+
+class CorpusTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.corpus_path = os.path.join(self.dir, 'corpus')
+        self.jobs = []
+        for filename, vowel_str in [('bat.wav', 'ae'), ('beat.wav', 'i'), ('boot.wav', 'u')]:
+            path = os.path.join(self.dir, filename)
+            write_word(path, os.path.join(TEST_FILES_DIR, filename))
+            self.jobs.append({'file': path, 'vowel': vowel_str, 'dialect': 'california', 'speaker': 'a'})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_pack(self):
+        for workers in [1, 2]:
+            count, errors = pack(self.jobs + [(os.path.join(self.dir, 'missing.wav'), 'i', 'california')], self.corpus_path, workers)
+            self.assertEqual(count, 3)
+            self.assertEqual([os.path.basename(filename) for filename, error in errors], ['missing.wav'])
+
+            corpus = Corpus(self.corpus_path)
+            self.assertEqual(len(corpus), 3)
+            for index, job in enumerate(self.jobs):
+                signal, fs = corpus.get_signal(index)
+                expected, expected_fs = get_signal(job['file'], 'wav')
+                self.assertEqual(fs, expected_fs)
+                self.assertTrue(np.array_equal(signal, expected))
+                # A view of the mapped samples, not a copy.
+                self.assertFalse(signal.flags.owndata)
+                self.assertEqual(corpus.get_metadata(index)['speaker'], 'a')
+
+    def test_rate_corpus(self):
+        pack(self.jobs, self.corpus_path, 1)
+        for workers in [1, 2]:
+            results = dict((os.path.basename(result['file']), result) for result in rate_corpus(self.corpus_path, workers))
+            self.assertEqual(sorted(results.keys()), ['bat.wav', 'beat.wav', 'boot.wav'])
+            for job in self.jobs:
+                result = results[os.path.basename(job['file'])]
+                self.assertEqual(result['rating'], rate_vowel(job['file'], job['vowel'], job['dialect'], 'wav'))
+                self.assertEqual(result['speaker'], 'a')
+
+        results = list(rate_corpus(self.corpus_path, 1, dialect='michigan'))
+        self.assertEqual([result['dialect'] for result in results], ['michigan'] * 3)
+
+    def test_empty(self):
+        self.assertEqual(pack([], self.corpus_path, 1), (0, []))
+        self.assertEqual(list(rate_corpus(self.corpus_path, 1)), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from vowelpro.decode import DecoderPool, DecoderUnavailable, find_converter
+from vowelpro.vowel import get_signal
+from StringIO import StringIO
+import numpy as np
+import subprocess
+import tempfile
+import time
+import wave
+import os
+
+TEST_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files/bat.wav')
+
+
+class PipeDecoderPool(DecoderPool):
+
+    """
+    Pool of `cat` processes, standing in for a converter that is given
+    WAV files.
+    """
+
+    def get_args(self, file_type, max_duration=None):
+        return ['cat']
+
+
+class DecoderPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = PipeDecoderPool('cat')
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_decode(self):
+        expected, fs = get_signal(TEST_FILE, 'wav')
+        for vowel_file in [TEST_FILE, StringIO(open(TEST_FILE, 'rb').read())]:
+            signal, signal_fs = self.pool.decode(vowel_file, 'wav')
+            self.assertEqual(signal_fs, fs)
+            self.assertTrue(np.array_equal(signal, expected))
+
+        # Spare processes are started in the background, and used for the
+        # next file.
+        spares = self.wait_for_spares(('wav', None))
+        self.assertEqual(len(spares), 2)
+        first_spare = spares[0]
+        self.pool.decode(TEST_FILE, 'wav')
+        self.assertFalse(first_spare in self.pool.idle[('wav', None)])
+        self.assertEqual(first_spare.returncode, 0)
+        self.assertEqual(len(self.wait_for_spares(('wav', None))), 2)
+
+    def wait_for_spares(self, key):
+        for i in xrange(100):
+            with self.pool.lock:
+                if not self.pool.starting.get(key):
+                    return list(self.pool.idle[key])
+            time.sleep(0.01)
+        self.fail('Spares not started.')
+
+    def test_large_output(self):
+        signal = (np.random.RandomState(0).randn(800000) * 1000).astype(np.int16)
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            w = wave.open(path, 'wb')
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(16000)
+            w.writeframes(signal.astype('<i2').tostring())
+            w.close()
+            decoded, fs = self.pool.decode(path, 'wav')
+            self.assertTrue(np.array_equal(decoded, signal))
+        finally:
+            os.remove(path)
+
+    def test_errors(self):
+        self.pool.converter = None
+        self.assertRaises(DecoderUnavailable, self.pool.decode, TEST_FILE, 'wav')
+        self.pool.converter = 'cat'
+        self.assertRaisesRegexp(Exception, 'RIFF', self.pool.decode, StringIO('not audio'), 'wav')
+
+    @unittest.skipUnless(find_converter(), 'ffmpeg or avconv not found')
+    def test_converter(self):
+        handle, path = tempfile.mkstemp(suffix='.ogg')
+        os.close(handle)
+        try:
+            subprocess.check_call([find_converter(), '-v', 'error', '-y', '-i', TEST_FILE, path])
+            expected, fs = get_signal(TEST_FILE, 'wav')
+            signal, signal_fs = DecoderPool().decode(path, 'ogg')
+            self.assertEqual(signal_fs, fs)
+            self.assertTrue(abs(len(signal) - len(expected)) < fs / 10)
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from vowelpro import lpc
+from scipy.signal import lfilter
+import numpy as np
+
+# Coefficients of a stable all-pole filter.
+AR_COEFFS = [1., -1.5, 0.9, -0.2]
+
+
+def get_ar_signal(shape, seed=0):
+	"""
+	White noise shaped by the AR_COEFFS all-pole filter.
+	"""
+	noise = np.random.RandomState(seed).randn(*shape)
+	return lfilter([1.], AR_COEFFS, noise, axis=-1)
+
+
+class LPCTests(unittest.TestCase):
+
+    def test_recovers_ar_coefficients(self):
+        x = get_ar_signal((20000,))
+        for method in lpc.METHODS:
+            a, e = lpc.get_method(method)(x, 3)
+            self.assertTrue(np.allclose(a, AR_COEFFS, atol=0.05), method)
+            self.assertTrue(0.9 < e < 1.1, method)
+
+    def test_batch_matches_single(self):
+        frames = get_ar_signal((6, 320))
+        for method in lpc.METHODS:
+            a, e = lpc.get_method(method)(frames, 18)
+            for i, frame in enumerate(frames):
+                a_i, e_i = lpc.get_method(method)(frame, 18)
+                self.assertTrue(np.allclose(a[i], a_i), method)
+                self.assertTrue(np.allclose(e[i], e_i), method)
+
+    def test_shorter_than_order(self):
+        x = get_ar_signal((5,))
+        r = lpc.autocorrelation(x, 18)
+        self.assertEqual(r.shape, (19,))
+        self.assertTrue(np.allclose(r, np.correlate(np.concatenate((x, np.zeros(18))), x, 'valid') / 5))
+        self.assertTrue(np.allclose(lpc.autocorrelation(np.tile(x, (2, 1)), 18), r))
+
+    def test_levinson_matches_direct_solution(self):
+        x = get_ar_signal((500,))
+        r = lpc.autocorrelation(x, 10)
+        a, e, k = lpc.levinson(r, 10)
+        toeplitz = r[np.abs(np.subtract.outer(np.arange(10), np.arange(10)))]
+        self.assertTrue(np.allclose(a[1:], np.linalg.solve(toeplitz, -r[1:])))
+        self.assertTrue(np.all(np.abs(k) < 1))
+
+    def test_silence(self):
+        for method in lpc.METHODS:
+            a, e = lpc.get_method(method)(np.zeros(100), 4)
+            self.assertTrue(np.all(np.isnan(a[1:])), method)
+            a, e = lpc.get_method(method)(np.zeros((2, 100)), 4)
+            self.assertTrue(np.all(np.isnan(a[:, 1:])), method)
+            self.assertTrue(np.all(np.isnan(lpc.roots(a))), method)
+
+    def test_roots(self):
+        a = np.array([[1., -3., 2.], [1., 0., 1.]])
+        rts = lpc.roots(a)
+        for i in range(len(a)):
+            self.assertTrue(np.allclose(np.sort_complex(rts[i]), np.sort_complex(np.roots(a[i]))))
+
+    def test_unknown_method(self):
+        self.assertRaises(Exception, lpc.get_method, 'covariance')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from vowelpro.web.metrics import Histogram, Metrics
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram([1, 10])
+        for value in [0.5, 1, 5, 50]:
+            histogram.observe(value)
+        self.assertEqual(histogram.get_lines('x', (('stage', 'lpc'),)), [
+            'x_bucket{stage="lpc",le="1.0"} 2',
+            'x_bucket{stage="lpc",le="10.0"} 3',
+            'x_bucket{stage="lpc",le="+Inf"} 4',
+            'x_sum{stage="lpc"} 56.5',
+            'x_count{stage="lpc"} 4'
+        ])
+
+    def test_render(self):
+        metrics = Metrics()
+        metrics.observe_stage('lpc', 0.002, 400)
+        metrics.observe_stage('lpc', 0.003, 400)
+        metrics.observe_upload(20000)
+        metrics.observe_batch(3)
+        metrics.count_request('rate', 'ok')
+        metrics.count_request('rate', 'ok')
+        lines = metrics.render({'vowelpro_queue_depth': 3}, {'vowelpro_cache_hits_total': 7}).splitlines()
+        self.assertTrue('vowelpro_stage_seconds_bucket{stage="lpc",le="0.0025"} 1' in lines)
+        self.assertTrue('vowelpro_stage_seconds_count{stage="lpc"} 2' in lines)
+        self.assertTrue('vowelpro_stage_input_size_total{stage="lpc"} 800' in lines)
+        self.assertTrue('vowelpro_upload_bytes_bucket{le="16384.0"} 0' in lines)
+        self.assertTrue('vowelpro_upload_bytes_bucket{le="65536.0"} 1' in lines)
+        self.assertTrue('vowelpro_batch_size_bucket{le="2.0"} 0' in lines)
+        self.assertTrue('vowelpro_batch_size_bucket{le="4.0"} 1' in lines)
+        self.assertTrue('vowelpro_requests_total{endpoint="rate",outcome="ok"} 2' in lines)
+        self.assertTrue('# TYPE vowelpro_queue_depth gauge' in lines)
+        self.assertTrue('vowelpro_queue_depth 3.0' in lines)
+        self.assertTrue('# TYPE vowelpro_cache_hits_total counter' in lines)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from vowelpro.bench import make_word
+from vowelpro.plot import draw_diagnostics, render_diagnostics
+from vowelpro.vowel import Signal, get_signal, segment_signal, analyze_hump
+import numpy as np
+import os
+
+TEST_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files/bat.wav')
+
+
+class DiagnosticsTests(unittest.TestCase):
+
+    def setUp(self):
+        signal, fs = get_signal(TEST_FILE, 'wav')
+        self.signal, hump, self.analysis = segment_signal(make_word(signal, fs), fs)
+        self.analysis.update(analyze_hump(self.signal, hump))
+
+    def test_render(self):
+        self.assertTrue(render_diagnostics(self.signal, self.analysis).startswith('\x89PNG'))
+        svg = render_diagnostics(self.signal, self.analysis, 'svg')
+        self.assertTrue(svg.startswith('<?xml'))
+        # Without an analysis, segmentation is found from the signal.
+        self.assertTrue(render_diagnostics(Signal(self.signal.signal, self.signal.fs), fmt='svg').startswith('<?xml'))
+        self.assertRaisesRegexp(Exception, 'Format not supported', render_diagnostics, self.signal, self.analysis, 'gif')
+
+    def test_formant_tracks_collected(self):
+        # Formant tracks are one collection, not an artist per point.
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        draw_diagnostics(fig, self.signal, self.analysis)
+        spectrogram = fig.axes[3]
+        self.assertEqual(len(spectrogram.collections), 1)
+        self.assertTrue(len(spectrogram.collections[0].get_offsets()) > 10)
+        self.assertEqual(len(spectrogram.lines), 0)
+
+    def test_fft_axis(self):
+        # The spectrum runs to the Nyquist frequency at any sample rate.
+        for fs in [self.signal.fs, 44100]:
+            fig = Figure()
+            FigureCanvasAgg(fig)
+            draw_diagnostics(fig, Signal(self.signal.signal, fs), self.analysis)
+            vowel_len = self.analysis['vowel_range'][1] - self.analysis['vowel_range'][0]
+            self.assertAlmostEqual(fig.axes[2].lines[0].get_xdata()[-1], fs / 2., delta=fs / float(vowel_len))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from vowelpro.bench import make_word
+from vowelpro.stream import VowelStream
+from vowelpro.vowel import Signal, get_signal, analyze_hump, analyze_signal, rate_analysis
+from vowelpro.web.streams import StreamRegistry
+from vowelpro.web.workers import PoolBusy, RatingPool
+import numpy as np
+import time
+import os
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files')
+
+
+def get_word(vowel_filename):
+	signal, fs = get_signal(os.path.join(TEST_FILES_DIR, vowel_filename), 'wav')
+	return make_word(signal, fs), fs
+
+
+class StreamTests(unittest.TestCase):
+
+    def test_matches_batch_analysis(self):
+        for vowel_filename in ['bat.wav', 'boot.wav']:
+            word, fs = get_word(vowel_filename)
+            stream = VowelStream(fs)
+            closed = []
+            for i in xrange(0, len(word), 1024):
+                closed += stream.push(word[i:i + 1024])
+
+            # The vowel is analyzed while samples are still coming in.
+            self.assertEqual(len(closed), 1)
+            self.assertEqual(stream.get_provisional_analysis(), stream.get_analysis(stream.hump_analyses[closed[0]]))
+
+            self.assertEqual(stream.finish(), analyze_signal(word, fs))
+
+    def test_trims_silence(self):
+        word, fs = get_word('bat.wav')
+        word = np.concatenate((np.zeros(fs / 2, dtype=np.int16), word, np.zeros(fs / 4, dtype=np.int16)))
+        stream = VowelStream(fs)
+        for i in xrange(0, len(word), 1024):
+            stream.push(word[i:i + 1024])
+        analysis = stream.finish()
+        self.assertTrue(analysis['trim'][0] > 0)
+        self.assertEqual(analysis, analyze_signal(word, fs))
+
+    def test_no_hump(self):
+        stream = VowelStream(16000)
+        self.assertEqual(stream.push(np.zeros(100, dtype=np.int16)), [])
+        self.assertEqual(stream.get_provisional_analysis(), None)
+
+
+class FixedScorer(object):
+
+    def score(self, formants, vowel_str, dialect):
+        return {'score': 42}
+
+
+class StreamRegistryTests(unittest.TestCase):
+
+    def test_stream(self):
+        word, fs = get_word('bat.wav')
+        streams = StreamRegistry()
+        stream_id = streams.open(fs, 'ae', 'california')
+        data = word.astype('<i2').tostring()
+        for i in xrange(0, len(data), 4096):
+            response = streams.push(stream_id, data[i:i + 4096])
+        self.assertEqual(response['samples'], len(word))
+        self.assertEqual(response['humps'], 1)
+
+        signal = Signal(word, fs)
+        expected = rate_analysis(analyze_hump(signal, signal.get_main_hump()), 'ae', 'california')
+        self.assertEqual(response['rating'], expected)
+        self.assertEqual(streams.finish(stream_id), expected)
+        self.assertRaises(Exception, streams.push, stream_id, data)
+
+    def test_scorer(self):
+        word, fs = get_word('bat.wav')
+        streams = StreamRegistry(scorer=FixedScorer())
+        stream_id = streams.open(fs, 'ae', 'california')
+        self.assertEqual(streams.push(stream_id, word.astype('<i2').tostring())['rating'], {'score': 42})
+        self.assertEqual(streams.finish(stream_id), {'score': 42})
+
+    def test_limits(self):
+        streams = StreamRegistry(max_streams=1, max_duration=1.0)
+        self.assertRaises(Exception, streams.open, 16000, 'ae', 'mars')
+        stream_id = streams.open(16000, 'ae', 'california')
+        self.assertRaises(PoolBusy, streams.open, 16000, 'ae', 'california')
+        self.assertRaisesRegexp(Exception, 'too long', streams.push, stream_id, np.zeros(16001, dtype='<i2').tostring())
+        # The stream was dropped, freeing its slot.
+        streams.open(16000, 'ae', 'california')
+
+    def test_idle_streams_expire(self):
+        streams = StreamRegistry(idle_timeout=0.01)
+        stream_id = streams.open(16000, 'ae', 'california')
+        time.sleep(0.02)
+        self.assertRaisesRegexp(Exception, 'not found', streams.push, stream_id, '')
+        self.assertEqual(len(streams), 0)
+
+
+class PooledStreamTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = RatingPool(workers=1, queue_size=0, timeout=5.0)
+        self.streams = StreamRegistry(pool=self.pool)
+        word, self.fs = get_word('bat.wav')
+        self.data = word.astype('<i2').tostring()
+        signal = Signal(word, self.fs)
+        self.expected = rate_analysis(analyze_hump(signal, signal.get_main_hump()), 'ae', 'california')
+
+    def tearDown(self):
+        self.pool.close()
+
+    def push(self, stream_id):
+        for i in xrange(0, len(self.data), 4096):
+            response = self.streams.push(stream_id, self.data[i:i + 4096])
+        return response
+
+    def test_workers(self):
+        stream_id = self.streams.open(self.fs, 'ae', 'california')
+        self.assertEqual(self.push(stream_id)['rating'], self.expected)
+        self.assertEqual(self.streams.finish(stream_id), self.expected)
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_busy(self):
+        stream_id = self.streams.open(self.fs, 'ae', 'california')
+        slot = self.pool.take_slot()
+        try:
+            # The hump closes but is left for finish(), which can be tried
+            # again once the workers are free.
+            response = self.push(stream_id)
+            self.assertEqual(response['humps'], 1)
+            self.assertFalse('rating' in response)
+            self.assertRaises(PoolBusy, self.streams.finish, stream_id)
+        finally:
+            self.pool.release([slot])
+        self.assertEqual(self.streams.finish(stream_id), self.expected)
+        self.assertEqual(len(self.streams), 0)
+
+if __name__ == '__main__':
+    unittest.main()
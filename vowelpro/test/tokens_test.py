@@ -0,0 +1,104 @@
+import unittest
+from vowelpro.bench import make_word
+from vowelpro.tokens import TokenStore, get_coordinates, read_csv, save_tokens
+from vowelpro.vowel import FORMANTS, VOWELS, get_signal, get_dimensions, bark_diff, rate_signal
+import numpy as np
+import tempfile
+import timeit
+import os
+
+TEST_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files/beat.wav')
+
+# Tokens per vowel of the synthetic store.
+TOKENS_PER_VOWEL = 200
+
+
+def make_tokens(dialects=('california', 'michigan'), seed=0):
+	"""
+	Synthetic tokens scattered (5%) around each dialect's model vowels.
+	"""
+	random = np.random.RandomState(seed)
+	dialect_list, vowel_list, formants = [], [], []
+	for dialect in dialects:
+		for vowel in sorted(FORMANTS[dialect]):
+			if not vowel in VOWELS:
+				continue
+			dialect_list += [dialect] * TOKENS_PER_VOWEL
+			vowel_list += [vowel] * TOKENS_PER_VOWEL
+			formants.append(np.array(FORMANTS[dialect][vowel]) * (1 + 0.05 * random.randn(TOKENS_PER_VOWEL, 3)))
+	return dialect_list, vowel_list, np.concatenate(formants)
+
+
+class TokenStoreTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tokens = make_tokens()
+        cls.store = TokenStore(*cls.tokens)
+
+    def test_coordinates(self):
+        formants = FORMANTS['california']['ae']
+        self.assertTrue(np.allclose(get_coordinates(formants)[0], get_dimensions(bark_diff(formants))))
+
+    def test_save_load(self):
+        handle, path = tempfile.mkstemp(suffix='.npz')
+        os.close(handle)
+        try:
+            save_tokens(path, *self.tokens)
+            store = TokenStore.load(path)
+            self.assertEqual(len(store), len(self.tokens[0]))
+            self.assertEqual(sorted(store.dialects), ['california', 'michigan'])
+            self.assertRaisesRegexp(Exception, 'need a dialect', save_tokens, path, ['a'], ['i'], [[1, 2]])
+        finally:
+            os.remove(path)
+
+    def test_read_csv(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write('dialect,vowel,f1,f2,f3,speaker\nmichigan,i,342,2322,3000,m01\nmichigan,u, 378,997,2343,m01\n')
+        try:
+            self.assertEqual(read_csv(path), (['michigan', 'michigan'], ['i', 'u'], [[342., 2322., 3000.], [378., 997., 2343.]]))
+        finally:
+            os.remove(path)
+
+    def test_queries_match_brute_force(self):
+        dialects, vowels, formants = [np.asarray(a) for a in self.tokens]
+        in_dialect = dialects == 'california'
+        coordinates = get_coordinates(formants)
+        for point in get_coordinates(formants[in_dialect][::150]) + 0.1:
+            distances = np.sqrt(np.sum((coordinates[in_dialect] - point) ** 2, axis=1))
+            nearest_distances, nearest_vowels = self.store.nearest(point, 'california', 10)
+            self.assertTrue(np.allclose(nearest_distances, np.sort(distances)[:10]))
+            self.assertEqual(list(nearest_vowels), list(vowels[in_dialect][np.argsort(distances)[:10]]))
+
+            of_vowel = vowels[in_dialect] == 'i'
+            expected = np.mean(distances[of_vowel] <= 0.5)
+            self.assertAlmostEqual(self.store.density(point, 'i', 'california', 0.5), expected)
+
+    def test_score(self):
+        rating = self.store.score([300] + FORMANTS['california']['i'], 'i', 'california')
+        self.assertTrue(rating['score'] >= 80)
+        self.assertEqual(rating['formants']['sample'], FORMANTS['california']['i'])
+        self.assertEqual(max(rating['neighbours'], key=rating['neighbours'].get), 'i')
+        self.assertTrue(rating['density'] > 0)
+
+        # An /u/ is not heard as an /i/.
+        rating = self.store.score(FORMANTS['california']['u'], 'i', 'california')
+        self.assertEqual(rating['score'], 0)
+        self.assertEqual(rating['density'], 0)
+
+        self.assertRaisesRegexp(Exception, 'No reference tokens', self.store.score, FORMANTS['california']['i'], 'i', 'south')
+
+    def test_rate_signal(self):
+        signal, fs = get_signal(TEST_FILE, 'wav')
+        rating = rate_signal(make_word(signal, fs), fs, 'i', 'california', scorer=self.store)
+        self.assertTrue('neighbours' in rating)
+        self.assertEqual(rating['score'], self.store.score(rating['formants']['sample'], 'i', 'california')['score'])
+
+    def test_query_time(self):
+        number = 1000
+        seconds = timeit.timeit(lambda: self.store.score(FORMANTS['california']['I'], 'I', 'california'), number=number)
+        self.assertTrue(seconds / number < 1e-3, 'score took %.6fs' % (seconds / number))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,24 @@
 import unittest
-from vowelpro.vowel import FORMANTS, get_signal, get_file_type, get_formants, get_f1_f2_f3, calc_percent_off
-import wave
+from vowelpro.vowel import FORMANTS, FRAME_STEP_SEC, Signal, get_signal, get_file_type, get_formants, get_f1_f2_f3, calc_percent_off, track_formants, get_chunked_formants, decimate, \
+	MODELS, score_all_models, score_formants, classify_vowel, rate_vowel, analyze_vowel, trim_silence, \
+	estimate_frame_formants, rate_signal, analyze_signal, rate_analysis, get_batch_formants, \
+	analyze_session, rate_session_analysis, rate_session
+from vowelpro.bench import make_word, write_wav, write_word
+from scipy.signal import resample
+import numpy as np
+import subprocess
+import tempfile
+import sys
 import os
 
 MARGIN_FOR_ERROR = 0.2
 
+# Maximum time (in seconds) `import vowelpro.vowel` may take in a fresh interpreter.
+IMPORT_BUDGET = float(os.environ.get('VOWELPRO_IMPORT_BUDGET', 0.5))
+
+# Modules that must only be imported when they are first needed.
+LAZY_MODULES = ['matplotlib', 'pydub', 'scipy']
+
 TEST_DATA = {
 	'ae': {
 		'filename': 'files/bat.wav',
@@ -32,14 +46,55 @@ def is_close_enough(test_formants, observed_formants):
 	return all(calc_percent_off(test_formant, observed_formant) <= MARGIN_FOR_ERROR for test_formant, observed_formant in zip(test_formants, observed_formants))
 
 
-def are_vowel_formants_accurate(vowel_str):
-	print 'testing vowel {}'.format(vowel_str)
+def get_test_file(vowel_str):
+	return os.path.join(os.path.dirname(os.path.realpath(__file__)), TEST_DATA[vowel_str]['filename'])
+
+
+def get_reference_humps(signal, fs, bucket_size=200):
+	"""
+	Hump detection as originally written with per-sample Python loops, kept
+	as the reference the vectorized envelope must reproduce.
+	"""
+	sec_per_x = (len(signal) / float(fs)) / float(len(signal))
+	signal_x = [i * sec_per_x for i in xrange(len(signal))]
+	signal_pos = [signal[x] if signal[x] > 0 else 1 for x in xrange(0, len(signal))]
+	maxes = [int(max(signal_pos[i:i + bucket_size])) for i in xrange(0, len(signal_pos), bucket_size)]
+	maxes_x = [signal_x[i] for i in xrange(0, len(signal), bucket_size)]
+	floor = np.std(maxes) * 0.25
+	humps = []
+	hump = None
+	for i in range(0, len(maxes) - 1):
+		max_y1 = maxes[i]
+		max_y2 = maxes[i + 1]
+		if max_y1 <= floor and max_y2 > floor:
+			hump = { 'start_index': i, 'start': i * bucket_size }
+		elif max_y1 > floor and max_y2 < floor:
+			if hump:
+				start_index = hump['start_index']
+				hump['start_sec'] = maxes_x[start_index]
+				hump['end'] = i * bucket_size
+				hump['end_sec'] = maxes_x[i]
+				hump['area'] = np.trapz(maxes[start_index:i])
+				del hump['start_index']
+				humps.append(hump)
+	return maxes_x, maxes, sorted(humps, key=lambda k: k['area'], reverse=True)
+
+
+def are_envelopes_equal(signal, fs):
+	reference_maxes_x, reference_maxes, reference_humps = get_reference_humps(signal, fs)
+	maxes_x, maxes = Signal(signal, fs).get_maxes()
+	humps = Signal(signal, fs).get_humps()
+	return list(maxes_x) == reference_maxes_x and list(maxes) == reference_maxes and humps == reference_humps
+
+
+def are_vowel_formants_accurate(vowel_str, method='autocorrelation'):
+	print 'testing vowel {} ({})'.format(vowel_str, method)
 	vowel = TEST_DATA[vowel_str]
-	test_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), vowel['filename'])
+	test_file = get_test_file(vowel_str)
 	test_file_type = get_file_type(test_file)
 	test_formants = vowel['formants']
 	signal, fs = get_signal(test_file, test_file_type)
-	formants = get_formants(signal, fs)
+	formants = get_formants(signal, fs, method)
 	observed_formants = get_f1_f2_f3(formants, FORMANTS['california'][vowel_str])
 	print 'test_formants: {}'.format(test_formants)
 	print 'observed_formants: {}'.format(observed_formants)
@@ -60,5 +115,291 @@ class FormantTests(unittest.TestCase):
     def test_u(self):
         self.assertTrue(are_vowel_formants_accurate('u'))
 
+    def test_burg(self):
+        for vowel_str in TEST_DATA:
+            self.assertTrue(are_vowel_formants_accurate(vowel_str, 'burg'))
+
+
+class SignalTests(unittest.TestCase):
+
+    def test_envelope_matches_reference(self):
+        for vowel_str in TEST_DATA:
+            test_file = get_test_file(vowel_str)
+            signal, fs = get_signal(test_file, get_file_type(test_file))
+            self.assertTrue(are_envelopes_equal(signal, fs), vowel_str)
+            # The test files hold only the vowel; surround it with low noise
+            # so that it forms a hump.
+            word = make_word(signal, fs)
+            self.assertTrue(are_envelopes_equal(word, fs), vowel_str)
+            self.assertEqual(len(Signal(word, fs).get_humps()), 1)
+
+    def test_envelope_partial_bucket(self):
+        signal = np.array([0, 5, -3, 9000, 12000, 40, -7, 20000, 3, 0, 1, 2] * 70 + [0] * 450, dtype=np.int16)
+        self.assertTrue(are_envelopes_equal(signal, 16000))
+
+    def test_envelope_open_hump(self):
+        # Starts and ends inside a hump, with a closed hump in between.
+        signal = np.array([9000] * 1000 + [0] * 1000 + [9000] * 1000 + [0] * 1000 + [9000] * 1000, dtype=np.int16)
+        self.assertTrue(are_envelopes_equal(signal, 16000))
+        self.assertEqual(len(Signal(signal, 16000).get_humps()), 1)
+
+    def test_analysis_stages_cached(self):
+        signal = np.array([0] * 1000 + [9000] * 1000 + [0] * 1000, dtype=np.int16)
+        signal = Signal(signal, 16000)
+        self.assertTrue(signal.get_maxes() is signal.get_maxes())
+        self.assertEqual(signal.get_humps(), signal.get_humps())
+        self.assertEqual(signal.get_main_vowel_range(), [1400, 1600])
+        self.assertEqual(signal.get_sec(1400), signal.signal_x[1400])
+        self.assertRaises(AttributeError, setattr, signal, 'signal_y', [])
+
+class FormantTrackTests(unittest.TestCase):
+
+    def test_track_matches_per_frame_formants(self):
+        for vowel_str in TEST_DATA:
+            test_file = get_test_file(vowel_str)
+            signal, fs = get_signal(test_file, get_file_type(test_file))
+            step = fs / 100
+            times, formants = track_formants(signal, fs, step, frame_len=2 * step)
+            self.assertEqual(formants.shape, (1 + (len(signal) - 2 * step) // step, 3))
+            self.assertEqual(times[1], step / float(fs))
+            for i, row in enumerate(formants):
+                expected = get_formants(signal[i * step:i * step + 2 * step], fs)[:3]
+                self.assertTrue(np.allclose(row, expected, atol=1e-6), vowel_str)
+
+    def test_chunked_formants_keep_last_chunk(self):
+        signal, fs = get_signal(get_test_file('i'), 'wav')
+        step = fs / 100
+        chunked = get_chunked_formants(signal, fs, step)
+        self.assertEqual(len(chunked), (len(signal) + step - 1) // step)
+        last = len(chunked) - 1
+        self.assertTrue(np.allclose(chunked[-1], get_formants(signal[last * step:], fs)[:3]))
+        self.assertTrue(np.allclose(chunked[0], get_formants(signal[:step], fs)[:3]))
+
+    def test_track_silence(self):
+        signal = np.zeros(1000, dtype=np.int16)
+        signal[400:600] = (np.sin(np.arange(200) * 0.3) * 5000).astype(np.int16)
+        times, formants = track_formants(signal, 10000)
+        self.assertEqual(formants.shape, (10, 3))
+        self.assertTrue(np.all(np.isnan(formants[:4])))
+        self.assertTrue(np.all(np.isnan(formants[6:])))
+        self.assertTrue(np.all(np.isfinite(formants[4:6, 0])))
+
+    def test_batch_matches_per_slice_formants(self):
+        # Slices of different lengths and rates, and silence.
+        slices = []
+        for vowel_str in sorted(TEST_DATA):
+            signal, fs = get_signal(get_test_file(vowel_str), 'wav')
+            slices += [(signal, fs), (signal[:len(signal) / 3], fs), decimate(signal, fs)]
+        # Shorter than the LPC order.
+        slices.append((signal[:10], fs))
+        slices.append((np.zeros(300, dtype=np.int16), 10000))
+        stages = []
+        batched = get_batch_formants(slices, hook=lambda stage, seconds, size: stages.append(stage))
+        for (signal, fs), formants in zip(slices, batched):
+            self.assertTrue(np.allclose(formants, get_formants(signal, fs), rtol=1e-9))
+        self.assertEqual(batched[-1], [])
+        # One pass per sample rate.
+        self.assertEqual(stages, ['lpc', 'roots'] * len(set(fs for signal, fs in slices[:-1])))
+
+class DecimationTests(unittest.TestCase):
+
+    def test_anti_aliasing(self):
+        t = np.arange(48000) / 48000.0
+        passed, fs = decimate(np.sin(2 * np.pi * 1000 * t), 48000)
+        self.assertEqual(fs, 12000)
+        self.assertEqual(len(passed), 12000)
+        self.assertTrue(0.95 < np.max(np.abs(passed[100:-100])) < 1.05)
+        stopped, fs = decimate(np.sin(2 * np.pi * 9000 * t), 48000)
+        self.assertTrue(np.max(np.abs(stopped[100:-100])) < 0.05)
+
+    def test_low_rate_unchanged(self):
+        signal = np.arange(100)
+        self.assertTrue(decimate(signal, 16000)[0] is signal)
+        self.assertTrue(decimate(signal, 48000, None)[0] is signal)
+
+    def test_formants_consistent_across_rates(self):
+        for vowel_str in TEST_DATA:
+            test_file = get_test_file(vowel_str)
+            signal, fs = get_signal(test_file, get_file_type(test_file))
+            expected = get_f1_f2_f3(get_formants(signal, fs), FORMANTS['california'][vowel_str])
+            for high_fs in [44100, 48000]:
+                resampled = resample(signal.astype(float), len(signal) * high_fs // fs)
+                decimated, decimated_fs = decimate(resampled, high_fs)
+                observed = get_f1_f2_f3(get_formants(decimated, decimated_fs), FORMANTS['california'][vowel_str])
+                self.assertTrue(is_close_enough(expected, observed), (vowel_str, high_fs))
+
+class ClassificationTests(unittest.TestCase):
+
+    def test_scores_match_per_model_scoring(self):
+        for vowel_str in TEST_DATA:
+            test_file = get_test_file(vowel_str)
+            signal, fs = get_signal(test_file, get_file_type(test_file))
+            formants = get_formants(signal, fs)
+            diphthong_formants = get_formants(signal[:len(signal) / 2], fs)
+            scores = score_all_models(formants, diphthong_formants)
+            for (dialect, vowel), diphthong, score in zip(MODELS['keys'], MODELS['diphthongs'], scores):
+                model_formants = FORMANTS[dialect][vowel]
+                expected = score_formants(diphthong_formants if diphthong else formants, model_formants)
+                self.assertEqual(score, expected['score'], (vowel_str, dialect, vowel))
+
+    def test_classify_vowel(self):
+        signal, fs = get_signal(get_test_file('i'), 'wav')
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            write_word(path, get_test_file('i'))
+            results = classify_vowel(path, vowel='i', dialect='michigan')
+            self.assertEqual(len(results['ranking']), len(MODELS['keys']))
+            self.assertEqual(results['ranking'][0]['vowel'], 'i')
+            ranked_scores = [row['score'] for row in results['ranking']]
+            self.assertEqual(ranked_scores, sorted(ranked_scores, reverse=True))
+            self.assertEqual(results['rating'], rate_vowel(path, 'i', 'michigan', None))
+            self.assertEqual(results['scores']['michigan']['i'], results['rating']['score'])
+
+            stages = []
+            rating = rate_vowel(path, 'i', 'michigan', None, hook=lambda stage, seconds, size: stages.append((stage, size)))
+            self.assertEqual(rating, results['rating'])
+            self.assertEqual([stage for stage, size in stages], ['decode', 'trim', 'segment', 'decimate', 'lpc', 'roots', 'score'])
+            self.assertEqual(stages[0][1], len(make_word(signal, fs)))
+        finally:
+            os.remove(path)
+
+class MultiFrameTests(unittest.TestCase):
+
+    def test_frame_formants(self):
+        for vowel_str in TEST_DATA:
+            signal, fs = get_signal(get_test_file(vowel_str), 'wav')
+            formants, spread, num_frames = estimate_frame_formants(signal, fs)
+            self.assertTrue(is_close_enough(TEST_DATA[vowel_str]['formants'], get_f1_f2_f3(formants, TEST_DATA[vowel_str]['formants'])), vowel_str)
+            self.assertEqual(len(spread), len(formants))
+            self.assertTrue(num_frames > 1)
+        self.assertEqual(estimate_frame_formants(np.zeros(1000), 16000), ([], [], 0))
+
+    def test_early_exit(self):
+        # A steady vowel settles after a couple of batches.
+        signal, fs = get_signal(get_test_file('ae'), 'wav')
+        formants, spread, num_frames = estimate_frame_formants(np.tile(signal, 4), fs)
+        self.assertTrue(num_frames < len(signal) * 4 / (fs * FRAME_STEP_SEC) / 2, num_frames)
+
+    def test_confidence(self):
+        signal, fs = get_signal(get_test_file('u'), 'wav')
+        word = make_word(signal, fs)
+        for dialect in ['california', 'michigan']:
+            rating = rate_signal(word, fs, 'u', dialect, multi_frame=True)
+            self.assertTrue(0 <= rating['confidence'] <= 1)
+            analysis = analyze_signal(word, fs, multi_frame=True)
+            f1_index = rating['formants']['f1_index']
+            self.assertEqual(rating['formants']['sample'], analysis['formants'][f1_index:f1_index + 3])
+            self.assertEqual(rating, rate_analysis(analysis, 'u', dialect))
+            self.assertFalse('confidence' in rate_signal(word, fs, 'u', dialect))
+
+        # Frames of noise do not agree with each other.
+        noise = (np.random.RandomState(0).randn(len(signal)) * 3000).astype(np.int16)
+        noisy_rating = rate_signal(make_word(noise, fs), fs, 'u', 'california', multi_frame=True)
+        self.assertTrue(noisy_rating['confidence'] < rating['confidence'])
+
+class InputGuardTests(unittest.TestCase):
+
+    def test_trim_silence(self):
+        signal, fs = get_signal(get_test_file('ae'), 'wav')
+        margin = fs / 4
+        silence = np.zeros(3 * fs, dtype=np.int16)
+        word = np.concatenate((silence, signal, silence))
+        start, end = trim_silence(word, fs)
+        self.assertTrue(len(silence) - margin - fs / 100 <= start <= len(silence) - margin)
+        self.assertTrue(len(silence) + len(signal) + margin <= end <= len(silence) + len(signal) + margin + fs / 100)
+        self.assertEqual(trim_silence(np.zeros(1000, dtype=np.int16), fs), (0, 1000))
+        self.assertEqual(trim_silence(np.array([-32768] * 10, dtype=np.int16), fs), (0, 10))
+
+    def test_duration(self):
+        signal, fs = get_signal(get_test_file('ae'), 'wav')
+        word = np.concatenate((np.zeros(3 * fs, dtype=np.int16), signal, np.zeros(fs / 4, dtype=np.int16)))
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            write_wav(path, word, fs)
+
+            analysis = analyze_vowel(path)
+            self.assertEqual(analysis['num_samples'], len(word))
+            self.assertTrue(analysis['trim'][0] > 2 * fs)
+            self.assertEqual(analysis['trim'][1], len(word))
+
+            self.assertRaisesRegexp(Exception, 'Recording too long', analyze_vowel, path, max_duration=2.)
+            self.assertRaisesRegexp(Exception, 'Recording too long', rate_vowel, path, 'ae', 'california', None, max_duration=2.)
+            self.assertEqual(len(get_signal(path, 'wav', 2., truncate=True)[0]), 2 * fs)
+        finally:
+            os.remove(path)
+
+def get_session_signal(vowel_strs, fs=16000):
+	"""
+	Join test vowels, at one sample rate, into a recording of several words.
+	"""
+	parts = []
+	for vowel_str in vowel_strs:
+		signal, file_fs = get_signal(get_test_file(vowel_str), 'wav')
+		if file_fs != fs:
+			signal = resample(signal, len(signal) * fs / file_fs).astype(np.int16)
+		parts += [np.zeros(fs / 4, dtype=np.int16), signal]
+	return np.concatenate(parts + [np.zeros(fs / 4, dtype=np.int16)]), fs
+
+class SessionTests(unittest.TestCase):
+
+    def test_analyze_session(self):
+        vowel_strs = ['ae', 'i', 'I', 'u']
+        signal, fs = get_session_signal(vowel_strs)
+        stages = []
+        analysis = analyze_session(signal, fs, hook=lambda stage, seconds, size: stages.append(stage))
+        # Every word is analyzed, with one batched LPC pass.
+        self.assertTrue(len(analysis['words']) >= len(vowel_strs))
+        self.assertEqual(stages.count('segment'), 1)
+        self.assertEqual(stages.count('lpc'), 1)
+
+        starts = [word['main_hump'][0] for word in analysis['words']]
+        self.assertEqual(starts, sorted(starts))
+
+        rating = rate_session_analysis(analysis, vowel_strs, 'california')
+        self.assertEqual([word['vowel'] for word in rating['words']], vowel_strs)
+        self.assertEqual(rating['scores'], [word['score'] for word in rating['words']])
+        self.assertEqual(rating['score'], np.mean(rating['scores']))
+        # Words are in order, each near where it was recorded.
+        word_len = len(signal) / float(fs) / len(vowel_strs)
+        for i, word in enumerate(rating['words']):
+            self.assertTrue(i * word_len <= word['time'][0] < word['time'][1] <= (i + 1) * word_len)
+
+        # Batched formants are those of each word's slice on its own.
+        trimmed = signal[analysis['trim'][0]:analysis['trim'][1]]
+        for word in analysis['words']:
+            vowel_range = word['vowel_range']
+            expected = get_formants(*decimate(trimmed[vowel_range[0]:vowel_range[1]], fs))
+            self.assertTrue(np.allclose(word['formants'], expected, rtol=1e-9))
+
+    def test_too_few_words(self):
+        signal, fs = get_session_signal(['ae', 'i'])
+        analysis = analyze_session(signal, fs)
+        self.assertRaisesRegexp(Exception, 'Expected 5 words, found', rate_session_analysis, analysis, ['ae'] * 5, 'california')
+        self.assertRaisesRegexp(Exception, 'Vowel not recognized', rate_session_analysis, analysis, ['ae', 'x'], 'california')
+        self.assertRaisesRegexp(Exception, 'Expected between 1', rate_session_analysis, analysis, [], 'california')
+
+    def test_rate_session(self):
+        signal, fs = get_session_signal(['ae', 'u'])
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            write_wav(path, signal, fs)
+            self.assertEqual(rate_session(path, ['ae', 'u'], 'california'), rate_session_analysis(analyze_session(signal, fs), ['ae', 'u'], 'california'))
+        finally:
+            os.remove(path)
+
+class ImportTests(unittest.TestCase):
+
+    def test_import_budget(self):
+        script = 'import sys, time; start = time.time(); import vowelpro.vowel; print time.time() - start; print " ".join(sys.modules)'
+        root_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=root_dir).splitlines()
+        import_time, modules = float(output[0]), output[1].split()
+        self.assertTrue(import_time <= IMPORT_BUDGET, 'import took %.3fs (budget %.3fs)' % (import_time, IMPORT_BUDGET))
+        for module in LAZY_MODULES:
+            self.assertFalse(module in modules, module)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
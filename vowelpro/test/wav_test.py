@@ -0,0 +1,96 @@
+import unittest
+from vowelpro.wav import read_wav
+from StringIO import StringIO
+import numpy as np
+import struct
+import tempfile
+import wave
+import os
+
+FS = 11025
+
+# Full-scale int16 test samples.
+SAMPLES = np.array([0, 1, -1, 256, -256, 12345, -12345, 32767, -32768], dtype=np.int16)
+
+
+def make_wav(data, channels, bits, format_tag=1, fs=FS):
+	"""
+	Build a WAV file (as a string) around raw sample data.
+	"""
+	block_align = channels * bits // 8
+	fmt = struct.pack('<HHIIHH', format_tag, channels, fs, fs * block_align, block_align, bits)
+	chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+	chunks += b'LIST' + struct.pack('<I', 3) + b'abc\x00'
+	chunks += b'data' + struct.pack('<I', len(data)) + data
+	return b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks
+
+
+def read_wav_string(data):
+	return read_wav(StringIO(data))
+
+
+class WavTests(unittest.TestCase):
+
+    def test_16_bit_file(self):
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            w = wave.open(path, 'wb')
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(FS)
+            w.writeframes(SAMPLES.tostring())
+            w.close()
+            signal, fs = read_wav(path)
+            self.assertEqual(fs, FS)
+            self.assertTrue(np.array_equal(signal, SAMPLES))
+            with open(path, 'rb') as f:
+                signal, fs = read_wav(f)
+            self.assertTrue(np.array_equal(signal, SAMPLES))
+        finally:
+            os.remove(path)
+
+    def test_8_bit(self):
+        data = ((SAMPLES >> 8) + 128).astype(np.uint8).tostring()
+        signal, fs = read_wav_string(make_wav(data, 1, 8))
+        self.assertTrue(np.array_equal(signal, (SAMPLES >> 8) << 8))
+
+    def test_24_bit(self):
+        samples = SAMPLES.astype('<i4') << 8
+        data = b''.join(struct.pack('<i', sample)[:3] for sample in samples)
+        signal, fs = read_wav_string(make_wav(data, 1, 24))
+        self.assertTrue(np.array_equal(signal, SAMPLES))
+
+    def test_32_bit(self):
+        data = (SAMPLES.astype('<i4') << 16).tostring()
+        signal, fs = read_wav_string(make_wav(data, 1, 32))
+        self.assertTrue(np.array_equal(signal, SAMPLES))
+
+    def test_float(self):
+        data = (SAMPLES / 32767.0).astype('<f4').tostring()
+        signal, fs = read_wav_string(make_wav(data, 1, 32, format_tag=3))
+        self.assertTrue(np.all(np.abs(signal.astype(int) - np.clip(SAMPLES, -32767, 32767)) <= 1))
+
+    def test_stereo_downmix(self):
+        stereo = np.column_stack((SAMPLES, np.zeros_like(SAMPLES))).astype('<i2')
+        signal, fs = read_wav_string(make_wav(stereo.tostring(), 2, 16))
+        self.assertTrue(np.array_equal(signal, (SAMPLES / 2.0).astype(np.int16)))
+
+    def test_unset_data_length(self):
+        data = make_wav(SAMPLES.astype('<i2').tostring(), 1, 16)
+        data = data[:-len(SAMPLES) * 2 - 4] + struct.pack('<I', 0xFFFFFFFF) + SAMPLES.astype('<i2').tostring()
+        signal, fs = read_wav_string(data)
+        self.assertTrue(np.array_equal(signal, SAMPLES))
+
+    def test_max_duration(self):
+        data = make_wav(np.tile(SAMPLES, FS).astype('<i2').tostring(), 1, 16)
+        self.assertRaisesRegexp(Exception, 'too long', read_wav, StringIO(data), 1.)
+        signal, fs = read_wav(StringIO(data), 1., truncate=True)
+        self.assertEqual(len(signal), FS)
+        self.assertEqual(len(read_wav(StringIO(data), 9.)[0]), 9 * FS)
+
+    def test_not_wav(self):
+        self.assertRaises(Exception, read_wav_string, b'ID3\x03' + b'\x00' * 100)
+
+if __name__ == '__main__':
+    unittest.main()
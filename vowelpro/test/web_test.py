@@ -0,0 +1,111 @@
+import unittest
+from vowelpro.web.web import DEFAULT_CONFIG, create_app, read_config
+from StringIO import StringIO
+import cherrypy
+import gzip
+import json
+import os
+import re
+import tempfile
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'web', 'static')
+
+
+def request(app, method, path, body='', content_type='', headers=None):
+	"""
+	Call a WSGI app, with extra request `headers`. Returns the status,
+	headers and body.
+	"""
+	environ = {
+		'REQUEST_METHOD': method,
+		'SCRIPT_NAME': '',
+		'PATH_INFO': path,
+		'QUERY_STRING': '',
+		'SERVER_NAME': 'localhost',
+		'SERVER_PORT': '80',
+		'SERVER_PROTOCOL': 'HTTP/1.1',
+		'HTTP_HOST': 'localhost',
+		'CONTENT_TYPE': content_type,
+		'CONTENT_LENGTH': str(len(body)),
+		'wsgi.version': (1, 0),
+		'wsgi.url_scheme': 'http',
+		'wsgi.input': StringIO(body),
+		'wsgi.errors': StringIO(),
+		'wsgi.multithread': True,
+		'wsgi.multiprocess': False,
+		'wsgi.run_once': False
+	}
+	for name, value in (headers or {}).items():
+		environ['HTTP_' + name.upper().replace('-', '_')] = value
+	response = {}
+
+	def start_response(status, headers, exc_info=None):
+		response['status'] = status
+		response['headers'] = dict(headers)
+
+	body = ''.join(app(environ, start_response))
+	return response['status'], response['headers'], body
+
+
+class WebAppTests(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({'vowelpro.workers': 1, 'log.screen': False})
+
+    def tearDown(self):
+        # Shuts down the rating pool.
+        cherrypy.engine.stop()
+
+    def test_metrics(self):
+        status, headers, body = request(self.app, 'GET', '/metrics')
+        self.assertEqual(status, '200 OK')
+        self.assertTrue(headers['Content-Type'].startswith('text/plain'))
+        self.assertTrue('vowelpro_in_flight 0.0' in body.splitlines())
+
+    def test_stream(self):
+        status, headers, body = request(self.app, 'POST', '/stream', 'fs=16000&vowel_str=ae&dialect=california', 'application/x-www-form-urlencoded')
+        stream_id = str(json.loads(body)['stream_id'])
+        status, headers, body = request(self.app, 'POST', '/stream/%s' % stream_id, '\x00\x01' * 400, 'application/octet-stream')
+        self.assertEqual(json.loads(body), {'samples': 400, 'humps': 0})
+
+    def test_static(self):
+        status, headers, body = request(self.app, 'GET', '/')
+        self.assertEqual(status, '200 OK')
+        url = re.search(r'src="(static/js/main\.[0-9a-f]{12}\.js)"', body).group(1)
+
+        status, headers, body = request(self.app, 'GET', '/' + url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertTrue('immutable' in headers['Cache-Control'])
+        self.assertFalse('Set-Cookie' in headers)
+        with open(os.path.join(STATIC_DIR, 'js/main.js'), 'rb') as f:
+            self.assertEqual(gzip.GzipFile(fileobj=StringIO(body)).read(), f.read())
+
+        status, headers, body = request(self.app, 'GET', '/static/js/main.js')
+        self.assertEqual(headers['Cache-Control'], 'no-cache')
+        self.assertFalse('Content-Encoding' in headers)
+        status, headers, body = request(self.app, 'GET', '/static/js/main.js', headers={'If-None-Match': headers['Etag']})
+        self.assertEqual((status, body), ('304 Not Modified', ''))
+
+        self.assertEqual(request(self.app, 'GET', '/static/missing.js')[0], '404 Not Found')
+
+    def test_static_range(self):
+        status, headers, body = request(self.app, 'GET', '/static/audio/bat.mp3', headers={'Range': 'bytes=0-99'})
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual((headers['Accept-Ranges'], headers['Content-Length']), ('bytes', '100'))
+        with open(os.path.join(STATIC_DIR, 'audio/bat.mp3'), 'rb') as f:
+            data = f.read()
+        self.assertEqual((headers['Content-Range'], body), ('bytes 0-99/%d' % len(data), data[:100]))
+
+    def test_read_config(self):
+        self.assertEqual(read_config('missing.conf'), DEFAULT_CONFIG)
+        handle, path = tempfile.mkstemp(suffix='.conf')
+        with os.fdopen(handle, 'w') as f:
+            f.write('[global]\nserver.socket_port = 9000\nvowelpro.workers = 2\n')
+        try:
+            self.assertEqual(read_config(path), {'server.socket_port': 9000, 'vowelpro.workers': 2})
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,284 @@
+import unittest
+from vowelpro.web import workers
+from vowelpro.web.workers import RatingPool, PoolBusy, JobTimeout, analyze_file, analyze_files, make_request, run_job
+from vowelpro.bench import write_word
+from vowelpro.cache import BytesLRUCache, LRUCache
+from vowelpro.vowel import get_signal, rate_vowel, analyze_vowel
+from StringIO import StringIO
+import numpy as np
+import tempfile
+import threading
+import time
+import os
+
+TEST_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files/bat.wav')
+
+
+class Unseekable(object):
+
+    def __init__(self, f):
+        self.read = f.read
+
+
+class RatingPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = RatingPool(workers=1, queue_size=0, timeout=5.0)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_rate(self):
+        with open(TEST_FILE, 'rb') as f:
+            # The bare vowel has no silence around it to segment on; the
+            # worker's error is raised in the caller.
+            self.assertRaisesRegexp(Exception, 'No vowel signal detected', self.pool.rate, f, 'ae', 'california')
+
+    def test_cache(self):
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            write_word(path, TEST_FILE)
+            self.pool.cache = LRUCache()
+            stages = []
+            for vowel_str, dialect in [('ae', 'california'), ('ae', 'michigan'), ('e', 'michigan')]:
+                with open(path, 'rb') as f:
+                    hook = lambda stage, seconds, size: stages.append(stage)
+                    self.assertEqual(self.pool.rate(f, vowel_str, dialect, hook), rate_vowel(path, vowel_str, dialect, 'wav'))
+            stats = self.pool.cache.stats()
+            self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+            # Uploads that cannot be read again are copied as they are hashed.
+            with open(path, 'rb') as f:
+                self.assertEqual(self.pool.rate(Unseekable(f), 'ae', 'california'), rate_vowel(path, 'ae', 'california', 'wav'))
+
+            # Both vowel slices are analyzed on a miss; a hit is only
+            # scored, without copying the upload for the workers.
+            analysis_stages = ['decimate', 'lpc', 'roots'] * 2
+            self.assertEqual(stages, ['upload', 'copy', 'decode', 'trim', 'segment'] + analysis_stages + ['wait', 'score'] + ['upload', 'score'] * 2)
+            self.assertEqual(self.pool.pending, 0)
+
+            # Analyses made over several frames are cached apart.
+            self.pool.multi_frame = True
+            with open(path, 'rb') as f:
+                self.assertTrue('confidence' in self.pool.rate(f, 'ae', 'california'))
+            self.assertEqual(self.pool.cache.stats()['misses'], 2)
+        finally:
+            os.remove(path)
+
+    def test_cache_settings(self):
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        pool = RatingPool(workers=1, queue_size=0, timeout=5.0, max_duration=2.0, truncate=True)
+        try:
+            write_word(path, TEST_FILE)
+            self.pool.cache = pool.cache = LRUCache()
+            for rating_pool in [self.pool, pool, self.pool]:
+                with open(path, 'rb') as f:
+                    rating_pool.rate(f, 'ae', 'california')
+            # Pools configured differently do not share analyses.
+            stats = self.pool.cache.stats()
+            self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 2, 2))
+        finally:
+            pool.close()
+            os.remove(path)
+
+    def test_sample_rate(self):
+        signal, fs = get_signal(TEST_FILE, 'wav')
+        with open(TEST_FILE, 'rb') as f:
+            self.assertRaisesRegexp(Exception, 'does not match the recording \(%d Hz\)' % fs, self.pool.rate, f, 'ae', 'california', fs=fs * 2)
+        with open(TEST_FILE, 'rb') as f:
+            self.assertRaisesRegexp(Exception, 'Sample rate not supported', self.pool.rate, f, 'ae', 'california', fs=1000)
+        with open(TEST_FILE, 'rb') as f:
+            # A matching rate goes on to the analysis.
+            self.assertRaisesRegexp(Exception, 'No vowel signal detected', self.pool.rate, f, 'ae', 'california', fs=str(fs))
+
+    def test_session(self):
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            write_word(path, TEST_FILE)
+            self.pool.cache = LRUCache()
+            stages = []
+            with open(path, 'rb') as f:
+                rating = self.pool.rate_session(f, ['ae'], 'california', lambda stage, seconds, size: stages.append(stage))
+            self.assertEqual(rating['scores'], [rate_vowel(path, 'ae', 'california', 'wav')['score']])
+            self.assertEqual(stages, ['upload', 'copy', 'decode', 'trim', 'segment', 'decimate', 'decimate', 'lpc', 'roots', 'wait', 'score'])
+            # Sessions are cached apart from single words.
+            with open(path, 'rb') as f:
+                self.pool.rate(f, 'ae', 'california')
+            self.assertEqual(self.pool.cache.stats()['misses'], 2)
+            self.assertRaisesRegexp(Exception, 'Vowel not recognized', self.pool.rate_session, StringIO(''), ['x'], 'california')
+        finally:
+            os.remove(path)
+
+    def test_render(self):
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            write_word(path, TEST_FILE)
+            self.pool.cache = LRUCache()
+            self.pool.images = BytesLRUCache()
+            with open(path, 'rb') as f:
+                self.pool.rate(f, 'ae', 'california')
+            for fmt, header in [('png', '\x89PNG'), ('svg', '<?xml')]:
+                stages = []
+                with open(path, 'rb') as f:
+                    image = self.pool.render(f, fmt, lambda stage, seconds, size: stages.append(stage))
+                self.assertTrue(image.startswith(header))
+                self.assertEqual(stages, ['upload', 'copy', 'render'])
+            # The analysis made when rating is drawn; images come from their cache.
+            self.assertEqual(self.pool.cache.stats()['hits'], 2)
+            with open(path, 'rb') as f:
+                self.assertEqual(self.pool.render(f, 'svg'), image)
+            self.assertEqual(self.pool.images.stats()['hits'], 1)
+            self.assertRaisesRegexp(Exception, 'Format not supported', self.pool.render, StringIO(''), 'gif')
+
+            # An analysis made while rendering is cached for rating in the
+            # same mode.
+            self.pool.multi_frame = True
+            with open(path, 'rb') as f:
+                self.pool.render(f, 'png')
+            with open(path, 'rb') as f:
+                self.assertEqual(self.pool.rate(f, 'ae', 'california'), rate_vowel(path, 'ae', 'california', 'wav', multi_frame=True))
+            self.assertEqual(self.pool.cache.stats()['hits'], 3)
+        finally:
+            os.remove(path)
+
+    def test_busy(self):
+        slot = self.pool.take_slot()
+        self.assertRaises(PoolBusy, self.pool.rate, StringIO(''), 'ae', 'california')
+        self.pool.release([slot])
+
+    def test_slot_held_until_job_done(self):
+        self.pool.timeout = 0.1
+        slot = self.pool.take_slot()
+        self.assertRaises(JobTimeout, self.pool.run, time.sleep, (1.5,), slot)
+        self.pool.release([slot])
+        # The job still runs in the worker, so no more are let in.
+        self.assertRaises(PoolBusy, self.pool.take_slot)
+        time.sleep(1.5)
+        self.pool.release([self.pool.take_slot()])
+        self.assertEqual(self.pool.pending, 0)
+
+    def test_abandoned_job_skipped(self):
+        calls = []
+        workers.JOB_STARTED, workers.JOB_ABANDONED = [0., 0.], [1, 0]
+        try:
+            result, error = run_job([0], calls.append, (1,))
+            self.assertTrue(isinstance(error, JobTimeout))
+            self.assertEqual((calls, workers.JOB_STARTED[0]), ([], 0.))
+            # A batch runs for the requests still waiting.
+            self.assertEqual(run_job([0, 1], calls.append, (2,)), (None, None))
+            self.assertEqual(calls, [2])
+            self.assertTrue(workers.JOB_STARTED[0] > 0)
+        finally:
+            workers.JOB_STARTED, workers.JOB_ABANDONED = None, None
+
+    def test_wait_starts_with_job(self):
+        pool = RatingPool(workers=1, queue_size=1, timeout=0.2)
+        try:
+            results = []
+            def run():
+                slot = pool.take_slot()
+                try:
+                    results.append(pool.run(time.sleep, (0.8,), slot))
+                except JobTimeout as e:
+                    results.append(e)
+                finally:
+                    pool.release([slot])
+            threads = [threading.Thread(target=run) for i in xrange(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # The second job waits for the first longer than the job
+            # timeout, but is only timed from when it starts.
+            self.assertEqual(results, [None, None])
+        finally:
+            pool.close()
+
+    def test_gauges(self):
+        pool = RatingPool(workers=1, queue_size=2, timeout=5.0)
+        try:
+            requests = [make_request(pool.take_slot()) for i in xrange(3)]
+            pool.start(time.sleep, (0.5,), requests[:1])
+            pool.start(time.sleep, (0,), requests[1:])
+            while not pool.job_started[requests[0]['slot']]:
+                time.sleep(0.01)
+            # A job of two requests waits for the busy worker.
+            self.assertEqual((pool.get_in_flight(), pool.get_queue_depth()), (1, 2))
+            for request in requests:
+                pool.wait(request)
+            self.assertEqual((pool.get_in_flight(), pool.get_queue_depth()), (0, 0))
+        finally:
+            pool.close()
+
+    def test_timeout(self):
+        self.assertRaises(JobTimeout, analyze_file, TEST_FILE, 1e-6)
+
+
+class BatchTests(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        write_word(self.path, TEST_FILE)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def assertAnalysesEqual(self, batched, analysis):
+        self.assertEqual(sorted(batched), sorted(analysis))
+        for key in analysis:
+            if key.endswith('formants'):
+                np.testing.assert_allclose(batched[key], analysis[key], rtol=1e-9)
+            else:
+                self.assertEqual(batched[key], analysis[key])
+
+    def test_analyze_files(self):
+        results = analyze_files([self.path, TEST_FILE, self.path], 5.0)
+        self.assertEqual(len(results), 3)
+        analysis = analyze_vowel(self.path, 'wav')
+        for batched, timings, error in [results[0], results[2]]:
+            self.assertEqual(error, None)
+            self.assertAnalysesEqual(batched, analysis)
+            self.assertEqual([stage for stage, seconds, size in timings], ['decode', 'trim', 'segment', 'decimate', 'decimate', 'lpc', 'roots'])
+        # A file that fails does not fail the others.
+        self.assertEqual(results[1][0], None)
+        self.assertTrue('No vowel signal detected' in str(results[1][2]))
+
+    def test_timeout(self):
+        results = analyze_files([self.path, self.path], 1e-6)
+        self.assertTrue(all(isinstance(error, JobTimeout) for analysis, timings, error in results))
+
+    def test_pool(self):
+        batches = []
+        pool = RatingPool(workers=2, queue_size=2, timeout=5.0, batch_size=4, batch_wait=0.5, on_batch=batches.append)
+        try:
+            ratings = {}
+            def rate(i):
+                with open(self.path if i != 2 else TEST_FILE, 'rb') as f:
+                    try:
+                        ratings[i] = pool.rate(f, 'ae', 'california')
+                    except Exception as e:
+                        ratings[i] = e
+            threads = [threading.Thread(target=rate, args=(i,)) for i in xrange(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # The batch is split between the workers.
+            self.assertEqual(batches, [2, 2])
+            rating = rate_vowel(self.path, 'ae', 'california', 'wav')
+            for i in [0, 1, 3]:
+                self.assertEqual(sorted(ratings[i]), sorted(rating))
+                self.assertAlmostEqual(ratings[i]['score'], rating['score'])
+            self.assertTrue('No vowel signal detected' in str(ratings[2]))
+            self.assertEqual(pool.pending, 0)
+        finally:
+            pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
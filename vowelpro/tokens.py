@@ -0,0 +1,204 @@
+"""
+Reference token stores: individual speakers' vowel tokens (eg. the full
+Hillenbrand et al. data), to score against instead of one mean per vowel.
+
+A store is an .npz file of parallel arrays, one entry per token:
+`dialects` and `vowels` (strings) and `formants` ([F1, F2, F3] in Hz).
+It can be made from a CSV file with a `dialect,vowel,f1,f2,f3` header:
+
+    PYTHONPATH=. python -m vowelpro.tokens tokens.csv tokens.npz
+
+Tokens are placed by their Bark difference front-back and height
+dimensions (see vowel.get_dimensions) and indexed with a k-d tree per
+dialect, and per vowel of each dialect, so that nearest-neighbour and
+density queries take microseconds, whatever the number of tokens. Rate
+with a TokenStore as the `scorer` of vowel.rate_vowel.
+"""
+
+import argparse
+import csv
+import numpy as np
+from vowelpro.vowel import VOWELS, get_f1_index
+
+
+# Tokens looked at around a sample (see TokenStore.score).
+NEIGHBOURS = 15
+
+# Radius (in Bark) of density queries.
+DENSITY_RADIUS = 0.5
+
+
+def get_coordinates(formants):
+
+    """
+    Get the front-back and height dimensions of [F1, F2, F3] formants
+    (rows of an array), as vowel.get_dimensions does.
+    """
+
+    formants = np.asarray(formants, dtype=float)
+    z = 26.81 / (1 + 1960 / formants) - 0.53
+    return np.column_stack((z[..., 2] - z[..., 1], z[..., 2] - z[..., 0]))
+
+
+def save_tokens(path, dialects, vowels, formants):
+
+    """
+    Write tokens (parallel sequences) to an .npz store.
+    """
+
+    formants = np.asarray(formants, dtype=np.float32)
+    if formants.ndim != 2 or formants.shape[1] != 3 or not len(dialects) == len(vowels) == len(formants):
+        raise Exception('Tokens need a dialect, a vowel and 3 formants each.')
+    np.savez_compressed(path, dialects=np.asarray(dialects, dtype=str), vowels=np.asarray(vowels, dtype=str), formants=formants)
+
+
+def read_csv(csv_path):
+
+    """
+    Read tokens from a CSV file with `dialect`, `vowel`, `f1`, `f2` and
+    `f3` columns. Returns dialects, vowels and formants.
+    """
+
+    dialects, vowels, formants = [], [], []
+    with open(csv_path, 'rb') as f:
+        for row in csv.DictReader(f):
+            dialects.append(row['dialect'].strip())
+            vowels.append(row['vowel'].strip())
+            formants.append([float(row[key]) for key in ('f1', 'f2', 'f3')])
+    return dialects, vowels, formants
+
+
+class TokenStore(object):
+
+    """
+    Reference tokens, indexed by dialect (see the module docstring).
+
+    `neighbours` tokens nearest to a sample, and the target vowel's tokens
+    within `radius` Bark of it, are looked at when scoring (see score()).
+    """
+
+    def __init__(self, dialects, vowels, formants, neighbours=NEIGHBOURS, radius=DENSITY_RADIUS):
+        from scipy.spatial import cKDTree
+
+        dialects = np.asarray(dialects, dtype=str)
+        vowels = np.asarray(vowels, dtype=str)
+        formants = np.asarray(formants, dtype=float)
+        coordinates = get_coordinates(formants)
+
+        self.neighbours = neighbours
+        self.radius = radius
+        self.dialects = {}
+        for dialect in np.unique(dialects):
+            in_dialect = dialects == dialect
+            entry = {
+                'vowels': vowels[in_dialect],
+                'tree': cKDTree(coordinates[in_dialect]),
+                'by_vowel': {}
+            }
+            for vowel in np.unique(entry['vowels']):
+                of_vowel = in_dialect & (vowels == vowel)
+                entry['by_vowel'][vowel] = {
+                    'tree': cKDTree(coordinates[of_vowel]),
+                    'formants': [float(f) for f in formants[of_vowel].mean(axis=0)]
+                }
+            self.dialects[dialect] = entry
+
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        data = np.load(path)
+        return cls(data['dialects'], data['vowels'], data['formants'], **kwargs)
+
+
+    def __len__(self):
+        return sum(len(entry['vowels']) for entry in self.dialects.values())
+
+
+    def get_vowel(self, vowel, dialect):
+        entry = self.dialects.get(dialect)
+        if entry is None or vowel not in entry['by_vowel']:
+            raise Exception('No reference tokens for vowel %s in dialect %s.' % (vowel, dialect))
+        return entry, entry['by_vowel'][vowel]
+
+
+    def nearest(self, point, dialect, k=None):
+
+        """
+        Get the `k` tokens of a dialect nearest to a (front-back, height)
+        point: their distances and vowels, nearest first.
+        """
+
+        entry = self.dialects[dialect]
+        k = min(k or self.neighbours, len(entry['vowels']))
+        distances, indices = entry['tree'].query(point, k)
+        return np.atleast_1d(distances), entry['vowels'][np.atleast_1d(indices)]
+
+
+    def density(self, point, vowel, dialect, radius=None):
+
+        """
+        Get the share of a vowel's tokens within `radius` Bark of a
+        (front-back, height) point.
+        """
+
+        entry, by_vowel = self.get_vowel(vowel, dialect)
+        tree = by_vowel['tree']
+        return len(tree.query_ball_point(point, radius or self.radius)) / float(tree.n)
+
+
+    def score(self, formants, vowel, dialect):
+
+        """
+        Score estimated formants against a vowel's tokens. The score is the
+        share of the nearest tokens that are of the vowel, out of 100.
+
+        Returns a rating as vowel.score_formants does, against the mean of
+        the vowel's tokens, with the vowels of the nearest tokens counted
+        (`neighbours`, eg. for feedback on which vowel was heard instead)
+        and the `density` of the vowel's tokens around the sample (see
+        density()).
+        """
+
+        entry, by_vowel = self.get_vowel(vowel, dialect)
+        model_formants = by_vowel['formants']
+        f1_index = get_f1_index(formants, model_formants)
+        sample_formants = formants[f1_index:f1_index + 3]
+        if len(sample_formants) < 3:
+            raise Exception('Not enough formants found.')
+
+        point = get_coordinates(sample_formants)[0]
+        model_point = get_coordinates(model_formants)[0]
+        distances, vowels = self.nearest(point, dialect)
+        neighbours = {}
+        for neighbour in vowels:
+            neighbours[str(neighbour)] = neighbours.get(str(neighbour), 0) + 1
+
+        return {
+            'score': int(100 * neighbours.get(vowel, 0) / len(vowels)),
+            'neighbours': neighbours,
+            'density': self.density(point, vowel, dialect),
+            'z_values': {
+                'sample_front_back': float(point[0]),
+                'model_front_back': float(model_point[0]),
+                'sample_height': float(point[1]),
+                'model_height': float(model_point[1])
+            },
+            'formants': {
+                'model': model_formants,
+                'sample': sample_formants,
+                'f1_index': f1_index
+            }
+        }
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Make a reference token store from a CSV file.')
+    parser.add_argument('csv', help='CSV file with dialect,vowel,f1,f2,f3 columns (vowels as in: %s).' % VOWELS.keys())
+    parser.add_argument('store', help='Token store (.npz) to write.')
+
+    args = parser.parse_args()
+
+    dialects, vowels, formants = read_csv(args.csv)
+    save_tokens(args.store, dialects, vowels, formants)
+    print 'Saved %d tokens.' % len(formants)
@@ -1,14 +1,37 @@
 import argparse
 import sys
 import os.path
-import matplotlib.pyplot as plt
 import numpy as np
 import math
-from scipy import stats
-import scipy.signal
-from scipy.signal import lfilter, hamming
-from scikits.talkbox import lpc
-from pydub import AudioSegment
+import timeit
+import warnings
+from vowelpro import lpc as linpred
+from vowelpro.wav import read_wav
+
+
+# Minimum sample rate (Hz) for formant estimation. Vowel formants lie below
+# 5 kHz, so signals are decimated towards this rate before LPC.
+ANALYSIS_FS = 10000
+
+# Sample rates (Hz) accepted from clients that state them: high enough to
+# cover the formants, at most a studio rate.
+MIN_FS = 8000
+MAX_FS = 192000
+
+# Longest recording (in seconds) analyzed. Longer ones are refused, or cut
+# to this length (see get_signal).
+MAX_DURATION_SEC = 20.
+
+# Compressed files are refused before decoding when they are bigger than
+# MAX_DURATION_SEC of audio at this many bytes per second (512 kbps, above
+# any MP3 or typical Ogg Vorbis bitrate).
+MAX_COMPRESSED_BYTES_PER_SEC = 64000
+
+# Leading and trailing silence, below this fraction of the loudest 10 ms
+# frame's peak, is trimmed before segmentation, keeping this many seconds
+# of it around the speech to segment the word against (see trim_silence).
+SILENCE_THRESHOLD = 0.05
+SILENCE_MARGIN_SEC = 0.25
 
 
 FILE_TYPES = {
@@ -90,12 +113,48 @@ FORMANTS = {
 }
 
 
-class Signal():
+# Vowel segment used for falling diphthongs (see Signal).
+DIPHTHONG_SLICE = dict(vowel_slice_index=1, vowel_slices=7)
+
+# Multi-frame formant estimation (see estimate_frame_formants): frames of
+# FRAME_SEC every FRAME_STEP_SEC, analyzed FRAME_BATCH at a time until the
+# median formants move by less than FRAME_TOLERANCE (relative).
+FRAME_SEC = 0.02
+FRAME_STEP_SEC = 0.005
+FRAME_BATCH = 4
+FRAME_TOLERANCE = 0.02
+
+# Formants tracked across frames: enough for F1-F3 whether F0 was found or
+# not (see get_f1_f2_f3). A frame's root further than FRAME_MATCH
+# (relative) from a formant is not taken for it.
+NUM_FRAME_FORMANTS = 4
+FRAME_MATCH = 0.25
+
+# Relative spread of F1-F3 across frames at which confidence is 0 (see
+# get_confidence).
+MAX_FORMANT_SPREAD = 0.25
+
+# Bounds of sessions, recordings of several words (see analyze_session).
+MAX_SESSION_WORDS = 64
+MAX_SESSION_DURATION_SEC = 120.
+
+
+class Signal(object):
 
     """
     Signal wrapper.
+
+    Only the raw signal is held eagerly. The time axis is derived on demand
+    and each analysis stage (maxes, floor, humps, main vowel range) is
+    computed once on first use and cached on the instance.
     """
 
+    __slots__ = (
+        'signal', 'fs', 'len', 'bucket_size', 'total_duration_sec', 'sec_per_x',
+        'vowel_slices', 'vowel_slice_index',
+        '_maxes', '_floor', '_humps', '_main_vowel_range'
+    )
+
     def __init__(self, signal, fs, bucket_size=200, vowel_slices=5, vowel_slice_index=3):
         self.signal = signal
         self.fs = fs
@@ -103,70 +162,132 @@ class Signal():
         self.bucket_size = bucket_size
         self.total_duration_sec = self.len / float(self.fs)
         self.sec_per_x = self.total_duration_sec / float(self.len)
-        self.signal_x = [i * self.sec_per_x for i in xrange(self.len)]
         self.vowel_slices = vowel_slices
         self.vowel_slice_index = vowel_slice_index
+        self._maxes = None
+        self._floor = None
+        self._humps = None
+        self._main_vowel_range = None
+
+
+    @property
+    def signal_x(self):
+
+        """
+        Time axis (in seconds) of the signal, built on each access.
+        """
+
+        return np.arange(self.len) * self.sec_per_x
+
+
+    def get_sec(self, index):
+
+        """
+        Get time (in seconds) of a signal index.
+        """
+
+        return index * self.sec_per_x
 
 
     def get_signal_pos(self):
 
         """
-        Get only positive values for signal.
+        Get only positive values for signal (non-positive values become 1).
         """
 
-        return [self.signal[x] if self.signal[x] > 0 else 1 for x in xrange(0, self.len)]
+        return np.where(self.signal > 0, self.signal, 1)
 
 
     def get_maxes(self):
 
         """
-        Get max values.
+        Get max values (cached).
+
+        The positive signal is padded out to a whole number of buckets and
+        reshaped to (buckets, bucket_size) so the max of every bucket is
+        found in one pass. Padding uses 1, the smallest positive value, so
+        it never affects a bucket max.
         """
 
+        if self._maxes is not None:
+            return self._maxes
+
         signal_pos = self.get_signal_pos()
-        maxes = [int(max(signal_pos[i:i + self.bucket_size])) for i in xrange(0, len(signal_pos), self.bucket_size)]
-        maxes_x = [self.signal_x[i] for i in xrange(0, self.len, self.bucket_size)]
+        num_buckets = -(-self.len // self.bucket_size)
+        padding = num_buckets * self.bucket_size - self.len
+        if padding:
+            signal_pos = np.concatenate((signal_pos, np.ones(padding, dtype=signal_pos.dtype)))
+        maxes = signal_pos.reshape(num_buckets, self.bucket_size).max(axis=1).astype(int)
+        maxes_x = np.arange(0, self.len, self.bucket_size) * self.sec_per_x
+
+        self._maxes = maxes_x, maxes
+        return self._maxes
 
-        return maxes_x, maxes
 
+    def get_floor(self, maxes=None):
+
+        """
+        Get intensity floor: a quarter of the standard deviation of the maxes.
+        The floor of this signal's own maxes is cached.
+        """
 
-    def get_floor(self, maxes):
-        std = np.std(maxes)
-        floor = std * 0.25
-        return floor
+        if maxes is not None:
+            return np.std(maxes) * 0.25
+
+        if self._floor is None:
+            self._floor = self.get_floor(self.get_maxes()[1])
+        return self._floor
 
 
     def get_humps(self):
 
         """
-        Get intensity humps.
+        Get intensity humps, largest area first (cached).
+        """
+
+        if self._humps is None:
+            self._humps = self._find_humps()
+        return list(self._humps)
+
+
+    def _find_humps(self):
+
+        """
+        Find intensity humps in the maxes.
+
+        A hump starts at bucket i when maxes[i] <= floor < maxes[i + 1] and
+        ends at bucket i when maxes[i] > floor > maxes[i + 1]. Each end is
+        paired with the most recent start before it; ends that come before
+        any start are ignored (the signal started inside a hump).
         """
 
         maxes_x, maxes = self.get_maxes()
-        floor = self.get_floor(maxes)        
-
-        humps = []
-        hump = None
-
-        for i in range(0, len(maxes) - 1):
-            max_y1 = maxes[i]
-            max_y2 = maxes[i + 1]
-            start_hump = max_y1 <= floor and max_y2 > floor
-            end_hump = max_y1 > floor and max_y2 < floor
-            if start_hump:
-                hump = { 'start_index': i, 'start': i * self.bucket_size }
-            elif end_hump:
-                # Make sure we didn't start already in a hump.
-                if hump: 
-                    start_index = hump['start_index']
-                    hump['start_sec'] = maxes_x[start_index]
-                    hump['end'] = i * self.bucket_size
-                    hump['end_sec'] = maxes_x[i]
-                    hump_signal = maxes[start_index:i] 
-                    area = np.trapz(hump_signal)
-                    hump['area'] = area
-                    del hump['start_index']
-                    humps.append(hump)
+        floor = self.get_floor()
+
+        if len(maxes) < 2:
+            return []
+
+        current, following = maxes[:-1], maxes[1:]
+        starts = np.flatnonzero((current <= floor) & (following > floor))
+        ends = np.flatnonzero((current > floor) & (following < floor))
+
+        start_positions = np.searchsorted(starts, ends) - 1
+        has_start = start_positions >= 0
+        ends = ends[has_start]
+        starts = starts[start_positions[has_start]]
+
+        # Trapezoidal area of maxes[start:end]: the sum minus half of each
+        # endpoint (which is 0 for single-bucket humps).
+        cumulative = np.concatenate(([0], np.cumsum(maxes)))
+        areas = cumulative[ends] - cumulative[starts] - (maxes[starts] + maxes[ends - 1]) / 2.0
+
+        humps = [{
+            'start': int(start) * self.bucket_size,
+            'start_sec': maxes_x[start],
+            'end': int(end) * self.bucket_size,
+            'end_sec': maxes_x[end],
+            'area': area
+        } for start, end, area in zip(starts, ends, areas)]
 
         return sorted(humps, key=lambda k: k['area'], reverse=True)
 
@@ -184,13 +305,39 @@ class Signal():
         return [vowel_x1, vowel_x2]
 
 
-    def get_main_vowel_range(self, main_hump):
+    def get_main_hump(self):
 
         """
-        Get vowel range for main hump.
+        Get the hump with the largest area.
         """
 
-        return self.get_vowel_range(main_hump['start'], main_hump['end'], self.vowel_slices, self.vowel_slice_index)
+        humps = self.get_humps()
+        if len(humps) == 0:
+            raise Exception("No vowel signal detected.")
+        return humps[0]
+
+
+    def get_word_humps(self, max_words=MAX_SESSION_WORDS):
+
+        """
+        Get the `max_words` humps with the largest area, in time order.
+        """
+
+        return sorted(self.get_humps()[:max_words], key=lambda k: k['start'])
+
+
+    def get_main_vowel_range(self, main_hump=None):
+
+        """
+        Get vowel range for main hump (cached when no hump is passed).
+        """
+
+        if main_hump is not None:
+            return self.get_vowel_range(main_hump['start'], main_hump['end'], self.vowel_slices, self.vowel_slice_index)
+
+        if self._main_vowel_range is None:
+            self._main_vowel_range = self.get_main_vowel_range(self.get_main_hump())
+        return list(self._main_vowel_range)
 
 
     def get_main_vowel_signal(self):
@@ -199,12 +346,8 @@ class Signal():
         Get main vowel signal.
         """
 
-        humps = self.get_humps()
-        if len(humps) == 0:
-            raise Exception("No vowel signal detected.")
-        main_hump = humps[0]
         # Only use middle 1/3 of vowel.
-        vowel_range = self.get_main_vowel_range(main_hump)
+        vowel_range = self.get_main_vowel_range()
         vowel_signal = self.signal[vowel_range[0]:vowel_range[len(vowel_range) - 1]]
         return vowel_signal
 
@@ -219,59 +362,14 @@ class Signal():
         return max_hz / float(len(fft))
 
 
-    def plot(self):
+    def plot(self, analysis=None):
 
         """
-        Show graphs.
+        Show graphs (see vowelpro.plot, which is only imported here).
         """
 
-        # Plot maxes
-        plt.subplot(411)
-        maxes_x, maxes = self.get_maxes()
-        plt.plot(maxes_x, maxes)
-        floor = self.get_floor(maxes)
-        plt.plot([0, self.total_duration_sec], [floor, floor], 'k-', lw=1, color='red', linestyle='solid')
-
-        # Plot waveform
-        plt.subplot(412)
-        plt.plot(self.signal_x, self.signal)
-        max_val = max(self.signal)
-
-        # Plot main hump.
-        main_hump = self.get_humps()[0]
-        signal_main_hump_start = main_hump['start']
-        signal_main_hump_end = main_hump['end']
-        for index in [signal_main_hump_start, signal_main_hump_end]:
-            signal_x_val = self.signal_x[index]
-            plt.plot([signal_x_val, signal_x_val], [max_val*-1, max_val], 'k-', lw=1, color='green', linestyle='solid')
-
-        # Plot vowel range.
-        vowel_range = self.get_main_vowel_range(main_hump)
-        for index in vowel_range:
-            signal_x_val = self.signal_x[index]
-            plt.plot([signal_x_val, signal_x_val], [max_val*-1, max_val], 'k-', lw=2, color='red', linestyle='dashed')
-
-        # Plot FFT
-        plt.subplot(413) 
-        fft = get_fft(self.get_main_vowel_signal())
-        hz_per_x = int(self.get_hz_per_x(fft, 8000))
-        fft_len = len(fft)
-        fft_x = [i * hz_per_x for i in xrange(fft_len)]
-        plt.plot(fft_x, fft)
-
-        # Plot spectrogram
-        ax = plt.subplot(414)
-        Pxx, freqs, bins, im = plt.specgram(self.signal, Fs=self.fs, scale_by_freq=True, sides='default')
-        ax.set_ylim(0, 5000)
-
-        # Plot formants every 10 ms.
-        step = self.fs / 100
-        chunked_formants = get_chunked_formants(self.signal, self.fs, step)
-        for i, formants in enumerate(chunked_formants):
-            for formant in formants:
-                plt.plot(self.signal_x[i * step], formant, marker='o', color='r')
-
-        plt.show()
+        from vowelpro.plot import plot_signal
+        plot_signal(self, analysis)
 
 
 def bark_diff(formants):
@@ -292,29 +390,151 @@ def get_fft(signal):
     return 20 * np.log10(abs(np.fft.rfft(signal)))
 
 
+def get_frames(signal, frame_len, step):
+
+    """
+    Get a read-only (n_frames, frame_len) view of the signal with frames
+    starting every `step` samples. Only whole frames are included.
+    """
+
+    signal = np.asarray(signal)
+    if len(signal) < frame_len:
+        return np.zeros((0, frame_len), dtype=signal.dtype)
+
+    num_frames = 1 + (len(signal) - frame_len) // step
+    stride = signal.strides[0]
+    frames = np.lib.stride_tricks.as_strided(signal, shape=(num_frames, frame_len), strides=(stride * step, stride))
+    frames.flags.writeable = False
+    return frames
+
+
+# Anti-aliasing filters by decimation factor.
+DECIMATION_TAPS = {}
+
+
+def get_decimation_taps(factor):
+
+    """
+    Get (and cache) the low-pass filter for decimating by `factor`.
+    """
+
+    if not factor in DECIMATION_TAPS:
+        # Hamming-windowed sinc with unit gain at DC (as scipy.signal.firwin).
+        numtaps = 8 * factor + 1
+        m = np.arange(numtaps) - (numtaps - 1) / 2.
+        taps = np.sinc(m / factor) * np.hamming(numtaps)
+        DECIMATION_TAPS[factor] = taps / np.sum(taps)
+    return DECIMATION_TAPS[factor]
+
+
+def decimate(signal, fs, analysis_fs=ANALYSIS_FS):
+
+    """
+    Decimate the signal by the largest integer factor that keeps its
+    sample rate at or above `analysis_fs`.
+
+    The signal is low-pass filtered (windowed-sinc FIR, cutoff at the new
+    Nyquist frequency) to avoid aliasing, evaluating the filter only at
+    the samples that are kept. Returns the decimated signal and its sample
+    rate; the signal is returned as-is if it cannot be decimated.
+    """
+
+    factor = max(1, int(fs // analysis_fs)) if analysis_fs else 1
+    if factor == 1:
+        return signal, fs
+
+    taps = get_decimation_taps(factor)
+    numtaps = len(taps)
+
+    # Pad so that the (linear phase) filter is centred on each kept sample.
+    padding = np.zeros(numtaps // 2)
+    padded = np.concatenate((padding, signal, padding))
+    decimated = get_frames(padded, numtaps, factor).dot(taps[::-1])
+
+    return decimated, fs / float(factor)
+
+
+def get_frame_formants(frames, fs, method='autocorrelation'):
+
+    """
+    Estimate formants for every frame (row) at once.
+
+    Pre-emphasis, autocorrelation, Levinson-Durbin and root finding (as
+    companion matrix eigenvalues) each run once over all frames. Returns
+    an (n_frames, n) array with each row's frequencies sorted ascending and
+    padded with NaN; silent frames are all NaN. `method` is as for
+    get_formants.
+    """
+
+    ncoeff = 2 + int(fs) / 1000
+
+    frames = np.atleast_2d(frames)
+    if frames.shape[0] == 0:
+        return np.zeros((0, ncoeff // 2))
+
+    from scipy.signal import lfilter
+    x1 = lfilter([1.], [1., 0.63], frames, axis=-1)
+    A, e = linpred.get_method(method)(x1, ncoeff)
+    rts = linpred.roots(A)
+
+    # Keep one root of each conjugate pair.
+    angz = np.where(rts.imag > 0, np.arctan2(rts.imag, rts.real), np.nan)
+    frqs = np.sort(angz * (fs / (2 * math.pi)), axis=-1)
+
+    # NaN sorts last, so the widest row decides how many columns to keep.
+    num_frqs = np.max(np.sum(np.isfinite(frqs), axis=-1))
+    return frqs[:, :max(num_frqs, 3)]
+
+
+def track_formants(signal, fs, step=None, frame_len=None, num_formants=3, method='autocorrelation'):
+
+    """
+    Track formants over time.
+
+    The signal is split into frames of `frame_len` samples (defaults to
+    `step`, ie. no overlap) every `step` samples (defaults to 10 ms).
+    Returns the start time (in seconds) of each frame and an
+    (n_frames, num_formants) array of formants, NaN where none was found.
+    """
+
+    step = step or int(fs / 100)
+    frame_len = frame_len or step
+
+    frames = get_frames(signal, frame_len, step)
+    formants = get_frame_formants(frames, fs, method)[:, :num_formants]
+    times = np.arange(len(frames)) * step / float(fs)
+
+    return times, formants
+
+
 def get_chunked_formants(signal, fs, step):
 
     """
     Find formants every x indexes.
+
+    Returns a list of up to 3 formants per chunk (see track_formants),
+    including the last, shorter chunk if the signal does not divide evenly.
     """
 
-    chunked_formants = []
-    
-    for index in xrange(0, len(signal), step):
-        next_index = index + step
-        signal_chunk = signal[index:next_index]
-        formants = get_formants(signal_chunk, fs)
-        signal_chunk_formants = formants[:3]
-        chunked_formants.append(signal_chunk_formants)
+    times, formants = track_formants(signal, fs, step)
+    chunked_formants = [list(row[np.isfinite(row)]) for row in formants]
+
+    # track_formants only takes whole frames.
+    if len(signal) % step:
+        chunked_formants.append(get_formants(signal[len(formants) * step:], fs)[:3])
 
     return chunked_formants
 
 
-def get_formants(x, fs):
+def get_formants(x, fs, method='autocorrelation', hook=None):
 
     """
     Estimate formants using LPC.
 
+    `method` is the LPC method: 'autocorrelation' (Levinson-Durbin), 'burg'
+    or any callable taking (signal, order) (see vowelpro.lpc). `hook` gets
+    the time taken by the LPC and root-finding stages (see report_stage).
+
     See:
     http://www.mathworks.com/help/signal/ug/formant-estimation-with-lpc-coefficients.html
     http://www.phon.ucl.ac.uk/courses/spsci/matlab/lect10.html
@@ -328,6 +548,9 @@ def get_formants(x, fs):
         # All zeroes
         return []
 
+    start = timeit.default_timer()
+
+    from scipy.signal import lfilter
     x1 = lfilter([1.], [1., 0.63], x)
 
     # Get Hamming window.
@@ -338,12 +561,14 @@ def get_formants(x, fs):
     # x1 = x * w
 
     # Get LPC.
-    ncoeff = 2 + fs / 1000
-    A, e, k = lpc(x1, ncoeff)
+    ncoeff = 2 + int(fs) / 1000
+    A, e = linpred.get_method(method)(x1, ncoeff)
+    start = report_stage(hook, 'lpc', start, len(x))
 
     # Get roots.
-    rts = np.roots(A)
+    rts = linpred.roots(A)
     rts = [r for r in rts if np.imag(r) > 0]
+    report_stage(hook, 'roots', start, ncoeff)
 
     # Get angles.
     angz = np.arctan2(np.imag(rts), np.real(rts))
@@ -354,6 +579,49 @@ def get_formants(x, fs):
     return frqs
 
 
+def get_batch_formants(slices, hook=None):
+
+    """
+    Estimate the formants of several (signal, fs) slices at once: as
+    get_formants on each (autocorrelation method), but with the LPC and
+    root finding of all slices of a sample rate done in one batched pass.
+    Slices are zero-padded to the same length after pre-emphasis, which
+    leaves their autocorrelation, and so their LPC coefficients, as they
+    are. `hook` gets the LPC and root-finding stages of each pass.
+    """
+
+    from scipy.signal import lfilter
+
+    formants = [[] for s in slices]
+    groups = {}
+    for i, (x, fs) in enumerate(slices):
+        # All zeroes have no formants.
+        if np.any(x):
+            groups.setdefault(fs, []).append(i)
+
+    for fs, indices in sorted(groups.items()):
+        start = timeit.default_timer()
+        padded = np.zeros((len(indices), max(len(slices[i][0]) for i in indices)))
+        for row, i in enumerate(indices):
+            x = slices[i][0]
+            padded[row, :len(x)] = lfilter([1.], [1., 0.63], x)
+
+        ncoeff = 2 + int(fs) / 1000
+        A, e = linpred.lpc(padded, ncoeff)
+        start = report_stage(hook, 'lpc', start, padded.size)
+
+        rts = linpred.roots(A)
+        report_stage(hook, 'roots', start, ncoeff * len(indices))
+
+        with np.errstate(invalid='ignore'):
+            angz = np.where(np.imag(rts) > 0, np.arctan2(np.imag(rts), np.real(rts)), np.nan)
+        for row, i in enumerate(indices):
+            frqs = angz[row][np.isfinite(angz[row])] * (fs / (2 * math.pi))
+            formants[i] = sorted(frqs)
+
+    return formants
+
+
 def get_rms_diff(a, b):
 
     """
@@ -369,10 +637,11 @@ def get_rms_diff(a, b):
     return rmsdiff
 
 
-def get_f1_f2_f3(sample_formants, model_formants):
+def get_f1_index(sample_formants, model_formants):
 
     """
-    Get [F1, F2, F3] of the sample formants.
+    Get the index of F1 in the sample formants: 0 if F0 was missed, 1 if
+    it was found.
 
     Calculate z-values both assuming F0 was found and assuming it was missed. 
     Compare them to the model and return whichever one is more similar to the model.
@@ -380,18 +649,26 @@ def get_f1_f2_f3(sample_formants, model_formants):
 
     model_z = bark_diff(model_formants)
 
-    sample_formants1 = sample_formants[:3] # Assumes F0 was missed.
-    sample_formants2 = sample_formants[1:4] # Assumes F0 was found.
-    sample_z1 = bark_diff(sample_formants1) 
-    sample_z2 = bark_diff(sample_formants2) 
+    sample_z1 = bark_diff(sample_formants[:3]) # Assumes F0 was missed.
+    sample_z2 = bark_diff(sample_formants[1:4]) # Assumes F0 was found.
     
     rms_diff1 = get_rms_diff(sample_z1, model_z)
     rms_diff2 = get_rms_diff(sample_z2, model_z)
 
     if rms_diff1 < rms_diff2:
-        return sample_formants1
+        return 0
+
+    return 1
+
+
+def get_f1_f2_f3(sample_formants, model_formants):
+
+    """
+    Get [F1, F2, F3] of the sample formants (see get_f1_index).
+    """
 
-    return sample_formants2
+    f1_index = get_f1_index(sample_formants, model_formants)
+    return sample_formants[f1_index:f1_index + 3]
 
 
 
@@ -457,6 +734,102 @@ def get_vowel_score(sample_z, model_z):
     }
 
 
+def score_formants(formants, model_formants):
+
+    """
+    Score estimated formants against a model vowel, as returned by
+    rate_vowel. The F1-F3 scored are `formants['sample']` of the rating,
+    from `formants['f1_index']` on (see get_f1_index).
+    """
+
+    f1_index = get_f1_index(formants, model_formants)
+    sample_formants = formants[f1_index:f1_index + 3]
+
+    sample_z = bark_diff(sample_formants)
+    model_z = bark_diff(model_formants)
+
+    results = get_vowel_score(sample_z, model_z)
+
+    results.update({
+        'formants': {
+            'model': model_formants,
+            'sample': sample_formants,
+            'f1_index': f1_index
+        }
+    })
+
+    return results
+
+
+def get_models():
+
+    """
+    Get every vowel of every dialect as parallel arrays: (dialect, vowel)
+    keys, Bark-converted model formants, their front-back and height
+    dimensions and whether the vowel is a diphthong in its dialect.
+    """
+
+    keys = [(dialect, vowel) for dialect in sorted(FORMANTS) for vowel in sorted(FORMANTS[dialect]) if vowel in VOWELS]
+    z = np.array([bark_diff(FORMANTS[dialect][vowel]) for dialect, vowel in keys])
+    diphthongs = np.array([vowel in FORMANTS[dialect].get('DIPHTHONGS', []) for dialect, vowel in keys])
+
+    return {
+        'keys': keys,
+        'z': z,
+        'front_back': z[:, 2] - z[:, 1],
+        'height': z[:, 2] - z[:, 0],
+        'diphthongs': diphthongs
+    }
+
+
+MODELS = get_models()
+
+
+def score_all_models(formants, diphthong_formants=None):
+
+    """
+    Score formants against every model vowel at once.
+
+    Vectorized equivalent of get_f1_f2_f3, bark_diff and get_vowel_score
+    over MODELS. `diphthong_formants` (formants of the diphthong slice of
+    the vowel) are used for models that are diphthongs. Returns an array
+    of scores parallel to MODELS['keys'].
+    """
+
+    def candidates(formants):
+        # Z-values assuming F0 was missed and assuming it was found
+        # (NaN when too few formants were found).
+        padded = np.full(4, np.nan)
+        padded[:min(len(formants), 4)] = formants[:4]
+        return 26.81 / (1 + 1960 / np.array([padded[:3], padded[1:4]])) - 0.53
+
+    if len(formants) < 3:
+        raise Exception('Not enough formants found.')
+
+    sample_z = np.empty((len(MODELS['keys']), 2, 3))
+    sample_z[:] = candidates(formants)
+    if diphthong_formants is not None:
+        if len(diphthong_formants) < 3:
+            raise Exception('Not enough formants found.')
+        sample_z[MODELS['diphthongs']] = candidates(diphthong_formants)
+
+    # Pick whichever candidate is closer to each model. As in get_f1_f2_f3,
+    # ties go to the second; a missing second candidate never wins.
+    with np.errstate(invalid='ignore'):
+        rms_diff = np.sqrt(np.sum((sample_z - MODELS['z'][:, np.newaxis, :]) ** 2, axis=-1) / 3)
+        use_first = ~(rms_diff[:, 1] <= rms_diff[:, 0])
+    sample_z = np.where(use_first[:, np.newaxis], sample_z[:, 0], sample_z[:, 1])
+
+    def percent_correct(actual, desired):
+        percent_off = np.abs(actual - desired) / desired
+        return np.where(percent_off >= 1.0, 0, 1 - percent_off)
+
+    front_back_per = percent_correct(sample_z[:, 2] - sample_z[:, 1], MODELS['front_back'])
+    height_per = percent_correct(sample_z[:, 2] - sample_z[:, 0], MODELS['height'])
+
+    return ((front_back_per + height_per) / 2 * 100).astype(int)
+
+
 def get_file_ext(filename):
     return filename.split('.').pop()
 
@@ -467,7 +840,7 @@ def get_file_type(vowel_file, file_type=None):
         if not file_type:
             file_ext = None
 
-            if type(vowel_file) is str:
+            if isinstance(vowel_file, basestring):
                 # `file` is file path.
                 file_ext = get_file_ext(vowel_file)
             else:
@@ -481,23 +854,71 @@ def get_file_type(vowel_file, file_type=None):
         raise Exception('Error determining file type. It may need to be passed explicitly. Must be one of: %s' % FILE_TYPES.keys())
 
 
-def read_file(vowel_file, file_type):
+def get_file_size(vowel_file):
+
+    """
+    Get the size (in bytes) of a file path or file object.
+    """
+
+    if isinstance(vowel_file, basestring):
+        return os.path.getsize(vowel_file)
+    position = vowel_file.tell()
+    vowel_file.seek(0, os.SEEK_END)
+    size = vowel_file.tell()
+    vowel_file.seek(position)
+    return size
+
+
+def read_compressed_file(vowel_file, file_type):
+
+    """
+    Decode a compressed file with pydub (see read_file). Returns the raw
+    int16 data, its sample rate and the size of a frame in bytes.
+    """
+
+    from pydub import AudioSegment
+
+    if file_type == FILE_TYPES['mp3']:
+        # MP3
+        audio = AudioSegment.from_mp3(vowel_file)
+    else:
+        # OGG
+        audio = AudioSegment.from_ogg(vowel_file)
+
+    return audio._data, audio.frame_rate, audio.frame_width
+
+
+def read_file(vowel_file, file_type, max_duration=None, truncate=False):
     # Read signal from file.
-    # NB: Needs to be mono. Does not work correctly with stereo.
+    # WAV files are decoded natively straight into an int16 array (mixed
+    # down to mono). Compressed formats are piped through a warm ffmpeg
+    # process (see vowelpro.decode), also into a mono int16 array, or, if
+    # there is no ffmpeg to run, go through pydub and come back as raw
+    # bytes.
+    # Recordings longer than max_duration are refused (see get_signal).
+    # NB: pydub output needs to be mono. Does not work correctly with stereo.
     try:     
 
         if file_type == FILE_TYPES['wav']:
             # WAV
-            audio = AudioSegment.from_wav(vowel_file)
-        elif file_type == FILE_TYPES['mp3']:
-            # MP3
-            audio = AudioSegment.from_mp3(vowel_file)
-        else:
-            # OGG
-            audio = AudioSegment.from_ogg(vowel_file)
+            return read_wav(vowel_file, max_duration, truncate)
+
+        if max_duration is not None and get_file_size(vowel_file) > max_duration * MAX_COMPRESSED_BYTES_PER_SEC:
+            raise Exception('Recording too long. Must be at most %g seconds.' % max_duration)
+
+        from vowelpro.decode import DecoderUnavailable, decode_file
 
-        signal = audio._data
-        fs = audio.frame_rate
+        try:
+            signal, fs = decode_file(vowel_file, file_type, max_duration)
+            frame_width = 1
+        except DecoderUnavailable:
+            signal, fs, frame_width = read_compressed_file(vowel_file, file_type)
+
+        max_len = int(max_duration * fs) * frame_width if max_duration is not None else None
+        if max_len is not None and len(signal) > max_len:
+            if not truncate:
+                raise Exception('Recording too long (over %g seconds).' % max_duration)
+            signal = signal[:max_len]
 
         return signal, fs
 
@@ -505,35 +926,78 @@ def read_file(vowel_file, file_type):
         raise Exception('Error reading signal from file: %s' % e)
 
 
-def get_signal(vowel_file, file_type):
+def get_signal(vowel_file, file_type, max_duration=MAX_DURATION_SEC, truncate=False):
+
+    """
+    Decode a recording as an int16 signal. Returns it and its sample rate.
 
-    signal, fs = read_file(vowel_file, file_type)
+    Recordings longer than `max_duration` seconds (None for no limit) are
+    refused, or cut to that length if `truncate` is set. WAV files are checked from their
+    header and compressed files from their size, before decoding; a
+    compressed file that is small enough but decodes too long is cut or
+    refused after decoding.
+    """
+
+    signal, fs = read_file(vowel_file, file_type, max_duration, truncate)
+
+    if isinstance(signal, np.ndarray):
+        # Already decoded.
+        return signal, fs
 
     # Truncate to nearest 16.
     signal_len = len(signal)
     signal_len = signal_len - (signal_len % 16)
-    signal = signal[:signal_len]
 
     try:
-        signal = np.fromstring(signal, 'Int16')
+        signal = np.frombuffer(signal, 'Int16', count=signal_len // 2)
         return signal, fs
     except ValueError as ve:
         raise Exception('Error converting signal to array: %s' % ve)
 
 
-def rate_vowel(vowel_file, vowel, dialect, file_type, show_graph=False):
+def trim_silence(signal, fs, threshold=SILENCE_THRESHOLD, margin_sec=SILENCE_MARGIN_SEC):
 
     """
-    Rate vowel as compared to model.
+    Find the speech in a signal, cutting its leading and trailing silence.
+
+    The peak of every 10 ms frame is found in one pass (as in
+    Signal.get_maxes); frames below `threshold` times the loudest peak are
+    silence. `margin_sec` of silence is kept on either side. Returns the
+    [start, end) sample range to keep: the whole signal if it is silent.
     """
 
+    frame_len = max(int(fs // 100), 1)
+    num_frames = -(-len(signal) // frame_len)
+    if num_frames == 0:
+        return 0, 0
+
+    padding = num_frames * frame_len - len(signal)
+    frames = np.concatenate((signal, np.zeros(padding, dtype=signal.dtype))).reshape(num_frames, frame_len)
+    # Peaks of the max and min separately: abs() of int16 overflows.
+    peaks = np.maximum(frames.max(axis=1).astype(np.int32), -frames.min(axis=1).astype(np.int32))
+
+    loud = np.flatnonzero(peaks >= max(threshold * peaks.max(), 1))
+    if len(loud) == 0:
+        return 0, len(signal)
+
+    margin = int(margin_sec * fs)
+    return max(loud[0] * frame_len - margin, 0), min((loud[-1] + 1) * frame_len + margin, len(signal))
+
+
+def validate_file_type(vowel_file, file_type):
     file_type = get_file_type(vowel_file, file_type)
 
     if not file_type in FILE_TYPES:
         raise Exception('Incorrect file type. Must be one of: %s' % FILE_TYPES.keys())
 
-    if not dialect in FORMANTS:
-        raise Exception('Dialect not recognized. Must be one of: %s' % FORMANTS.keys())
+    return file_type
+
+
+def validate_vowel(vowel, dialect):
+
+    """
+    Check the vowel and dialect, returning the dialect's formants.
+    """
 
     if not dialect in FORMANTS:
         raise Exception('Dialect not recognized. Must be one of: %s' % FORMANTS.keys())
@@ -546,39 +1010,545 @@ def rate_vowel(vowel_file, vowel, dialect, file_type, show_graph=False):
     if not vowel in dialect:
         raise Exception('Vowel not found in selected dialect. Must be one of: %s' % dialect.keys())
 
-    signal, fs = get_signal(vowel_file, file_type)
+    return dialect
+
+
+def validate_fs(fs):
+
+    """
+    Check a sample rate stated by a client, returning it as an int.
+    """
+
+    try:
+        fs = int(fs)
+    except (TypeError, ValueError):
+        raise Exception('Invalid sample rate.')
+
+    if not MIN_FS <= fs <= MAX_FS:
+        raise Exception('Sample rate not supported. Must be between %d and %d Hz.' % (MIN_FS, MAX_FS))
 
+    return fs
+
+
+def is_diphthong(vowel, dialect):
     diphthongs = 'DIPHTHONGS' in dialect and dialect['DIPHTHONGS']
+    return bool(diphthongs) and vowel in diphthongs
+
+
+def report_stage(hook, stage, start, size):
+
+    """
+    Report the wall time of a pipeline stage, which started at `start` (a
+    timeit.default_timer() reading), and the size of its input to
+    hook(stage, seconds, size). Does nothing if hook is None.
+
+    Returns the current time, for the next stage to start from.
+    """
+
+    now = timeit.default_timer()
+    if hook is not None:
+        hook(stage, now - start, size)
+    return now
+
+
+def estimate_vowel_formants(vowel_signal, fs, analysis_fs=ANALYSIS_FS, hook=None):
+
+    """
+    Estimate formants of an extracted vowel, decimated towards
+    `analysis_fs` first (see decimate).
+    """
+
+    start = timeit.default_timer()
+    decimated, vowel_fs = decimate(vowel_signal, fs, analysis_fs)
+    report_stage(hook, 'decimate', start, len(vowel_signal))
+    return get_formants(decimated, vowel_fs, hook=hook)
+
+
+def estimate_frame_formants(vowel_signal, fs, analysis_fs=ANALYSIS_FS, hook=None):
+
+    """
+    Estimate formants of an extracted vowel from several short, overlapping
+    frames, so that one noisy stretch cannot throw the estimate off.
+
+    The vowel is decimated (see decimate) and its formants estimated as a
+    whole (see get_formants), as a reference. It is then split into frames
+    of FRAME_SEC every FRAME_STEP_SEC, which go through LPC FRAME_BATCH at
+    a time (see get_frame_formants), from the middle of the vowel out. The
+    root of each frame nearest to each reference formant is taken for it,
+    and frames are added until the median of every formant moves by less
+    than FRAME_TOLERANCE from one batch to the next, or they run out.
+
+    Returns the median formants (up to NUM_FRAME_FORMANTS, in place of the
+    reference), their spread (median absolute deviation across frames, in
+    Hz) and the number of frames analyzed. `hook` gets 'decimate', 'lpc'
+    and 'roots' (for the reference) and, for each batch, 'frames' (sized in
+    samples).
+    """
+
+    start = timeit.default_timer()
+    decimated, vowel_fs = decimate(vowel_signal, fs, analysis_fs)
+    report_stage(hook, 'decimate', start, len(vowel_signal))
+
+    reference = np.array(get_formants(decimated, vowel_fs, hook=hook)[:NUM_FRAME_FORMANTS])
+    if len(reference) == 0:
+        return [], [], 0
+
+    start = timeit.default_timer()
+    frame_len = min(int(FRAME_SEC * vowel_fs), len(decimated))
+    step = max(int(FRAME_STEP_SEC * vowel_fs), 1)
+    frames = get_frames(decimated, frame_len, step)
+    centres = np.arange(len(frames)) * step + frame_len / 2.
+    frames = frames[np.argsort(np.abs(centres - len(decimated) / 2.), kind='mergesort')]
+
+    formants = np.zeros((0, len(reference)))
+    median = reference
+    with warnings.catch_warnings():
+        # Formants that no frame matched yet are all NaN, and so is their
+        # median.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i in xrange(0, len(frames), FRAME_BATCH):
+            roots = get_frame_formants(frames[i:i + FRAME_BATCH], vowel_fs)
+            distance = np.abs(roots[:, np.newaxis, :] - reference[np.newaxis, :, np.newaxis])
+            distance[np.isnan(distance)] = np.inf
+            nearest = np.argmin(distance, axis=-1)
+            rows = np.arange(len(roots))[:, np.newaxis]
+            matched = np.where(distance[rows, np.arange(len(reference)), nearest] <= FRAME_MATCH * reference, roots[rows, nearest], np.nan)
+            formants = np.vstack((formants, matched))
+            start = report_stage(hook, 'frames', start, len(roots) * frame_len)
+
+            previous, median = median, np.nanmedian(formants, axis=0)
+            if i and np.all(np.abs(median - previous) <= FRAME_TOLERANCE * previous):
+                break
+
+        spread = np.nanmedian(np.abs(formants - median), axis=0)
+
+    # Formants no frame had keep the reference, with no spread to go by.
+    unmatched = np.isnan(median)
+    median[unmatched] = reference[unmatched]
+    spread[unmatched] = 0.
+    return [float(f) for f in median], [float(s) for s in spread], len(formants)
+
+
+def get_confidence(f1_index, formants, spread, num_frames):
+
+    """
+    Get the confidence (0 to 1) in F1-F3 estimated from several frames
+    (see estimate_frame_formants). `f1_index` is the index of the F1
+    picked from `formants` for scoring (see get_f1_index).
+
+    It is 1 when the frames agree, falling to 0 as the mean relative
+    spread of F1-F3 reaches MAX_FORMANT_SPREAD, and is scaled down when
+    there were fewer than FRAME_BATCH frames to tell.
+    """
+
+    relative_spread = np.mean(np.array(spread[f1_index:f1_index + 3]) / np.array(formants[f1_index:f1_index + 3]))
+    confidence = max(1. - relative_spread / MAX_FORMANT_SPREAD, 0.) * min(num_frames / float(FRAME_BATCH), 1.)
+    return round(confidence, 2)
+
+
+def rate_vowel(vowel_file, vowel, dialect, file_type, show_graph=False, analysis_fs=ANALYSIS_FS, hook=None, max_duration=MAX_DURATION_SEC, truncate=False, multi_frame=False, scorer=None):
+
+    """
+    Rate vowel as compared to model.
+
+    Recordings longer than `max_duration` seconds are refused, or cut if
+    `truncate` is set (see get_signal), and leading and trailing silence
+    is trimmed (see trim_silence), so that the cost of the analysis
+    follows the speech rather than the recording.
+
+    The vowel is decimated towards `analysis_fs` before formant estimation
+    (see decimate); pass None to analyze it at the recorded rate.
+
+    With `multi_frame`, formants are the median over several frames of the
+    vowel (see estimate_frame_formants) and the rating has a `confidence`
+    (see get_confidence).
+
+    The formants are scored against the model vowel of FORMANTS, or by
+    `scorer`, an object whose score(formants, vowel, dialect) returns a
+    rating as score_formants does (eg. a tokens.TokenStore, scoring
+    against individual speakers' tokens).
+
+    `hook`, if given, is called as hook(stage, seconds, size) after each
+    stage of the pipeline: 'decode', 'trim', 'segment', 'decimate', 'lpc',
+    'roots' and 'score'. `size` is the size of the stage's input, in
+    samples (in LPC coefficients for 'roots', formants for 'score';
+    'decode' gives the samples decoded).
+    """
+
+    file_type = validate_file_type(vowel_file, file_type)
+    validate_vowel(vowel, dialect)
+
+    start = timeit.default_timer()
+    signal, fs = get_signal(vowel_file, file_type, max_duration, truncate)
+    report_stage(hook, 'decode', start, len(signal))
+
+    return rate_signal(signal, fs, vowel, dialect, show_graph, analysis_fs, hook, multi_frame, scorer)
+
+
+def rate_signal(signal, fs, vowel, dialect, show_graph=False, analysis_fs=ANALYSIS_FS, hook=None, multi_frame=False, scorer=None):
+
+    """
+    Rate the vowel in an already decoded int16 signal: rate_vowel without
+    the decoding.
+    """
+
+    dialect_name = dialect
+    dialect = validate_vowel(vowel, dialect)
+
+    start = timeit.default_timer()
+    trim_start, trim_end = trim_silence(signal, fs)
+    start = report_stage(hook, 'trim', start, len(signal))
 
     # NB: For falling diphtongs we want to find the formants for the first vowel only.
     kwargs = {}
-    if diphthongs and len(diphthongs) > 0 and vowel in diphthongs:
-        kwargs = dict(vowel_slice_index=1, vowel_slices=7)
+    if is_diphthong(vowel, dialect):
+        kwargs = DIPHTHONG_SLICE
 
-    signal = Signal(signal, fs, **kwargs)
-    vowel_signal = signal.get_main_vowel_signal()    
+    signal = Signal(signal[trim_start:trim_end], fs, **kwargs)
+    vowel_signal = signal.get_main_vowel_signal()
+    report_stage(hook, 'segment', start, signal.len)
 
-    formants = get_formants(vowel_signal, fs)
-    model_formants = dialect[vowel]
-    sample_formants = get_f1_f2_f3(formants, model_formants)
+    if multi_frame:
+        formants, spread, num_frames = estimate_frame_formants(vowel_signal, fs, analysis_fs, hook)
+    else:
+        formants = estimate_vowel_formants(vowel_signal, fs, analysis_fs, hook)
 
-    sample_z = bark_diff(sample_formants)
-    model_z = bark_diff(model_formants)
-    
     if show_graph:
-        signal.plot()
+        hump = signal.get_main_hump()
+        signal.plot({
+            'main_hump': [hump['start'], hump['end']],
+            'vowel_range': signal.get_main_vowel_range(),
+            'formants': [float(f) for f in formants]
+        })
+
+    start = timeit.default_timer()
+    if scorer is not None:
+        rating = scorer.score(formants, vowel, dialect_name)
+    else:
+        rating = score_formants(formants, dialect[vowel])
+    if multi_frame:
+        rating['confidence'] = get_confidence(rating['formants']['f1_index'], formants, spread, num_frames)
+    report_stage(hook, 'score', start, len(formants))
+    return rating
 
-    results = get_vowel_score(sample_z, model_z)
 
-    results.update({
-        'formants': {
-            'model': model_formants,
-            'sample': sample_formants
-        }
-    })
+def get_hump_ranges(signal, hump):
+
+    """
+    Get the sample ranges of a hump of a Signal and of its normal vowel and
+    diphthong slices, as kept in analyses.
+    """
+
+    return {
+        'main_hump': [hump['start'], hump['end']],
+        'vowel_range': signal.get_main_vowel_range(hump),
+        'diphthong_range': signal.get_vowel_range(hump['start'], hump['end'], DIPHTHONG_SLICE['vowel_slices'], DIPHTHONG_SLICE['vowel_slice_index'])
+    }
+
+
+def analyze_hump(signal, hump, analysis_fs=ANALYSIS_FS, hook=None, multi_frame=False):
+
+    """
+    Estimate the formants of the vowel in a hump of a Signal, for both the
+    normal vowel slice and the diphthong slice (see analyze_vowel). `hook`
+    is called for the stages of both estimates (see rate_vowel).
+
+    With `multi_frame`, the formants of each slice are estimated over
+    several frames (see estimate_frame_formants), and their spread and
+    number of frames are kept as `formant_spread` and `num_frames` (and
+    `diphthong_formant_spread` and `diphthong_num_frames`).
+    """
+
+    analysis = get_hump_ranges(signal, hump)
+
+    for prefix, vowel_range in [('', analysis['vowel_range']), ('diphthong_', analysis['diphthong_range'])]:
+        vowel_signal = signal.signal[vowel_range[0]:vowel_range[1]]
+        if multi_frame:
+            formants, spread, num_frames = estimate_frame_formants(vowel_signal, signal.fs, analysis_fs, hook)
+            analysis[prefix + 'formant_spread'] = spread
+            analysis[prefix + 'num_frames'] = num_frames
+        else:
+            formants = estimate_vowel_formants(vowel_signal, signal.fs, analysis_fs, hook)
+        analysis[prefix + 'formants'] = [float(f) for f in formants]
+
+    return analysis
+
+
+def analyze_vowel(vowel_file, file_type=None, analysis_fs=ANALYSIS_FS, hook=None, max_duration=MAX_DURATION_SEC, truncate=False, multi_frame=False):
+
+    """
+    Decode and segment a recording and estimate the formants of its vowel.
+
+    This is the expensive, target-independent part of rating. Formants are
+    estimated for both the normal vowel slice and the diphthong slice, so
+    the result can be scored against any vowel of any dialect (see
+    rate_analysis and classify_analysis). It only holds plain lists and
+    numbers, so it can be serialized as JSON. The recording is bounded and
+    trimmed, and `hook` is called after each stage, as in rate_vowel. For
+    `multi_frame`, see analyze_hump.
+
+    `num_samples` is the length of the decoded signal and `trim` the
+    [start, end) range of it that was analyzed. The other sample ranges
+    (`main_hump`, `vowel_range` and `diphthong_range`) are offsets into
+    the trimmed signal: add `trim[0]` to them for indexes into the
+    decoded one.
+    """
+
+    file_type = validate_file_type(vowel_file, file_type)
+
+    start = timeit.default_timer()
+    signal, fs = get_signal(vowel_file, file_type, max_duration, truncate)
+    report_stage(hook, 'decode', start, len(signal))
+
+    return analyze_signal(signal, fs, analysis_fs, hook, multi_frame)
+
+
+def analyze_signal(signal, fs, analysis_fs=ANALYSIS_FS, hook=None, multi_frame=False):
+
+    """
+    Analyze the vowel in an already decoded int16 signal: analyze_vowel
+    without the decoding.
+    """
+
+    signal, main_hump, analysis = segment_signal(signal, fs, hook)
+    analysis.update(analyze_hump(signal, main_hump, analysis_fs, hook, multi_frame))
+    return analysis
+
+
+def segment_signal(signal, fs, hook=None):
+
+    """
+    Trim a decoded signal and find its main hump. Returns the trimmed
+    Signal, the hump and the start of its analysis (`fs`, `num_samples`
+    and `trim`).
+    """
+
+    start = timeit.default_timer()
+    num_samples = len(signal)
+    trim_start, trim_end = trim_silence(signal, fs)
+    start = report_stage(hook, 'trim', start, num_samples)
+
+    signal = Signal(signal[trim_start:trim_end], fs)
+    main_hump = signal.get_main_hump()
+    report_stage(hook, 'segment', start, signal.len)
+
+    analysis = {
+        'fs': fs,
+        'num_samples': num_samples,
+        'trim': [int(trim_start), int(trim_end)]
+    }
+    return signal, main_hump, analysis
+
+
+def prepare_analysis(signal, fs, analysis_fs=ANALYSIS_FS, hook=None):
+
+    """
+    Analyze a decoded signal up to formant estimation: trim and segment it
+    and decimate its normal vowel and diphthong slices. Returns the
+    analysis so far and the (signal, fs) of both slices, whose formants
+    (eg. from get_batch_formants) complete it as `formants` and
+    `diphthong_formants`.
+    """
+
+    signal, main_hump, analysis = segment_signal(signal, fs, hook)
+    analysis.update(get_hump_ranges(signal, main_hump))
+
+    slices = []
+    for vowel_range in [analysis['vowel_range'], analysis['diphthong_range']]:
+        start = timeit.default_timer()
+        slices.append(decimate(signal.signal[vowel_range[0]:vowel_range[1]], fs, analysis_fs))
+        report_stage(hook, 'decimate', start, vowel_range[1] - vowel_range[0])
+
+    return analysis, slices
+
+
+def rate_analysis(analysis, vowel, dialect, scorer=None):
+
+    """
+    Rate an analyzed vowel (see analyze_vowel) as compared to model, or by
+    `scorer` (see rate_vowel). Gives the same result as rate_vowel on the
+    same recording.
+    """
+
+    dialect_formants = validate_vowel(vowel, dialect)
+
+    prefix = 'diphthong_' if is_diphthong(vowel, dialect_formants) else ''
+    formants = analysis[prefix + 'formants']
+
+    if scorer is not None:
+        rating = scorer.score(formants, vowel, dialect)
+    else:
+        rating = score_formants(formants, dialect_formants[vowel])
+    if prefix + 'formant_spread' in analysis:
+        rating['confidence'] = get_confidence(rating['formants']['f1_index'], formants, analysis[prefix + 'formant_spread'], analysis[prefix + 'num_frames'])
+    return rating
+
+
+def classify_analysis(analysis, vowel=None, dialect=None):
+
+    """
+    Score an analyzed vowel (see analyze_vowel) against every vowel of
+    every dialect at once (see classify_vowel).
+    """
+
+    if vowel or dialect:
+        validate_vowel(vowel, dialect)
+
+    model_scores = score_all_models(analysis['formants'], analysis['diphthong_formants'])
+
+    scores = {}
+    ranking = []
+    for index in np.argsort(-model_scores, kind='mergesort'):
+        model_dialect, model_vowel = MODELS['keys'][index]
+        score = int(model_scores[index])
+        scores.setdefault(model_dialect, {})[model_vowel] = score
+        ranking.append({
+            'dialect': model_dialect,
+            'vowel': model_vowel,
+            'score': score
+        })
+
+    results = {
+        'ranking': ranking,
+        'scores': scores
+    }
+
+    if vowel or dialect:
+        results['rating'] = rate_analysis(analysis, vowel, dialect)
 
     return results
 
+
+def classify_vowel(vowel_file, file_type=None, vowel=None, dialect=None, analysis_fs=ANALYSIS_FS):
+
+    """
+    Score a vowel against every vowel of every dialect at once.
+
+    The recording is decoded, segmented and run through LPC once (see
+    analyze_vowel) and the formants are scored against all models in one
+    vectorized pass (see score_all_models).
+
+    Returns a `ranking` of {dialect, vowel, score} dicts, best first, and
+    `scores` by dialect and vowel. If `vowel` and `dialect` are given, the
+    `rating` for that target (as returned by rate_vowel) is included too.
+    """
+
+    if vowel or dialect:
+        validate_vowel(vowel, dialect)
+
+    return classify_analysis(analyze_vowel(vowel_file, file_type, analysis_fs), vowel, dialect)
+
+
+def validate_vowels(vowels, dialect):
+
+    """
+    Check the vowels expected in a session and their dialect, returning
+    the dialect's formants.
+    """
+
+    if not 1 <= len(vowels) <= MAX_SESSION_WORDS:
+        raise Exception('Expected between 1 and %d vowels.' % MAX_SESSION_WORDS)
+
+    for vowel in vowels:
+        dialect_formants = validate_vowel(vowel, dialect)
+    return dialect_formants
+
+
+def analyze_session(signal, fs, analysis_fs=ANALYSIS_FS, hook=None):
+
+    """
+    Analyze every word of an already decoded recording of several words
+    (eg. a word list read out for practice), to be rated against a
+    sequence of vowels (see rate_session_analysis).
+
+    The recording is trimmed and its intensity envelope scanned once, the
+    vowel slices of every hump (up to MAX_SESSION_WORDS, the largest) are
+    extracted, and their formants estimated in one batched pass (see
+    get_batch_formants). Returns `fs`, `num_samples` and `trim`, as
+    analyze_vowel does, and `words`: the analysis of each hump, in time
+    order, with its `area`.
+    """
+
+    signal, main_hump, analysis = segment_signal(signal, fs, hook)
+
+    words = []
+    slices = []
+    for hump in signal.get_word_humps():
+        word = get_hump_ranges(signal, hump)
+        word['area'] = float(hump['area'])
+        for vowel_range in [word['vowel_range'], word['diphthong_range']]:
+            start = timeit.default_timer()
+            slices.append(decimate(signal.signal[vowel_range[0]:vowel_range[1]], fs, analysis_fs))
+            report_stage(hook, 'decimate', start, vowel_range[1] - vowel_range[0])
+        words.append(word)
+
+    formants = get_batch_formants(slices, hook)
+    for i, word in enumerate(words):
+        word['formants'], word['diphthong_formants'] = [[float(f) for f in formants[2 * i + j]] for j in (0, 1)]
+
+    analysis['words'] = words
+    return analysis
+
+
+def rate_session_analysis(analysis, vowels, dialect, scorer=None):
+
+    """
+    Rate an analyzed session (see analyze_session) against the vowels
+    expected, in order: the words are the len(vowels) humps with the
+    largest area, taken in time order. For `scorer`, see rate_vowel.
+
+    Returns a rating (as returned by rate_vowel) for each word, with its
+    `vowel` and its `time` in the recording ([start, end] seconds), as
+    `words`; their `scores`; and their mean `score`.
+    """
+
+    validate_vowels(vowels, dialect)
+
+    words = analysis['words']
+    if len(words) < len(vowels):
+        raise Exception('Expected %d words, found %d.' % (len(vowels), len(words)))
+    largest = sorted(xrange(len(words)), key=lambda i: words[i]['area'], reverse=True)[:len(vowels)]
+
+    ratings = []
+    offset = analysis['trim'][0]
+    for index, vowel in zip(sorted(largest), vowels):
+        word = words[index]
+        rating = rate_analysis(word, vowel, dialect, scorer)
+        rating['vowel'] = vowel
+        rating['time'] = [(offset + sample) / float(analysis['fs']) for sample in word['main_hump']]
+        ratings.append(rating)
+
+    scores = [rating['score'] for rating in ratings]
+    return {
+        'words': ratings,
+        'scores': scores,
+        'score': sum(scores) / float(len(scores))
+    }
+
+
+def rate_session(vowel_file, vowels, dialect, file_type=None, analysis_fs=ANALYSIS_FS, hook=None, max_duration=MAX_SESSION_DURATION_SEC, truncate=False, scorer=None):
+
+    """
+    Rate every word of a recording of several words against the vowels
+    expected, in order (see analyze_session and rate_session_analysis).
+    The recording is decoded once, and may be up to `max_duration` seconds
+    long.
+    """
+
+    validate_vowels(vowels, dialect)
+    file_type = validate_file_type(vowel_file, file_type)
+
+    start = timeit.default_timer()
+    signal, fs = get_signal(vowel_file, file_type, max_duration, truncate)
+    report_stage(hook, 'decode', start, len(signal))
+
+    analysis = analyze_session(signal, fs, analysis_fs, hook)
+
+    start = timeit.default_timer()
+    rating = rate_session_analysis(analysis, vowels, dialect, scorer)
+    report_stage(hook, 'score', start, len(vowels))
+    return rating
+
     
 if __name__ == '__main__':
     
@@ -588,10 +1558,17 @@ if __name__ == '__main__':
     parser.add_argument('dialect', metavar='d', help='Dialect to compare against. Must be one of: %s' % FORMANTS.keys())
     parser.add_argument('--extra', action='store_true', help='Extra flag for extra output (includes formants and normalized Bark Difference z-values).' )
     parser.add_argument('--graph', action='store_true', help='Graph flag to show graphs (waveform, vowel segmentation, FFT, spectrogram).' )
+    parser.add_argument('--frames', action='store_true', help='Estimate formants over several frames of the vowel, adding a confidence to the extra output.' )
+    parser.add_argument('--tokens', help='Reference token store (.npz, see vowelpro.tokens) to score against instead of the model vowel.' )
     
     args = parser.parse_args()
     
-    rating = rate_vowel(args.file, args.vowel, args.dialect, None, args.graph)
+    scorer = None
+    if args.tokens:
+        from vowelpro.tokens import TokenStore
+        scorer = TokenStore.load(args.tokens)
+    
+    rating = rate_vowel(args.file, args.vowel, args.dialect, None, args.graph, multi_frame=args.frames, scorer=scorer)
     
     if args.extra:
         print rating
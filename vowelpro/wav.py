@@ -0,0 +1,183 @@
+import mmap
+import struct
+import numpy as np
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Sample formats (format tag, bits per sample) to little-endian dtypes.
+# 24-bit PCM has no NumPy dtype and is unpacked separately.
+SAMPLE_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8')
+}
+
+INT16_MAX = 32767
+
+
+def map_file(wav_file):
+
+    """
+    Get a read-only buffer over the contents of a file.
+
+    `wav_file` may be a file path or a file object. Files backed by a real
+    file descriptor are memory mapped; anything else (eg. an in-memory
+    upload) is read once.
+    """
+
+    if isinstance(wav_file, basestring):
+        with open(wav_file, 'rb') as f:
+            return map_file(f)
+
+    try:
+        fileno = wav_file.fileno()
+    except (AttributeError, IOError, ValueError):
+        fileno = None
+
+    if fileno is not None:
+        try:
+            return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        except (mmap.error, ValueError):
+            # Empty or unmappable file; fall through and read it.
+            pass
+
+    wav_file.seek(0)
+    return wav_file.read()
+
+
+def parse_header(data):
+
+    """
+    Parse the RIFF/WAVE header.
+
+    Returns the `fmt ` chunk fields along with the offset and length (in
+    bytes) of the sample data.
+    """
+
+    if len(data) < 12 or data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise Exception('Not a RIFF/WAVE file.')
+
+    fmt = None
+    offset = 12
+
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size, = struct.unpack('<I', data[offset + 4:offset + 8])
+        chunk_start = offset + 8
+
+        if chunk_id == b'fmt ':
+            if chunk_size < 16:
+                raise Exception('Invalid fmt chunk.')
+            format_tag, channels, fs, _, block_align, bits = struct.unpack('<HHIIHH', data[chunk_start:chunk_start + 16])
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # The real format tag leads the sub-format GUID.
+                format_tag, = struct.unpack('<H', data[chunk_start + 24:chunk_start + 26])
+            fmt = {
+                'format_tag': format_tag,
+                'channels': channels,
+                'fs': fs,
+                'block_align': block_align,
+                'bits': bits
+            }
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise Exception('data chunk found before fmt chunk.')
+            # Streaming recorders may leave the size unset; clamp to what
+            # was actually received.
+            data_len = min(chunk_size, len(data) - chunk_start)
+            return fmt, chunk_start, data_len
+
+        # Chunks are word aligned.
+        offset = chunk_start + chunk_size + (chunk_size % 2)
+
+    raise Exception('No data chunk found.')
+
+
+def read_header(wav_file):
+
+    """
+    Get the `fmt ` chunk fields of a WAV file (see parse_header).
+    """
+
+    return parse_header(map_file(wav_file))[0]
+
+
+def unpack_24_bit(data, offset, num_samples):
+
+    """
+    Unpack 24-bit PCM into the top three bytes of int32 samples.
+    """
+
+    raw = np.frombuffer(data, dtype='u1', count=num_samples * 3, offset=offset).reshape(num_samples, 3)
+    samples = np.zeros((num_samples, 4), dtype='u1')
+    samples[:, 1:] = raw
+    return samples.view('<i4').reshape(num_samples)
+
+
+def to_int16(samples, format_tag, bits):
+
+    """
+    Scale samples of any supported format to the int16 range.
+    """
+
+    if samples.dtype == np.int16:
+        return samples
+
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        return (np.clip(samples, -1.0, 1.0) * INT16_MAX).astype(np.int16)
+
+    if bits == 8:
+        # 8-bit PCM is unsigned.
+        return ((samples.astype(np.int16) - 128) << 8).astype(np.int16)
+
+    # 24-bit samples were unpacked into int32 too.
+    return (samples >> 16).astype(np.int16)
+
+
+def read_wav(wav_file, max_duration=None, truncate=False):
+
+    """
+    Read a WAV file as a mono int16 signal.
+
+    Samples are exposed directly over the file's memory map (or upload
+    buffer) with np.frombuffer; 16-bit mono files, which is what the web
+    recorder sends, are never copied. Other sample formats are scaled to
+    int16 and multi-channel audio is mixed down to mono.
+
+    Files longer than `max_duration` seconds (going by the header, before
+    any samples are read) are refused, or cut to that length if
+    `truncate` is set.
+    """
+
+    data = map_file(wav_file)
+    fmt, offset, data_len = parse_header(data)
+
+    format_tag, channels, bits = fmt['format_tag'], fmt['channels'], fmt['bits']
+
+    if channels < 1 or fmt['block_align'] != channels * (bits // 8):
+        raise Exception('Invalid block alignment.')
+
+    num_frames = data_len // fmt['block_align']
+    if max_duration is not None and num_frames > max_duration * fmt['fs']:
+        if not truncate:
+            raise Exception('Recording too long (%.1f seconds). Must be at most %g seconds.' % (num_frames / float(fmt['fs']), max_duration))
+        num_frames = int(max_duration * fmt['fs'])
+
+    num_samples = num_frames * channels
+
+    if (format_tag, bits) == (WAVE_FORMAT_PCM, 24):
+        samples = unpack_24_bit(data, offset, num_samples)
+    elif (format_tag, bits) in SAMPLE_DTYPES:
+        samples = np.frombuffer(data, dtype=SAMPLE_DTYPES[(format_tag, bits)], count=num_samples, offset=offset)
+    else:
+        raise Exception('Unsupported sample format (format tag %s, %s bits).' % (format_tag, bits))
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(samples.dtype)
+
+    return to_int16(samples, format_tag, bits), fmt['fs']
@@ -0,0 +1,320 @@
+"""
+Static assets, fingerprinted and precompressed once at startup and served
+from memory.
+
+Every file under the static directory is known by its own path (eg.
+`js/main.js`) and by a fingerprinted one with a hash of its contents
+(eg. `js/main.0123456789ab.js`). Pages (index.html) are rewritten to use
+the fingerprinted paths, which are served as immutable; the plain paths,
+still used by scripts (eg. for the model words' audio), are revalidated
+against a strong ETag. Compressible files are kept gzipped, and brotli
+compressed if the brotli module is installed, alongside the originals.
+Originals are also served by byte range (eg. the audio, which some
+browsers only play from range responses).
+
+The same assets can be written out for a front-end server (eg. nginx with
+gzip_static), so that Python does not serve them at all:
+
+    PYTHONPATH=. python -m vowelpro.web.assets build out_dir
+"""
+
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from StringIO import StringIO
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Hex digits of the content hash in fingerprinted paths.
+FINGERPRINT_LEN = 12
+
+# Files worth compressing (others, like MP3s and WOFF fonts, already are)
+# and the smallest worth it.
+COMPRESSIBLE = ('.css', '.eot', '.html', '.ico', '.js', '.json', '.otf', '.svg', '.ttf', '.txt')
+MIN_COMPRESS_BYTES = 256
+
+# Content encodings, in order of preference, and the file suffixes of
+# their precompressed variants.
+ENCODINGS = ('br', 'gzip')
+SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz'
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# References to static files in pages.
+STATIC_REF = re.compile(r'''((?:src|href)=["'])static/([^"'?#]+)''')
+
+
+def fingerprint(path, digest):
+
+    """
+    Get the fingerprinted path of a file: its hash before its extension.
+    """
+
+    root, ext = os.path.splitext(path)
+    return '%s.%s%s' % (root, digest, ext)
+
+
+def gzip_data(data):
+    out = StringIO()
+    # A fixed mtime keeps the output, and so its ETag, the same across
+    # restarts.
+    with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+    return out.getvalue()
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip_data(data)
+    return brotli.compress(data)
+
+
+def get_encodings():
+    return [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+
+
+def parse_accept_encoding(header):
+
+    """
+    Get the content encodings a client accepts (those without q=0).
+    """
+
+    accepted = set()
+    for part in (header or '').split(','):
+        fields = [field.strip() for field in part.split(';')]
+        if not fields[0]:
+            continue
+        q = 1.
+        for field in fields[1:]:
+            if field.startswith('q='):
+                try:
+                    q = float(field[2:])
+                except ValueError:
+                    q = 0.
+        if q > 0:
+            accepted.add(fields[0].lower())
+    return accepted
+
+
+def parse_range(header, size):
+
+    """
+    Get the byte range, as (start, end) with `end` excluded, that a Range
+    header asks of `size` bytes. Returns None if the header is to be
+    ignored, ie. answered with every byte: missing, malformed or asking for
+    several ranges. A range that cannot be satisfied comes back empty.
+    """
+
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+    first, dash, last = [part.strip() for part in spec.partition('-')]
+    if not dash:
+        return None
+
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if end <= start and last:
+                return None
+        else:
+            # The last `last` bytes.
+            length = int(last)
+            if length < 0:
+                return None
+            start, end = size - length, size
+    except ValueError:
+        return None
+    return min(max(start, 0), size), min(max(end, start), size)
+
+
+def make_asset(data, path):
+
+    """
+    Make an asset of a file's contents: its content type, digest and
+    variants by content encoding ('identity' and any worth keeping of
+    ENCODINGS).
+    """
+
+    digest = hashlib.sha1(data).hexdigest()[:FINGERPRINT_LEN]
+    variants = {'identity': data}
+    if os.path.splitext(path)[1].lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+        for encoding in get_encodings():
+            compressed = compress(data, encoding)
+            if len(compressed) < len(data):
+                variants[encoding] = compressed
+
+    return {
+        'type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        'digest': digest,
+        'variants': variants
+    }
+
+
+class AssetStore(object):
+
+    """
+    The assets of a static directory, served under `prefix` (see the module
+    docstring).
+    """
+
+    def __init__(self, static_dir, prefix='static/'):
+        self.prefix = prefix
+        self.assets = {}
+        self.fingerprints = {}
+
+        for root, dirs, files in os.walk(static_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for filename in sorted(files):
+                if filename.startswith('.'):
+                    continue
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, static_dir).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    asset = make_asset(f.read(), path)
+                fingerprinted = fingerprint(path, asset['digest'])
+                self.assets[path] = (asset, False)
+                self.assets[fingerprinted] = (asset, True)
+                self.fingerprints[path] = fingerprinted
+
+
+    def get_url(self, path):
+
+        """
+        Get the fingerprinted URL of a static file (or its plain one if
+        there is no such file).
+        """
+
+        return self.prefix + self.fingerprints.get(path, path)
+
+
+    def rewrite(self, page):
+
+        """
+        Point a page's references to static files at their fingerprinted
+        paths.
+        """
+
+        return STATIC_REF.sub(lambda match: match.group(1) + self.get_url(match.group(2)), page)
+
+
+    def make_page(self, page_path):
+
+        """
+        Read a page and rewrite it (see rewrite()) as an asset.
+        """
+
+        with open(page_path, 'rb') as f:
+            return make_asset(self.rewrite(f.read()), page_path)
+
+
+    def respond(self, path, accept_encoding=None, if_none_match=None, range_header=None, if_range=None):
+
+        """
+        Answer a request for a static file. Returns the status, headers and
+        body.
+        """
+
+        if path not in self.assets:
+            return 404, {'Content-Type': 'text/plain'}, 'Not found.'
+        asset, immutable = self.assets[path]
+        return respond(asset, immutable, accept_encoding, if_none_match, range_header, if_range)
+
+
+    def write(self, out_dir, pages=()):
+
+        """
+        Write every asset under `out_dir`, by plain and fingerprinted path,
+        with its precompressed variants alongside (eg. `js/main.js.gz`), and
+        the rewritten `pages` (paths) at its top.
+        """
+
+        def write_asset(path, asset):
+            full_path = os.path.join(out_dir, path)
+            if not os.path.isdir(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            for encoding, data in asset['variants'].items():
+                with open(full_path + SUFFIXES.get(encoding, ''), 'wb') as f:
+                    f.write(data)
+
+        for path, (asset, immutable) in self.assets.items():
+            write_asset(os.path.join(self.prefix, path), asset)
+        for page_path in pages:
+            write_asset(os.path.basename(page_path), self.make_page(page_path))
+
+
+def respond(asset, immutable=False, accept_encoding=None, if_none_match=None, range_header=None, if_range=None):
+
+    """
+    Answer a request for an asset, in the best encoding the client
+    accepts. Fingerprinted (`immutable`) assets may be cached for good;
+    others are revalidated. Each variant has its own strong ETag, and
+    one the client has already gets a 304.
+
+    The original (identity) variant is also served by byte range (see
+    parse_range), unless an If-Range header names another ETag.
+    """
+
+    accepted = parse_accept_encoding(accept_encoding)
+    encoding = 'identity'
+    for candidate in ENCODINGS:
+        if candidate in asset['variants'] and candidate in accepted:
+            encoding = candidate
+            break
+
+    etag = '"%s%s"' % (asset['digest'], '' if encoding == 'identity' else '-' + encoding)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': IMMUTABLE if immutable else REVALIDATE,
+        'Content-Type': asset['type']
+    }
+    if len(asset['variants']) > 1:
+        headers['Vary'] = 'Accept-Encoding'
+
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return 304, headers, ''
+
+    body = asset['variants'][encoding]
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+        return 200, headers, body
+
+    headers['Accept-Ranges'] = 'bytes'
+    byte_range = parse_range(range_header, len(body))
+    if byte_range is None or (if_range and if_range.strip() != etag):
+        return 200, headers, body
+    start, end = byte_range
+    if start == end:
+        headers['Content-Range'] = 'bytes */%d' % len(body)
+        return 416, headers, ''
+    headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end - 1, len(body))
+    return 206, headers, body[start:end]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Write the fingerprinted, precompressed static assets and pages for a front-end server.')
+    subparsers = parser.add_subparsers(dest='command')
+    build_parser = subparsers.add_parser('build', help='Write the assets.')
+    build_parser.add_argument('out_dir', help='Directory to write to.')
+
+    args = parser.parse_args()
+
+    web_dir = os.path.dirname(os.path.abspath(__file__))
+    store = AssetStore(os.path.join(web_dir, 'static'))
+    store.write(args.out_dir, [os.path.join(web_dir, 'index.html')])
+    print 'Wrote %d assets.' % len(store.fingerprints)
@@ -0,0 +1,148 @@
+import threading
+
+
+# Histogram bucket upper bounds.
+SECONDS_BUCKETS = (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)
+BYTES_BUCKETS = tuple(4 ** i * 1024 for i in range(1, 8))
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Histogram(object):
+
+    """
+    Cumulative histogram of observed values, as Prometheus histograms are.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.
+
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def get_lines(self, name, labels=()):
+        lines = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts + [self.count]):
+            lines.append('%s_bucket%s %d' % (name, format_labels(tuple(labels) + (('le', format_value(bound)),)), count))
+        lines.append('%s_sum%s %s' % (name, format_labels(labels), format_value(self.sum)))
+        lines.append('%s_count%s %d' % (name, format_labels(labels), self.count))
+        return lines
+
+
+class Metrics(object):
+
+    """
+    Thread-safe metrics of the web service, rendered in the Prometheus text
+    exposition format:
+
+        vowelpro_stage_seconds: histogram of the wall time of each rating
+            stage (see vowel.rate_vowel), by stage.
+        vowelpro_stage_input_size_total: total input size of each stage.
+        vowelpro_upload_bytes: histogram of upload sizes.
+        vowelpro_batch_size: histogram of the number of uploads analyzed
+            together (see workers.RatingPool).
+        vowelpro_requests_total: requests by endpoint and outcome.
+
+    Gauges, like queue depth, and counters kept elsewhere are read when
+    rendering (see render()).
+    """
+
+    def __init__(self):
+        self.stage_seconds = {}
+        self.stage_sizes = {}
+        self.upload_bytes = Histogram(BYTES_BUCKETS)
+        self.batch_sizes = Histogram(BATCH_BUCKETS)
+        self.requests = {}
+        self.lock = threading.Lock()
+
+
+    def observe_stage(self, stage, seconds, size):
+
+        """
+        Record a pipeline stage. Can be used as the hook of
+        vowel.rate_vowel.
+        """
+
+        with self.lock:
+            if stage not in self.stage_seconds:
+                self.stage_seconds[stage] = Histogram(SECONDS_BUCKETS)
+                self.stage_sizes[stage] = 0
+            self.stage_seconds[stage].observe(seconds)
+            self.stage_sizes[stage] += size or 0
+
+
+    def observe_upload(self, num_bytes):
+        with self.lock:
+            self.upload_bytes.observe(num_bytes)
+
+
+    def observe_batch(self, size):
+        with self.lock:
+            self.batch_sizes.observe(size)
+
+
+    def count_request(self, endpoint, outcome):
+        with self.lock:
+            key = (endpoint, outcome)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+
+    def render(self, gauges=None, counters=None):
+
+        """
+        Get the metrics as Prometheus text. `gauges` and `counters` map
+        names of gauges and counters to their current values, eg.
+        {'vowelpro_queue_depth': 3}.
+        """
+
+        lines = []
+        with self.lock:
+            lines.append('# HELP vowelpro_stage_seconds Wall time of each rating stage.')
+            lines.append('# TYPE vowelpro_stage_seconds histogram')
+            for stage in sorted(self.stage_seconds):
+                lines.extend(self.stage_seconds[stage].get_lines('vowelpro_stage_seconds', (('stage', stage),)))
+
+            lines.append('# HELP vowelpro_stage_input_size_total Total input size of each rating stage (samples, coefficients, formants or bytes).')
+            lines.append('# TYPE vowelpro_stage_input_size_total counter')
+            for stage in sorted(self.stage_sizes):
+                lines.append('vowelpro_stage_input_size_total%s %d' % (format_labels((('stage', stage),)), self.stage_sizes[stage]))
+
+            lines.append('# HELP vowelpro_upload_bytes Size of uploaded recordings.')
+            lines.append('# TYPE vowelpro_upload_bytes histogram')
+            lines.extend(self.upload_bytes.get_lines('vowelpro_upload_bytes'))
+
+            lines.append('# HELP vowelpro_batch_size Uploads analyzed together.')
+            lines.append('# TYPE vowelpro_batch_size histogram')
+            lines.extend(self.batch_sizes.get_lines('vowelpro_batch_size'))
+
+            lines.append('# HELP vowelpro_requests_total Requests by endpoint and outcome.')
+            lines.append('# TYPE vowelpro_requests_total counter')
+            for (endpoint, outcome), count in sorted(self.requests.items()):
+                lines.append('vowelpro_requests_total%s %d' % (format_labels((('endpoint', endpoint), ('outcome', outcome))), count))
+
+        for metric_type, values in [('gauge', gauges), ('counter', counters)]:
+            for name, value in sorted((values or {}).items()):
+                lines.append('# TYPE %s %s' % (name, metric_type))
+                lines.append('%s %s' % (name, format_value(value)))
+
+        return '\n'.join(lines) + '\n'
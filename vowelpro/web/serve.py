@@ -0,0 +1,258 @@
+"""
+Run the web app in several processes sharing one listening socket.
+
+    PYTHONPATH=. python -m vowelpro.web.serve --processes 4
+
+The parent binds the socket, optionally imports and warms up the analysis
+stack (so that server processes fork with it loaded), then forks the server
+processes and keeps them running:
+
+    SIGHUP: graceful restart. The config file is read again and a new set
+        of processes is started; the old ones stop accepting connections
+        and exit once their requests are done.
+    SIGTERM, SIGINT: graceful shutdown.
+
+Code changes need a full restart, as processes fork from the parent.
+"""
+
+import argparse
+import errno
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import cherrypy
+from cherrypy import wsgiserver
+from vowelpro.web.web import GLOBAL_CONFIG_FILE_PATH, create_app, read_config
+
+
+# Processes that exit sooner than this (in seconds) after starting are
+# restarted after a pause, rather than straight away.
+MIN_UPTIME_SEC = 1.0
+
+# How often (in seconds) the parent checks on its processes and signals.
+POLL_SEC = 0.2
+
+# Connections the shared socket queues for the processes to accept, unless
+# set by server.socket_queue_size.
+LISTEN_BACKLOG = 128
+
+
+class SharedSocketServer(wsgiserver.CherryPyWSGIServer):
+
+    """
+    CherryPy WSGI server accepting on an already listening socket, shared
+    with other processes. `backlog` is the one the socket listens with:
+    CherryPy listens on it again when starting, so every process must pass
+    the same, or it changes the backlog for all of them.
+    """
+
+    def __init__(self, listener, backlog, wsgi_app, **kwargs):
+        wsgiserver.CherryPyWSGIServer.__init__(self, listener.getsockname()[:2], wsgi_app, request_queue_size=backlog, **kwargs)
+        self.listener = listener
+
+
+    def bind(self, family, type, proto=0):
+        self.socket = self.listener
+
+
+    def stop(self):
+        # Finish the requests in progress, but leave the socket alone:
+        # other processes are still accepting on it.
+        self.socket = None
+        wsgiserver.CherryPyWSGIServer.stop(self)
+
+
+def preload():
+
+    """
+    Import the analysis stack and run it once, so that it is loaded before
+    forking.
+    """
+
+    from vowelpro.web.workers import warm_up
+    handler = signal.getsignal(signal.SIGINT)
+    warm_up()
+    signal.signal(signal.SIGINT, handler)
+
+
+def listen(host, port, backlog=LISTEN_BACKLOG):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    return listener
+
+
+def run_server(listener, backlog, config):
+
+    """
+    Serve the app on the shared socket, listening with `backlog`, until
+    SIGTERM. Runs in a server process.
+    """
+
+    # Until serving, SIGTERM just ends the process.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    app = create_app(config)
+    server = SharedSocketServer(
+        listener,
+        backlog,
+        app,
+        numthreads=cherrypy.config.get('server.thread_pool', 10),
+        shutdown_timeout=cherrypy.config.get('server.shutdown_timeout', 5)
+    )
+
+    def stop(signum, frame):
+        server.ready = False
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.start()
+    finally:
+        server.stop()
+        cherrypy.engine.stop()
+
+
+class Supervisor(object):
+
+    """
+    Fork server processes and keep `processes` of them running, serving
+    on `listener`, a socket listening with `backlog`.
+    """
+
+    def __init__(self, listener, config_path, overrides, processes, backlog=LISTEN_BACKLOG):
+        self.listener = listener
+        self.backlog = backlog
+        self.config_path = config_path
+        self.overrides = overrides
+        self.processes = processes
+        self.config = None
+        self.children = {}
+        self.retiring = set()
+        self.reload = False
+        self.stopping = False
+
+
+    def read_config(self):
+        config = read_config(self.config_path)
+        config.update(self.overrides)
+        # Share the CPUs between the server processes' rating pools.
+        config.setdefault('vowelpro.workers', max(multiprocessing.cpu_count() // self.processes, 1))
+        return config
+
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_server(self.listener, self.backlog, self.config)
+            except Exception:
+                cherrypy.log('Server process failed.', traceback=True)
+                status = 1
+            finally:
+                os._exit(status)
+        self.children[pid] = time.time()
+
+
+    def kill(self, pids, signum=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+
+
+    def on_hup(self, signum, frame):
+        self.reload = True
+
+
+    def on_stop(self, signum, frame):
+        self.stopping = True
+
+
+    def run(self):
+        self.config = self.read_config()
+
+        signal.signal(signal.SIGHUP, self.on_hup)
+        signal.signal(signal.SIGTERM, self.on_stop)
+        signal.signal(signal.SIGINT, self.on_stop)
+
+        for i in xrange(self.processes):
+            self.spawn()
+
+        while self.children or self.retiring:
+            if self.stopping:
+                # Signal each process once, then let it drain. Retiring
+                # ones were signalled when they were retired.
+                self.kill(list(self.children))
+                self.retiring.update(self.children)
+                self.children = {}
+            elif self.reload:
+                self.reload = False
+                self.config = self.read_config()
+                old = list(self.children)
+                self.children = {}
+                for i in xrange(self.processes):
+                    self.spawn()
+                self.retiring.update(old)
+                self.kill(old)
+
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.ECHILD:
+                    break
+                raise
+
+            if pid == 0:
+                time.sleep(POLL_SEC)
+                continue
+
+            if pid in self.retiring:
+                self.retiring.remove(pid)
+            elif pid in self.children:
+                # Unexpected exit: replace the process.
+                started = self.children.pop(pid)
+                if not self.stopping:
+                    if time.time() - started < MIN_UPTIME_SEC:
+                        time.sleep(MIN_UPTIME_SEC)
+                    self.spawn()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Run the Vowel Pro web app in several processes.')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='Number of server processes (default: one per CPU).')
+    parser.add_argument('--config', default=GLOBAL_CONFIG_FILE_PATH, help='Global config file (default: %s).' % GLOBAL_CONFIG_FILE_PATH)
+    parser.add_argument('--host', help='Address to listen on (default: server.socket_host).')
+    parser.add_argument('--port', type=int, help='Port to listen on (default: server.socket_port).')
+    parser.add_argument('--no-preload', action='store_true', help='Do not load the analysis stack before forking (overrides vowelpro.preload).')
+
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.host:
+        overrides['server.socket_host'] = args.host
+    if args.port:
+        overrides['server.socket_port'] = args.port
+
+    supervisor = Supervisor(None, args.config, overrides, max(args.processes, 1))
+    config = supervisor.read_config()
+
+    if config.get('vowelpro.preload', True) and not args.no_preload:
+        preload()
+
+    # The socket is only made once, so a changed backlog needs a restart.
+    supervisor.backlog = config.get('server.socket_queue_size', LISTEN_BACKLOG)
+    supervisor.listener = listen(config.get('server.socket_host', '127.0.0.1'), config.get('server.socket_port', 8080), supervisor.backlog)
+    sys.stderr.write('Serving on %s:%d with %d processes.\n' % (supervisor.listener.getsockname()[:2] + (supervisor.processes,)))
+    supervisor.run()
@@ -27,44 +27,35 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (SpeechRec.isRecording()) {
                     recordElem.disabled = true;
                     spinnerElem.classList.remove('hidden');
-                    SpeechRec.stop(function(blob) {
-                        var vowel = Word.getVowel();
-                        var dialect = dialectElem.options[dialectElem.selectedIndex].value;
-                        rateVowel(blob, vowel, dialect, function(xhrEvent) {
-                            var response = xhrEvent && xhrEvent.target && 
-                                    xhrEvent.target.response && JSON.parse(xhrEvent.target.response);
-                            if (!response) {
-                                errorElem.innerHTML = 'Error retrieving response from server.';
-                                return;
-                            }
-                            if (response.error) {
-                                errorElem.innerHTML = response.error;
+                    SpeechRec.stop(function(response) {
+                        if (!response) {
+                            errorElem.innerHTML = 'Error retrieving response from server.';
+                        } else if (response.error) {
+                            errorElem.innerHTML = response.error;
+                        } else {
+                            var score = response.score;
+                            var msg;
+                            if (score >= 90) {
+                                msg = 'Excellent!';
+                            } else if (score >= 80) {
+                                msg = 'Very nice!';
+                            } else if (score >= 75) {
+                                msg = 'Good!';
                             } else {
-                                var score = response.score;
-                                var msg;
-                                if (score >= 90) {
-                                    msg = 'Excellent!';
-                                } else if (score >= 80) {
-                                    msg = 'Very nice!';
-                                } else if (score >= 75) {
-                                    msg = 'Good!';
-                                } else {
-                                    msg = 'Good try!';
-                                }
-                                scoreElem.innerHTML = score;
-                                msgElem.innerHTML = msg;
+                                msg = 'Good try!';
                             }
-                            recordElem.disabled = false;
-                            spinnerElem.classList.add('hidden');
-                            recordTextElem.innerHTML = 'Record';
-                            recordElem.style.color = 'black';
-                            //SpeechRec.download(blob); 
-                        }, function(error) {
-                            errorElem.innerHTML = error;
-                        });
+                            scoreElem.innerHTML = score;
+                            msgElem.innerHTML = msg;
+                        }
+                        recordElem.disabled = false;
+                        spinnerElem.classList.add('hidden');
+                        recordTextElem.innerHTML = 'Record';
+                        recordElem.style.color = 'black';
                     });
                 } else {
-                    SpeechRec.start();
+                    var vowel = Word.getVowel();
+                    var dialect = dialectElem.options[dialectElem.selectedIndex].value;
+                    SpeechRec.start(vowel, dialect);
                     clearElems();
                     recordTextElem.innerHTML = 'Stop';
                     recordElem.style.color = 'red';
@@ -103,18 +94,5 @@ document.addEventListener('DOMContentLoaded', function() {
         ipaElem.innerHTML =  '/' + Word.getVowelIpa() + '/';
         clearElems();
     }
-    
-    function rateVowel(blob, vowel, dialect, success, failure) {
-        var formData = new FormData();
-        formData.append('file', blob);
-        formData.append('vowel_str', vowel);
-        formData.append('dialect', dialect);
-
-        var xhr = new XMLHttpRequest();
-        xhr.open('POST', '/rate', true);
-        xhr.addEventListener('load', success);
-        xhr.addEventListener('error', failure);
-        xhr.send(formData);
-    }         
 
 });
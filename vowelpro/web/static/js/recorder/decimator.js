@@ -0,0 +1,103 @@
+(function(global){
+
+  /**
+   * Low-pass filter and decimate audio by the largest integer factor that
+   * keeps its sample rate at or above analysisRate, as the server does
+   * (see vowel.decimate): Hamming-windowed sinc FIR with unit gain at DC,
+   * evaluated only at the samples that are kept.
+   *
+   * Samples can be passed in chunks as they are recorded; call flush() at
+   * the end to get the last samples out.
+   */
+  var Decimator = function(sampleRate, analysisRate){
+    this.factor = Math.max(1, Math.floor(sampleRate / analysisRate));
+    this.sampleRate = Math.round(sampleRate / this.factor);
+    this.taps = getTaps(this.factor);
+    // Input not consumed yet, starting half a filter length before the
+    // next output sample (zeros at first, as the server pads).
+    this.pending = new Float32Array((this.taps.length - 1) / 2);
+  };
+
+  function getTaps(factor){
+    var numtaps = 8 * factor + 1;
+    var taps = new Float32Array(numtaps);
+    var sum = 0;
+    for (var i = 0; i < numtaps; i++){
+      var m = i - (numtaps - 1) / 2;
+      var x = Math.PI * m / factor;
+      var sinc = m === 0 ? 1 : Math.sin(x) / x;
+      var hamming = 0.54 - 0.46 * Math.cos(2 * Math.PI * i / (numtaps - 1));
+      taps[i] = sinc * hamming;
+      sum += taps[i];
+    }
+    for (var j = 0; j < numtaps; j++){
+      taps[j] /= sum;
+    }
+    return taps;
+  }
+
+  Decimator.prototype.process = function(samples){
+    if (this.factor === 1){
+      return samples;
+    }
+
+    var input = new Float32Array(this.pending.length + samples.length);
+    input.set(this.pending, 0);
+    input.set(samples, this.pending.length);
+
+    var taps = this.taps, numtaps = taps.length, factor = this.factor;
+    var count = Math.max(0, Math.floor((input.length - numtaps) / factor) + 1);
+    var output = new Float32Array(count);
+    for (var n = 0; n < count; n++){
+      var start = n * factor, acc = 0;
+      for (var k = 0; k < numtaps; k++){
+        acc += taps[k] * input[start + k];
+      }
+      output[n] = acc;
+    }
+
+    this.pending = input.subarray(count * factor);
+    return output;
+  };
+
+  Decimator.prototype.flush = function(){
+    return this.process(new Float32Array((this.taps.length - 1) / 2));
+  };
+
+  /**
+   * Cut leading and trailing silence, keeping `margin` seconds of it on
+   * either side (the server segments the word against that). Silence is
+   * any 10 ms frame whose peak is below `threshold` times the loudest
+   * frame's.
+   */
+  Decimator.trimSilence = function(samples, sampleRate, threshold, margin){
+    var frameLen = Math.max(1, Math.round(sampleRate / 100));
+    var numFrames = Math.ceil(samples.length / frameLen);
+    var peaks = new Float32Array(numFrames);
+    var loudest = 0;
+    for (var i = 0; i < samples.length; i++){
+      var value = Math.abs(samples[i]);
+      var frame = Math.floor(i / frameLen);
+      if (value > peaks[frame]){
+        peaks[frame] = value;
+        if (value > loudest){
+          loudest = value;
+        }
+      }
+    }
+
+    var first = 0, last = numFrames - 1;
+    while (first < numFrames && peaks[first] < threshold * loudest) first++;
+    while (last > first && peaks[last] < threshold * loudest) last--;
+    if (first >= numFrames){
+      return samples;
+    }
+
+    var marginLen = Math.round(margin * sampleRate);
+    return samples.subarray(Math.max(0, first * frameLen - marginLen),
+                            Math.min(samples.length, (last + 1) * frameLen + marginLen));
+  };
+
+  global.Decimator = Decimator;
+
+})(this);
@@ -2,37 +2,50 @@
 
   var WORKER_PATH = 'recorderWorker.js';
 
+  // Recordings are decimated to the lowest rate at or above this (in Hz),
+  // as the server would before analysis (see Decimator).
+  var ANALYSIS_RATE = 10000;
+
   var Recorder = function(source, cfg){
     var config = cfg || {};
     var bufferLen = config.bufferLen || 4096;
-    var mono = config.mono; 
+    var analysisRate = config.analysisRate || ANALYSIS_RATE;
     this.context = source.context;
+    // Mono: only one channel is analyzed.
     this.node = (this.context.createScriptProcessor ||
                  this.context.createJavaScriptNode).call(this.context,
-                                                         bufferLen, 2, 2);
+                                                         bufferLen, 1, 1);
     var worker = new Worker(config.workerPath || WORKER_PATH);
     worker.postMessage({
       command: 'init',
       config: {
         sampleRate: this.context.sampleRate,
-        mono: mono
+        analysisRate: analysisRate,
+        silenceThreshold: config.silenceThreshold,
+        silenceMargin: config.silenceMargin
       }
     });
     var recording = false,
-      currCallback;
+      currCallback,
+      decimator = new Decimator(this.context.sampleRate, analysisRate);
+
+    // Sample rate of the exported WAV files and of the chunks.
+    this.sampleRate = decimator.sampleRate;
 
     this.node.onaudioprocess = function(e){
       if (!recording) return;
 
-      var buffer = [e.inputBuffer.getChannelData(0)];
-      if (!mono) {
-        buffer.push(e.inputBuffer.getChannelData(1));
-      }
+      var samples = e.inputBuffer.getChannelData(0);
 
       worker.postMessage({
         command: 'record',
-        buffer: buffer
+        buffer: samples
       });
+
+      // Hand the samples over, decimated, as they are captured.
+      if (config.onChunk) {
+        config.onChunk(decimator.process(samples));
+      }
     }
 
     this.configure = function(cfg){
@@ -53,6 +66,7 @@
 
     this.clear = function(){
       worker.postMessage({ command: 'clear' });
+      decimator = new Decimator(source.context.sampleRate, analysisRate);
     }
 
     this.getBuffer = function(cb) {
@@ -1,7 +1,13 @@
+importScripts('decimator.js');
+
+// Silence is quieter than this fraction of the loudest part of the
+// recording. This much of it (in seconds) is kept around the speech.
+var SILENCE_THRESHOLD = 0.05,
+  SILENCE_MARGIN = 0.25;
+
 var recLength = 0,
-  recBuffersL = [],
-  recBuffersR = [],
-  sampleRate, mono;
+  recBuffers = [],
+  sampleRate, analysisRate, silenceThreshold, silenceMargin;
 
 this.onmessage = function(e){
   switch(e.data.command){
@@ -25,29 +31,33 @@ this.onmessage = function(e){
 
 function init(config){
   sampleRate = config.sampleRate;
-  mono = config.mono;
+  analysisRate = config.analysisRate;
+  silenceThreshold = config.silenceThreshold || SILENCE_THRESHOLD;
+  silenceMargin = config.silenceMargin || SILENCE_MARGIN;
 }
 
 function record(inputBuffer){
-  recBuffersL.push(inputBuffer[0]);
-  if (!mono) {
-    recBuffersR.push(inputBuffer[1]);
-  }
-  recLength += inputBuffer[0].length;
+  recBuffers.push(inputBuffer);
+  recLength += inputBuffer.length;
+}
+
+/**
+ * Get the recording decimated, with its leading and trailing silence cut.
+ */
+function getSamples(){
+  var decimator = new Decimator(sampleRate, analysisRate);
+  var head = decimator.process(mergeBuffers(recBuffers, recLength));
+  var tail = decimator.flush();
+  var samples = mergeBuffers([head, tail], head.length + tail.length);
+  return {
+    samples: Decimator.trimSilence(samples, decimator.sampleRate, silenceThreshold, silenceMargin),
+    sampleRate: decimator.sampleRate
+  };
 }
 
 function exportWAV(type){
-  var bufferL = mergeBuffers(recBuffersL, recLength);
-  
-  var dataview;
-
-  if (mono) {
-    dataview = encodeWAV(bufferL);
-  } else {
-    var bufferR = mergeBuffers(recBuffersR, recLength);
-    var interleaved = interleave(bufferL, bufferR);
-    dataview = encodeWAV(interleaved);
-  }
+  var recording = getSamples();
+  var dataview = encodeWAV(recording.samples, recording.sampleRate);
 
   var audioBlob = new Blob([dataview], { type: type });
 
@@ -55,18 +65,12 @@ function exportWAV(type){
 }
 
 function getBuffer() {
-  var buffers = [];
-  buffers.push( mergeBuffers(recBuffersL, recLength) );
-  if (!mono) {
-    buffers.push( mergeBuffers(recBuffersR, recLength) );
-  }
-  this.postMessage(buffers);
+  this.postMessage([getSamples().samples]);
 }
 
 function clear(){
   recLength = 0;
-  recBuffersL = [];
-  recBuffersR = [];
+  recBuffers = [];
 }
 
 function mergeBuffers(recBuffers, recLength){
@@ -79,21 +83,6 @@ function mergeBuffers(recBuffers, recLength){
   return result;
 }
 
-function interleave(inputL, inputR){
-  var length = inputL.length + inputR.length;
-  var result = new Float32Array(length);
-
-  var index = 0,
-    inputIndex = 0;
-
-  while (index < length){
-    result[index++] = inputL[inputIndex];
-    result[index++] = inputR[inputIndex];
-    inputIndex++;
-  }
-  return result;
-}
-
 function floatTo16BitPCM(output, offset, input){
   for (var i = 0; i < input.length; i++, offset+=2){
     var s = Math.max(-1, Math.min(1, input[i]));
@@ -107,10 +96,10 @@ function writeString(view, offset, string){
   }
 }
 
-function encodeWAV(samples){
+function encodeWAV(samples, sampleRate){
   var buffer = new ArrayBuffer(44 + samples.length * 2);
   var view = new DataView(buffer);
-  var numChannels = mono ? 1 : 2;
+  var numChannels = 1;
 
   /* RIFF identifier */
   writeString(view, 0, 'RIFF');
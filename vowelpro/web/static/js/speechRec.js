@@ -5,6 +5,9 @@ var SpeechRec = (function(window) {
     var audioRecorder, audioContext;
     var recording = false;
 
+    // Recording being streamed to the server as it is captured.
+    var stream = null;
+
     /**
      * Get WAV file.
      */
@@ -12,6 +15,119 @@ var SpeechRec = (function(window) {
         audioRecorder && audioRecorder.exportWAV(callback);
     }
 
+    /**
+     * Convert samples in [-1, 1] to little-endian 16-bit PCM.
+     */
+    function toInt16(samples) {
+        var buffer = new ArrayBuffer(samples.length * 2);
+        var view = new DataView(buffer);
+        for (var i = 0; i < samples.length; i++) {
+            var sample = Math.max(-1, Math.min(1, samples[i]));
+            view.setInt16(i * 2, sample < 0 ? sample * 0x8000 : sample * 0x7FFF, true);
+        }
+        return buffer;
+    }
+
+    /**
+     * POST to the server. The callback gets the parsed JSON response, or
+     * null if there was none.
+     */
+    function post(url, body, callback) {
+        var xhr = new XMLHttpRequest();
+        xhr.open('POST', url, true);
+        xhr.addEventListener('load', function() {
+            var response = null;
+            try {
+                response = JSON.parse(xhr.response);
+            } catch (e) {}
+            callback(response);
+        });
+        xhr.addEventListener('error', function() {
+            callback(null);
+        });
+        xhr.send(body);
+    }
+
+    /**
+     * Rate a whole WAV file at once. The sample rate is sent along for the
+     * server to check.
+     */
+    function rateWav(blob, vowel, dialect, callback) {
+        var formData = new FormData();
+        formData.append('file', blob);
+        formData.append('fs', audioRecorder.sampleRate);
+        formData.append('vowel_str', vowel);
+        formData.append('dialect', dialect);
+        post('/rate', formData, callback);
+    }
+
+    /**
+     * Send a stream's pending chunks one at a time, in order, then, once
+     * recording has stopped, ask for its rating. If streaming failed along
+     * the way, rate the whole recording instead.
+     */
+    function sendChunks(s) {
+        if (s.sending || !s.id && !s.failed) return;
+
+        if (s.failed) {
+            if (s.callback) {
+                getWav(function(blob) {
+                    rateWav(blob, s.vowel, s.dialect, s.callback);
+                });
+                s.callback = null;
+            }
+        } else if (s.chunks.length) {
+            s.sending = true;
+            post('/stream/' + s.id, s.chunks.shift(), function(response) {
+                s.sending = false;
+                s.failed = !response || !!response.error;
+                sendChunks(s);
+            });
+        } else if (s.callback) {
+            s.sending = true;
+            post('/stream/' + s.id + '/finish', null, s.callback);
+        }
+    }
+
+    /**
+     * Open a stream for the recording starting now.
+     */
+    function openStream(vowel, dialect) {
+        var s = {
+            id: null,
+            vowel: vowel,
+            dialect: dialect,
+            chunks: [],
+            sending: false,
+            failed: false,
+            callback: null
+        };
+
+        var formData = new FormData();
+        formData.append('fs', audioRecorder.sampleRate);
+        formData.append('vowel_str', vowel);
+        formData.append('dialect', dialect);
+        post('/stream', formData, function(response) {
+            if (response && response.stream_id) {
+                s.id = response.stream_id;
+            } else {
+                s.failed = true;
+            }
+            sendChunks(s);
+        });
+
+        return s;
+    }
+
+    /**
+     * Queue samples just captured for the current stream.
+     */
+    function pushChunk(samples) {
+        if (!stream || stream.failed) return;
+        stream.chunks.push(toInt16(samples));
+        sendChunks(stream);
+    }
+
     return {
 
         isRecording: function() {
@@ -23,26 +139,32 @@ var SpeechRec = (function(window) {
         },
 
         /**
-         * Start recording.
+         * Start recording, streaming the audio to the server to be rated
+         * for a vowel.
          */
-        start: function() {
+        start: function(vowel, dialect) {
             if (!audioRecorder) return;
             audioRecorder.clear();
+            stream = openStream(vowel, dialect);
             audioRecorder.record();
             recording = true;
         },
 
         /**
-         * Stop recording.
+         * Stop recording. The callback gets the rating response, or null.
          */
         stop: function(callback) {
             audioRecorder && audioRecorder.stop();
             recording = false;
-            getWav(callback);
+            if (stream) {
+                stream.callback = callback;
+                sendChunks(stream);
+                stream = null;
+            }
         },
 
         /**
-         * Attempt to access user's microphone to record audio. 
+         * Attempt to access user's microphone to record audio.
          */
         init: function(successCallback, failureCallback, browserNotSupportedCallback) {
 
@@ -59,17 +181,17 @@ var SpeechRec = (function(window) {
                             },
                             "optional": []
                         }
-                    }, 
+                    },
                     function(stream) {
                         var AudioContext = window.AudioContext || window.webkitAudioContext || window.mozAudioContext || window.oAudioContext || window.msAudioContext;
                         audioContext = new AudioContext();
                         var input = audioContext.createMediaStreamSource(stream);
                         audioRecorder = new Recorder(input, {
                             'workerPath': 'static/js/recorder/recorderWorker.js',
-                            'mono': true
+                            'onChunk': pushChunk
                         });
                         successCallback();
-                    }, 
+                    },
                     failureCallback);
             } else {
                 // Browser not supported.
@@ -0,0 +1,142 @@
+import threading
+import time
+import uuid
+import numpy as np
+from vowelpro import vowel
+from vowelpro.stream import VowelStream
+from vowelpro.web.workers import JobTimeout, PoolBusy
+
+
+class StreamRegistry(object):
+
+    """
+    Recordings being streamed to the server (see stream.VowelStream), by id.
+
+    At most `max_streams` are open at once; beyond that open() raises
+    PoolBusy. Streams left idle for `idle_timeout` seconds are dropped, and
+    a stream is refused samples beyond `max_duration` seconds.
+
+    Humps are analyzed by the workers of `pool` (a RatingPool, see
+    RatingPool.analyze_samples) if given, otherwise in the request thread.
+    Analyses made while streaming are provisional: a hump the workers are
+    too busy for, or time out on, is left for finish().
+
+    Analyses are scored by `scorer` if given (see vowel.rate_analysis), as
+    uploads are by the pool.
+    """
+
+    def __init__(self, max_streams=32, idle_timeout=30.0, max_duration=10.0, pool=None, scorer=None):
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.max_duration = max_duration
+        self.pool = pool
+        self.scorer = scorer
+        self.streams = {}
+        self.lock = threading.Lock()
+
+
+    def __len__(self):
+        with self.lock:
+            self.expire()
+            return len(self.streams)
+
+
+    def open(self, fs, vowel_str, dialect):
+
+        """
+        Start a stream of int16 samples at `fs` Hz, to be rated for a vowel.
+        Returns its id.
+        """
+
+        vowel.validate_vowel(vowel_str, dialect)
+        fs = vowel.validate_fs(fs)
+
+        if self.pool is not None:
+            stream = VowelStream(fs, analyze=self.pool.analyze_samples)
+        else:
+            stream = VowelStream(fs)
+
+        stream_id = uuid.uuid4().hex
+        with self.lock:
+            self.expire()
+            if len(self.streams) >= self.max_streams:
+                raise PoolBusy('Server busy. Try again shortly.')
+            self.streams[stream_id] = {
+                'stream': stream,
+                'vowel_str': vowel_str,
+                'dialect': dialect,
+                'last_used': time.time(),
+                'lock': threading.Lock()
+            }
+        return stream_id
+
+
+    def get(self, stream_id, pop=False):
+        with self.lock:
+            self.expire()
+            entry = self.streams.pop(stream_id, None) if pop else self.streams.get(stream_id)
+        if entry is None:
+            raise Exception('Stream not found.')
+        entry['last_used'] = time.time()
+        return entry
+
+
+    def expire(self):
+        # Called with the lock held.
+        now = time.time()
+        for stream_id, entry in self.streams.items():
+            if now - entry['last_used'] > self.idle_timeout:
+                del self.streams[stream_id]
+
+
+    def push(self, stream_id, data):
+
+        """
+        Add a chunk of little-endian int16 samples (a byte string). Returns
+        the number of samples so far, the number of humps closed and, once
+        one is analyzed, a provisional rating of the largest.
+        """
+
+        entry = self.get(stream_id)
+        stream = entry['stream']
+        with entry['lock']:
+            samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2')
+            if stream.len + len(samples) > self.max_duration * stream.fs:
+                self.get(stream_id, pop=True)
+                raise Exception('Recording too long.')
+            try:
+                stream.push(samples)
+            except (PoolBusy, JobTimeout):
+                # The samples are in; the hump is analyzed at finish().
+                pass
+
+            response = {
+                'samples': stream.len,
+                'humps': len(stream.hump_areas)
+            }
+            analysis = stream.get_provisional_analysis()
+            if analysis is not None:
+                response['rating'] = vowel.rate_analysis(analysis, entry['vowel_str'], entry['dialect'], self.scorer)
+            return response
+
+
+    def finish(self, stream_id):
+
+        """
+        Close a stream and rate it, as a whole recording. A stream the
+        workers were too busy for, or timed out on, is left open to be
+        finished again.
+        """
+
+        entry = self.get(stream_id)
+        done = True
+        try:
+            with entry['lock']:
+                return vowel.rate_analysis(entry['stream'].finish(), entry['vowel_str'], entry['dialect'], self.scorer)
+        except (PoolBusy, JobTimeout):
+            done = False
+            raise
+        finally:
+            if done:
+                with self.lock:
+                    self.streams.pop(stream_id, None)
@@ -1,62 +1,381 @@
 import traceback
 import os
 import cherrypy
+from cherrypy.lib import reprconf
 from vowelpro import vowel
+from vowelpro.cache import BytesLRUCache, LRUCache
+from vowelpro.tokens import TokenStore
+from vowelpro.plot import DIAGNOSTICS_FORMATS
+from vowelpro.web.workers import RatingPool, PoolBusy
+from vowelpro.web.streams import StreamRegistry
+from vowelpro.web.metrics import Metrics
+from vowelpro.web.assets import AssetStore, respond
 import json
+import timeit
 
 
 # Absolute directory path of this file.
 DIR_PATH = os.path.dirname(os.path.abspath(__file__))
 GLOBAL_CONFIG_FILE_PATH = 'server.conf'
 
+# Global config used when there is no config file.
+DEFAULT_CONFIG = {
+    'server.socket_host': '127.0.0.1',
+    'server.socket_port': 8080,
+    'log.access_file': 'access.log',
+    'log.error_file': 'error.log'
+}
+
+# App config.
+APP_CONFIG = {
+    '/': {
+        'tools.sessions.on': True
+    },
+    '/rate': {
+        'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
+        'tools.response_headers.on': True,
+        'tools.response_headers.headers': [('Content-Type', 'application/json')],
+    },
+    '/session': {
+        'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
+        'tools.response_headers.on': True,
+        'tools.response_headers.headers': [('Content-Type', 'application/json')],
+    },
+    '/diagnostics': {
+        'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
+    },
+    '/stream': {
+        'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
+        'tools.response_headers.on': True,
+        'tools.response_headers.headers': [('Content-Type', 'application/json')],
+    },
+    '/metrics': {
+        'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
+        'tools.sessions.on': False,
+        'tools.response_headers.on': True,
+        'tools.response_headers.headers': [('Content-Type', 'text/plain; version=0.0.4')],
+    },
+    '/static': {
+        'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
+        'tools.sessions.on': False
+    }
+}
+
+
+def send(status, headers, body):
+    cherrypy.response.status = status
+    cherrypy.response.headers.update(headers)
+    return body
+
 
 class VowelPro(object):
+
+    """
+    The front page, with its static files' fingerprinted URLs (see
+    assets.AssetStore).
+    """
+
+    def __init__(self, assets):
+        self.page = assets.make_page(os.path.join(DIR_PATH, 'index.html'))
+
     @cherrypy.expose
     def index(self):
-        return file(os.path.join(DIR_PATH, "index.html"))
+        request = cherrypy.request
+        return send(*respond(self.page, False, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match')))
+
+class VowelProStatic(object):
+
+    """
+    Static files, precompressed and served from memory with strong ETags
+    and byte ranges (see assets.AssetStore). Fingerprinted URLs are cached
+    for good.
+    """
+
+    exposed = True
+
+    def __init__(self, assets):
+        self.assets = assets
+
+    def GET(self, *path):
+        request = cherrypy.request
+        headers = request.headers
+        return send(*self.assets.respond('/'.join(path), headers.get('Accept-Encoding'), headers.get('If-None-Match'), headers.get('Range'), headers.get('If-Range')))
 
 class VowelProWebService(object):
+
+    """
+    Rate an uploaded recording. Pass timings=1 to get the time taken by
+    each stage in a `timings` block of the response.
+    """
+
     exposed = True
+    endpoint = 'rate'
+
+    def __init__(self, pool, metrics):
+        self.pool = pool
+        self.metrics = metrics
+
+    def POST(self, file, vowel_str, dialect, fs=None, timings=None):
+        return self.respond(lambda hook: self.pool.rate(file.file, vowel_str, dialect, hook, fs), timings)
+
+    def respond(self, rate, timings=None):
+        stages = {}
+
+        def hook(stage, seconds, size):
+            self.metrics.observe_stage(stage, seconds, size)
+            if stage == 'upload':
+                self.metrics.observe_upload(size)
+            total = stages.setdefault(stage, {'seconds': 0., 'size': 0})
+            total['seconds'] += seconds
+            total['size'] += size
 
-    def POST(self, file, vowel_str, dialect):
         try:
-            return json.dumps(vowel.rate_vowel(file.file, vowel_str, dialect, 'wav'))
+            response = rate(hook)
+            if timings:
+                response['timings'] = stages
+            outcome = 'ok'
+        except PoolBusy as e:
+            cherrypy.response.status = 503
+            cherrypy.response.headers['Retry-After'] = str(cherrypy.config.get('vowelpro.retry_after', 1))
+            response = {
+                'error': str(e)
+            }
+            outcome = 'busy'
+        except Exception as e:
+            cherrypy.log(str(e), traceback=True)
+            response = {
+                'error': str(e)
+            }
+            outcome = 'error'
+
+        start = timeit.default_timer()
+        body = json.dumps(response)
+        self.metrics.observe_stage('encode', timeit.default_timer() - start, len(body))
+        self.metrics.count_request(self.endpoint, outcome)
+        return body
+
+class VowelProSessionService(VowelProWebService):
+
+    """
+    Rate every word of an uploaded recording of several words (see
+    RatingPool.rate_session). `vowels` are the vowels expected, in order,
+    separated by commas. The response has a rating per word (`words`),
+    their `scores` and their mean `score`.
+    """
+
+    endpoint = 'session'
+
+    def POST(self, file, vowels, dialect, fs=None, timings=None):
+        return self.respond(lambda hook: self.pool.rate_session(file.file, vowels.split(','), dialect, hook, fs), timings)
+
+class VowelProDiagnosticsService(object):
+
+    """
+    Render diagnostics of an uploaded recording (waveform and segmentation,
+    FFT of the vowel, spectrogram and formant tracks), eg. to review
+    flagged submissions. `format` is 'png' (the default) or 'svg'. Images
+    are cached by the hash of the audio (see RatingPool.render).
+    """
+
+    exposed = True
+
+    def __init__(self, pool, metrics):
+        self.pool = pool
+        self.metrics = metrics
+
+    def POST(self, file, format='png'):
+        try:
+            body = self.pool.render(file.file, format, self.metrics.observe_stage)
+            cherrypy.response.headers['Content-Type'] = DIAGNOSTICS_FORMATS[format]
+            outcome = 'ok'
+        except PoolBusy as e:
+            cherrypy.response.status = 503
+            cherrypy.response.headers['Retry-After'] = str(cherrypy.config.get('vowelpro.retry_after', 1))
+            body = json.dumps({
+                'error': str(e)
+            })
+            outcome = 'busy'
+        except Exception as e:
+            cherrypy.log(str(e), traceback=True)
+            body = json.dumps({
+                'error': str(e)
+            })
+            outcome = 'error'
+
+        if outcome != 'ok':
+            cherrypy.response.headers['Content-Type'] = 'application/json'
+        self.metrics.count_request('diagnostics', outcome)
+        return body
+
+class VowelProMetrics(object):
+
+    """
+    Service metrics, in the Prometheus text format (see metrics.Metrics).
+    """
+
+    exposed = True
+
+    def __init__(self, metrics, pool, cache, streams):
+        self.metrics = metrics
+        self.pool = pool
+        self.cache = cache
+        self.streams = streams
+
+    def GET(self):
+        cache_stats = self.cache.stats()
+        return self.metrics.render({
+            'vowelpro_in_flight': self.pool.get_in_flight(),
+            'vowelpro_queue_depth': self.pool.get_queue_depth(),
+            'vowelpro_open_streams': len(self.streams),
+            'vowelpro_cache_entries': cache_stats['entries'],
+            'vowelpro_cache_bytes': cache_stats['bytes']
+        }, {
+            'vowelpro_cache_hits_total': cache_stats['hits'],
+            'vowelpro_cache_misses_total': cache_stats['misses']
+        })
+
+class VowelProStreamService(object):
+
+    """
+    Rate a recording streamed in chunks while it is being made:
+
+        POST /stream (fs, vowel_str, dialect): open a stream, get its id.
+        POST /stream/<id>: add a chunk (raw little-endian int16 samples).
+        POST /stream/<id>/finish: close the stream and get its rating.
+    """
+
+    exposed = True
+
+    def __init__(self, streams):
+        self.streams = streams
+
+    def POST(self, stream_id=None, action=None, **params):
+        try:
+            if stream_id is None:
+                return json.dumps({
+                    'stream_id': self.streams.open(params.get('fs', 0), params.get('vowel_str'), params.get('dialect'))
+                })
+            if action == 'finish':
+                return json.dumps(self.streams.finish(stream_id))
+            return json.dumps(self.streams.push(stream_id, cherrypy.request.body.read()))
+        except PoolBusy as e:
+            cherrypy.response.status = 503
+            cherrypy.response.headers['Retry-After'] = str(cherrypy.config.get('vowelpro.retry_after', 1))
+            return json.dumps({
+                'error': str(e)
+            })
         except Exception as e:
             cherrypy.log(str(e), traceback=True)
             return json.dumps({
                 'error': str(e)
             })
 
-# Global config.
-if os.path.exists(GLOBAL_CONFIG_FILE_PATH):
-    # Custom config.
-    cherrypy.config.update(GLOBAL_CONFIG_FILE_PATH)
-else:
-    # Default config.
-    cherrypy.config.update({
-        'server.socket_host': '127.0.0.1',
-        'server.socket_port': 8080,
-        'log.access_file': 'access.log',
-        'log.error_file': 'error.log'
-    })
-
-# Configure app.
-conf = {
-    '/': {
-        'tools.sessions.on': True,
-        'tools.staticdir.root': DIR_PATH
-    },
-    '/rate': {
-        'request.dispatch': cherrypy.dispatch.MethodDispatcher(),
-        'tools.response_headers.on': True,
-        'tools.response_headers.headers': [('Content-Type', 'application/json')],
-    },
-    '/static': {
-        'tools.staticdir.on': True,
-        'tools.staticdir.dir': 'static'
-    }
-}
+def read_config(path=GLOBAL_CONFIG_FILE_PATH):
+
+    """
+    Get the global config from a config file (its [global] section), or
+    DEFAULT_CONFIG if there is no such file.
+    """
+
+    if not os.path.exists(path):
+        return dict(DEFAULT_CONFIG)
+    config = reprconf.as_dict(path)
+    return dict(config.get('global', config))
+
+
+def create_app(config=None):
+
+    """
+    Create the Vowel Pro WSGI application, without starting a server.
+
+    `config` is the global config (a dict), by default read from
+    server.conf (see read_config). Besides CherryPy's own settings, it
+    takes these, all optional:
+
+        vowelpro.workers: rating processes (default: one per CPU).
+        vowelpro.queue_size: ratings waiting beyond those in progress
+            before answering 503 (default: 8).
+        vowelpro.job_timeout, vowelpro.retry_after: in seconds.
+        vowelpro.max_duration: longest upload rated, in seconds (default:
+            vowel.MAX_DURATION_SEC).
+        vowelpro.truncate: cut longer uploads to max_duration rather than
+            refusing them (default: False).
+        vowelpro.multi_frame: estimate formants over several frames of
+            the vowel, adding a confidence to ratings (default: False).
+        vowelpro.batch_size, vowelpro.batch_wait: analyze up to
+            batch_size uploads arriving within batch_wait seconds of each
+            other together, split between the workers (default: 1, ie. no
+            batching, and 0.005).
+        vowelpro.session_max_duration: longest recording of several words
+            rated, in seconds (default: vowel.MAX_SESSION_DURATION_SEC).
+        vowelpro.tokens: reference token store (.npz) to score against
+            instead of the model vowels (see vowelpro.tokens).
+        vowelpro.cache_entries, vowelpro.cache_bytes, vowelpro.cache_dir:
+            bounds of the analysis cache, and where to persist it on disk.
+        vowelpro.image_cache_entries, vowelpro.image_cache_bytes: bounds of
+            the cache of rendered diagnostics, kept in memory only (they
+            are drawn again from the persisted analysis).
+        vowelpro.max_streams, vowelpro.stream_idle_timeout,
+        vowelpro.stream_max_duration: bounds of streamed recordings.
+
+    The rating processes are shut down when the CherryPy engine stops.
+    """
+
+    if config is None:
+        config = read_config()
+    cherrypy.config.update(config)
+
+    cache = LRUCache(
+        max_entries=cherrypy.config.get('vowelpro.cache_entries', 1024),
+        max_bytes=cherrypy.config.get('vowelpro.cache_bytes', 16 * 1024 * 1024),
+        path=cherrypy.config.get('vowelpro.cache_dir')
+    )
+    images = BytesLRUCache(
+        max_entries=cherrypy.config.get('vowelpro.image_cache_entries', 128),
+        max_bytes=cherrypy.config.get('vowelpro.image_cache_bytes', 32 * 1024 * 1024)
+    )
+    tokens_path = cherrypy.config.get('vowelpro.tokens')
+    scorer = TokenStore.load(tokens_path) if tokens_path else None
+    metrics = Metrics()
+    pool = RatingPool(
+        workers=cherrypy.config.get('vowelpro.workers'),
+        queue_size=cherrypy.config.get('vowelpro.queue_size', 8),
+        timeout=cherrypy.config.get('vowelpro.job_timeout', 10.0),
+        cache=cache,
+        max_duration=cherrypy.config.get('vowelpro.max_duration', vowel.MAX_DURATION_SEC),
+        truncate=cherrypy.config.get('vowelpro.truncate', False),
+        multi_frame=cherrypy.config.get('vowelpro.multi_frame', False),
+        batch_size=cherrypy.config.get('vowelpro.batch_size', 1),
+        batch_wait=cherrypy.config.get('vowelpro.batch_wait', 0.005),
+        on_batch=metrics.observe_batch,
+        session_max_duration=cherrypy.config.get('vowelpro.session_max_duration', vowel.MAX_SESSION_DURATION_SEC),
+        scorer=scorer,
+        images=images
+    )
+    cherrypy.engine.subscribe('stop', pool.close)
+    streams = StreamRegistry(
+        max_streams=cherrypy.config.get('vowelpro.max_streams', 32),
+        idle_timeout=cherrypy.config.get('vowelpro.stream_idle_timeout', 30.0),
+        max_duration=cherrypy.config.get('vowelpro.stream_max_duration', 10.0),
+        pool=pool,
+        scorer=scorer
+    )
+
+    assets = AssetStore(os.path.join(DIR_PATH, 'static'))
+    webapp = VowelPro(assets)
+    webapp.static = VowelProStatic(assets)
+    webapp.rate = VowelProWebService(pool, metrics)
+    webapp.session = VowelProSessionService(pool, metrics)
+    webapp.diagnostics = VowelProDiagnosticsService(pool, metrics)
+    webapp.metrics = VowelProMetrics(metrics, pool, cache, streams)
+    webapp.stream = VowelProStreamService(streams)
+    return cherrypy.tree.mount(webapp, '/', APP_CONFIG)
+
+
+if __name__ == '__main__':
 
-webapp = VowelPro()
-webapp.rate = VowelProWebService()
-cherrypy.quickstart(webapp, '/', conf)
+    # Single process server. See vowelpro.web.serve to run several.
+    create_app()
+    cherrypy.engine.signals.subscribe()
+    cherrypy.engine.start()
+    cherrypy.engine.block()
@@ -0,0 +1,768 @@
+import Queue
+import contextlib
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+import timeit
+import numpy as np
+from vowelpro import stream, vowel
+from vowelpro.cache import hash_file
+from vowelpro.plot import DIAGNOSTICS_FORMATS, render_diagnostics
+from vowelpro.wav import read_header
+
+
+# Uploads are handed to workers through files here (tmpfs, ie. shared
+# memory, where available) and memory mapped by the WAV reader, rather
+# than pickled through the pool's pipes.
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Extra time the request thread waits for a result beyond the job timeout.
+TIMEOUT_GRACE_SEC = 1.0
+
+# How often a request thread checks whether its job has started.
+START_POLL_SEC = 0.05
+
+# State of the job of each of a pool's slots, shared with its workers (see
+# run_job): when a worker started it (0 if none has yet) and whether its
+# request gave up on it.
+JOB_STARTED = None
+JOB_ABANDONED = None
+
+
+def rewind(f):
+
+    """
+    Seek a file object back to its start, if it can be. Returns whether it
+    could.
+    """
+
+    try:
+        f.seek(0)
+        return True
+    except (AttributeError, IOError):
+        return False
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def warm_up(job_started=None, job_abandoned=None):
+
+    """
+    Worker initializer: load the analysis stack once per worker process,
+    and keep the pool's shared job state (see run_job).
+    """
+
+    global JOB_STARTED, JOB_ABANDONED
+    JOB_STARTED, JOB_ABANDONED = job_started, job_abandoned
+
+    # Let the parent handle Ctrl-C.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    vowel.get_formants(np.random.RandomState(0).randn(400), 16000)
+
+
+def raise_timeout(signum, frame):
+    raise JobTimeout('Rating timed out.')
+
+
+def run_job(slots, func, args):
+
+    """
+    Run a job in a worker for the requests holding `slots`, recording when
+    it started so that their wait for it starts then. A job all of whose
+    requests gave up on it while it was queued is skipped.
+
+    Returns the result and the error, rather than raising it, so that the
+    pool always calls back.
+    """
+
+    if JOB_STARTED is not None:
+        if all(JOB_ABANDONED[slot] for slot in slots):
+            return None, JobTimeout('Rating timed out.')
+        now = time.time()
+        for slot in slots:
+            JOB_STARTED[slot] = now
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, e
+
+
+def split_results(results):
+
+    """
+    Split the results of a batch (see analyze_files) into the result and
+    error of each of its requests.
+    """
+
+    return [((analysis, timings), error) for analysis, timings, error in results]
+
+
+def analyze_file(path, timeout=None, max_duration=vowel.MAX_DURATION_SEC, truncate=False, multi_frame=False):
+
+    """
+    Analyze a WAV file (see vowel.analyze_vowel) in a worker, giving up
+    after `timeout` seconds so that a pathological file cannot pin the
+    worker. Files longer than `max_duration` seconds are refused, or cut
+    if `truncate` is set, before decoding.
+
+    Returns the analysis and the (stage, seconds, size) timings of its
+    stages.
+    """
+
+    timings = []
+
+    def hook(stage, seconds, size):
+        timings.append((stage, seconds, size))
+
+    return run_with_timeout(timeout, vowel.analyze_vowel, path, 'wav', hook=hook, max_duration=max_duration, truncate=truncate, multi_frame=multi_frame), timings
+
+
+def analyze_session_file(path, timeout=None, max_duration=vowel.MAX_SESSION_DURATION_SEC, truncate=False):
+
+    """
+    Analyze a WAV file of several words (see vowel.analyze_session) in a
+    worker, as analyze_file does a single word.
+    """
+
+    timings = []
+
+    def hook(stage, seconds, size):
+        timings.append((stage, seconds, size))
+
+    def analyze():
+        start = timeit.default_timer()
+        samples, fs = vowel.get_signal(path, 'wav', max_duration, truncate)
+        vowel.report_stage(hook, 'decode', start, len(samples))
+        return vowel.analyze_session(samples, fs, hook=hook)
+
+    return run_with_timeout(timeout, analyze), timings
+
+
+def analyze_samples(samples, fs, analysis_fs=vowel.ANALYSIS_FS, timeout=None, multi_frame=False):
+
+    """
+    Analyze a hump given as its own samples (see
+    stream.analyze_hump_samples) in a worker, giving up after `timeout`
+    seconds.
+    """
+
+    return run_with_timeout(timeout, stream.analyze_hump_samples, samples, fs, analysis_fs, multi_frame)
+
+
+def render_file(path, analysis=None, fmt='png', timeout=None, max_duration=vowel.MAX_DURATION_SEC, truncate=False, multi_frame=False):
+
+    """
+    Render diagnostics of a WAV file (see plot.render_diagnostics) in a
+    worker, giving up after `timeout` seconds. The file's `analysis` (see
+    vowel.analyze_vowel), if already known, is drawn rather than found
+    again, as analyze_file would with `multi_frame`.
+
+    Returns the image data and the analysis.
+    """
+
+    def render():
+        samples, fs = vowel.get_signal(path, 'wav', max_duration, truncate)
+        if analysis is None:
+            word, hump, result = vowel.segment_signal(samples, fs)
+            result.update(vowel.analyze_hump(word, hump, multi_frame=multi_frame))
+        else:
+            result = analysis
+            word = vowel.Signal(samples[result['trim'][0]:result['trim'][1]], fs)
+        return render_diagnostics(word, result, fmt), result
+
+    return run_with_timeout(timeout, render)
+
+
+def run_with_timeout(timeout, func, *args, **kwargs):
+
+    """
+    Call `func`, raising JobTimeout in it after `timeout` seconds.
+    """
+
+    if timeout:
+        signal.signal(signal.SIGALRM, raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def analyze_files(paths, timeout=None, max_duration=vowel.MAX_DURATION_SEC, truncate=False, multi_frame=False):
+
+    """
+    Analyze several WAV files in a worker, as analyze_file does each, but
+    with the LPC and root finding of all of them done in one batched pass
+    (see vowel.get_batch_formants). With `multi_frame`, files are analyzed
+    one by one instead. `timeout` is for the whole batch.
+
+    Returns an (analysis, timings, error) for each file. Errors, including
+    timeouts, are returned (as exceptions) rather than raised, so that one
+    bad file does not fail the others. The timings of the batched pass,
+    sized for the whole batch, are given to every file of it.
+    """
+
+    results = [[None, [], None] for path in paths]
+    prepared = []
+
+    try:
+        if timeout:
+            signal.signal(signal.SIGALRM, raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        for result, path in zip(results, paths):
+            hook = lambda stage, seconds, size, timings=result[1]: timings.append((stage, seconds, size))
+            try:
+                start = timeit.default_timer()
+                samples, fs = vowel.get_signal(path, 'wav', max_duration, truncate)
+                vowel.report_stage(hook, 'decode', start, len(samples))
+                if multi_frame:
+                    result[0] = vowel.analyze_signal(samples, fs, hook=hook, multi_frame=True)
+                else:
+                    analysis, slices = vowel.prepare_analysis(samples, fs, hook=hook)
+                    prepared.append((result, analysis, slices))
+            except JobTimeout:
+                raise
+            except Exception as e:
+                result[2] = e
+
+        timings = []
+        formants = vowel.get_batch_formants([s for result, analysis, slices in prepared for s in slices], hook=lambda *timing: timings.append(timing))
+        for i, (result, analysis, slices) in enumerate(prepared):
+            analysis['formants'], analysis['diphthong_formants'] = [[float(f) for f in formants[2 * i + j]] for j in (0, 1)]
+            result[0] = analysis
+            result[1].extend(timings)
+    except JobTimeout as e:
+        for result in results:
+            if result[0] is None and result[2] is None:
+                result[2] = e
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    return [tuple(result) for result in results]
+
+
+class Batcher(object):
+
+    """
+    Collect the files to analyze that come within `max_wait` seconds of
+    the first, up to `max_size` of them, and send them to the workers in
+    batches (see analyze_files) with `start` (see RatingPool.start). The
+    files are split between up to `workers` batches, so that no file waits
+    for more than its share of them. `args` are the other arguments of
+    analyze_files, and `on_batch` is called with the size of each batch
+    sent.
+    """
+
+    def __init__(self, start, args, max_size, max_wait, on_batch=None, workers=1):
+        self.start = start
+        self.args = tuple(args)
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.on_batch = on_batch
+        self.workers = workers
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def submit(self, path, slot):
+
+        """
+        Queue a file, uploaded in a pool slot, for the next batch. Returns
+        its request (see make_request).
+        """
+
+        request = make_request(slot, path)
+        self.queue.put(request)
+        return request
+
+
+    def run(self):
+        while True:
+            request = self.queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = timeit.default_timer() + self.max_wait
+            while len(batch) < self.max_size:
+                remaining = deadline - timeit.default_timer()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.queue.get(True, remaining)
+                except Queue.Empty:
+                    break
+                if request is None:
+                    self.dispatch(batch)
+                    return
+                batch.append(request)
+            self.dispatch(batch)
+
+
+    def dispatch(self, requests):
+        num_batches = min(len(requests), self.workers)
+        for i in xrange(num_batches):
+            batch = requests[i::num_batches]
+            if self.on_batch is not None:
+                self.on_batch(len(batch))
+            self.start(analyze_files, ([request['path'] for request in batch],) + self.args, batch, split_results)
+
+
+    def get_queue_depth(self):
+        return self.queue.qsize()
+
+
+    def close(self):
+        self.queue.put(None)
+
+
+def make_request(slot, path=None):
+
+    """
+    Make a request for a job, holding a pool slot: its `done` event is set
+    once its `result`, a (result, error) pair, is in.
+    """
+
+    return {'slot': slot, 'path': path, 'done': threading.Event(), 'result': None}
+
+
+class RatingPool(object):
+
+    """
+    Pool of warm worker processes that rate uploads.
+
+    At most `workers + queue_size` ratings are accepted at once; beyond that
+    rate() raises PoolBusy straight away instead of queueing.
+
+    Analyses are kept in `cache` (an LRUCache, optional) keyed by the hash
+    of the uploaded audio, so a resubmitted recording is only scored again,
+    for whichever vowel and dialect, without being decoded or analyzed.
+
+    `pending` counts the jobs submitted to the workers and not yet done:
+    the first `workers` of them are in progress, the rest queued (see
+    get_in_flight and get_queue_depth). A request
+    waits for its job's timeout from when a worker starts it, and a slot
+    is only freed once both its request and its job are done with it, so
+    that requests that gave up cannot pile more jobs on the workers.
+
+    Uploads longer than `max_duration` seconds are refused, or cut if
+    `truncate` is set (see vowel.get_signal). With `multi_frame`, formants
+    are estimated over several frames and ratings have a confidence (see
+    vowel.analyze_hump).
+
+    With a `batch_size` above 1, uploads arriving within `batch_wait`
+    seconds of each other are analyzed together, up to `batch_size` at a
+    time split between the workers, with their LPC and root finding
+    batched (see Batcher and analyze_files). `on_batch` is called with the size of every batch.
+
+    Sessions, uploads of several words (see rate_session), may be up to
+    `session_max_duration` seconds long.
+
+    Analyses are scored by `scorer` if given (see vowel.rate_vowel).
+
+    Diagnostics rendered by render() are kept in `images` (a
+    BytesLRUCache, optional), keyed by the hash of the audio and the
+    format.
+    """
+
+    def __init__(self, workers=None, queue_size=8, timeout=10.0, cache=None, max_duration=vowel.MAX_DURATION_SEC, truncate=False, multi_frame=False, batch_size=1, batch_wait=0.005, on_batch=None, session_max_duration=vowel.MAX_SESSION_DURATION_SEC, scorer=None, images=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.cache = cache
+        self.max_duration = max_duration
+        self.session_max_duration = session_max_duration
+        self.scorer = scorer
+        self.images = images
+        self.truncate = truncate
+        self.multi_frame = multi_frame
+        self.pending = 0
+        self.lock = threading.Lock()
+
+        # The slots of the requests of the jobs pending.
+        self.job_slots = []
+
+        # Slots not taken, how many of a request and its job hold each,
+        # and the upload file of each.
+        num_slots = self.workers + queue_size
+        self.free_slots = range(num_slots)
+        self.holders = [0] * num_slots
+        self.paths = [None] * num_slots
+        self.job_started = multiprocessing.Array('d', num_slots, lock=False)
+        self.job_abandoned = multiprocessing.Array('b', num_slots, lock=False)
+
+        self.pool = multiprocessing.Pool(self.workers, initializer=warm_up, initargs=(self.job_started, self.job_abandoned))
+        self.batcher = None
+        if batch_size > 1:
+            self.batcher = Batcher(self.start, (timeout, max_duration, truncate, multi_frame), batch_size, batch_wait, on_batch, self.workers)
+
+
+    def rate(self, upload, vowel_str, dialect, hook=None, fs=None):
+
+        """
+        Rate an uploaded WAV (a file object). If the client stated the
+        sample rate (`fs`), the upload is checked against it before any
+        analysis.
+
+        `hook` is called after each stage, as in vowel.rate_vowel, from this
+        thread. On top of the analysis stages, run by a worker, there are
+        'upload' (hashing the upload), 'copy' (copying it for the workers,
+        only needed on a cache miss), 'wait' (time spent queued or passing
+        data to and from the worker), all sized in bytes of upload, and
+        'score'.
+        """
+
+        # Fail fast, before any analysis, on a bad vowel or dialect.
+        vowel.validate_vowel(vowel_str, dialect)
+
+        analysis = self.get_analysis(upload, hook, fs)
+
+        start = timeit.default_timer()
+        rating = vowel.rate_analysis(analysis, vowel_str, dialect, self.scorer)
+        vowel.report_stage(hook, 'score', start, len(analysis['formants']))
+        return rating
+
+
+    def rate_session(self, upload, vowels, dialect, hook=None, fs=None):
+
+        """
+        Rate every word of an uploaded WAV of several words against the
+        vowels expected, in order (see vowel.rate_session_analysis). As
+        rate() otherwise; the analysis is cached apart from single words'.
+        """
+
+        vowel.validate_vowels(vowels, dialect)
+
+        analysis = self.get_analysis(upload, hook, fs, session=True)
+
+        start = timeit.default_timer()
+        rating = vowel.rate_session_analysis(analysis, vowels, dialect, self.scorer)
+        vowel.report_stage(hook, 'score', start, len(vowels))
+        return rating
+
+
+    def get_analysis(self, upload, hook=None, fs=None, session=False):
+
+        """
+        Get the analysis of an upload, from the cache or the workers.
+        """
+
+        with self.take_upload(upload, hook, fs) as (key, size, slot, get_path):
+            key = self.get_cache_key(key, session)
+            analysis = self.cache.get(key) if self.cache is not None else None
+
+            if analysis is None:
+                path = get_path()
+                start = timeit.default_timer()
+                analysis, timings = self.analyze(path, slot, session)
+                elapsed = timeit.default_timer() - start
+                if hook is not None:
+                    for stage, seconds, stage_size in timings:
+                        hook(stage, seconds, stage_size)
+                    hook('wait', max(elapsed - sum(seconds for stage, seconds, stage_size in timings), 0.), size)
+                if self.cache is not None:
+                    self.cache.put(key, analysis)
+
+            return analysis
+
+
+    def get_cache_key(self, key, session=False):
+
+        """
+        Key the analysis of an upload hashed as `key` by how it is made:
+        sessions and words, and analyses under any other setting that
+        changes them (the longest duration, whether longer uploads are cut,
+        the analysis rate and `multi_frame`), are cached apart (eg. in a
+        cache_dir shared by differently configured servers).
+        """
+
+        if session:
+            settings = ['session', self.session_max_duration]
+        else:
+            settings = ['word', self.max_duration, vowel.ANALYSIS_FS, 'multi' if self.multi_frame else 'single']
+        settings.append('truncate' if self.truncate else 'refuse')
+        return '%s-%s' % (key, '-'.join(str(setting) for setting in settings))
+
+
+    def analyze_samples(self, samples, fs, analysis_fs=vowel.ANALYSIS_FS):
+
+        """
+        Analyze a hump given as its own samples (see analyze_samples), eg.
+        of a streamed recording, in a worker. Takes a slot while doing so,
+        or raises PoolBusy. The samples, a hump's worth, are passed to the
+        worker directly.
+        """
+
+        slot = self.take_slot()
+        try:
+            return self.run(analyze_samples, (samples, fs, analysis_fs, self.timeout, self.multi_frame), slot)
+        finally:
+            self.release([slot])
+
+
+    def render(self, upload, fmt='png', hook=None):
+
+        """
+        Render diagnostics of an uploaded WAV as `fmt` (see
+        plot.render_diagnostics), from the image cache or the workers. A
+        cached analysis of the upload is drawn as it is, and one found
+        while rendering is cached. `hook` gets the 'upload', 'copy' and
+        'render' stages (see rate()), all sized in bytes of upload.
+        """
+
+        if fmt not in DIAGNOSTICS_FORMATS:
+            raise Exception('Format not supported. Must be one of: %s' % DIAGNOSTICS_FORMATS.keys())
+
+        with self.take_upload(upload, hook) as (key, size, slot, get_path):
+            key = self.get_cache_key(key)
+            image_key = '%s-%s' % (key, fmt)
+            image = self.images.get(image_key) if self.images is not None else None
+
+            if image is None:
+                path = get_path()
+                start = timeit.default_timer()
+                analysis = self.cache.get(key) if self.cache is not None else None
+                image, analysis = self.run(render_file, (path, analysis, fmt, self.timeout, self.max_duration, self.truncate, self.multi_frame), slot)
+                vowel.report_stage(hook, 'render', start, size)
+                if self.cache is not None:
+                    self.cache.put(key, analysis)
+                if self.images is not None:
+                    self.images.put(image_key, image)
+
+            return image
+
+
+    @contextlib.contextmanager
+    def take_upload(self, upload, hook=None, fs=None):
+
+        """
+        Take a slot (or raise PoolBusy) and hash an upload, checking it
+        against the sample rate stated by the client (`fs`), if any. Yields
+        the hash of the audio, its size, the slot and a function that
+        copies the upload to a file for the workers and returns its path.
+
+        The upload is only copied when that is called, ie. on a cache miss,
+        unless it cannot be read again, in which case it is copied as it is
+        hashed.
+        """
+
+        if fs is not None:
+            fs = vowel.validate_fs(fs)
+
+        slot = self.take_slot()
+        try:
+            start = timeit.default_timer()
+            seekable = rewind(upload)
+            if seekable:
+                key = hash_file(upload)
+                size = upload.tell()
+            else:
+                key, size = self.copy_upload(upload, slot)
+            vowel.report_stage(hook, 'upload', start, size)
+
+            if fs is not None:
+                file_fs = read_header(upload if seekable else self.paths[slot])['fs']
+                if file_fs != fs:
+                    raise Exception('Sample rate does not match the recording (%d Hz).' % file_fs)
+
+            def get_path():
+                if self.paths[slot] is None:
+                    start = timeit.default_timer()
+                    rewind(upload)
+                    self.copy_upload(upload, slot)
+                    vowel.report_stage(hook, 'copy', start, size)
+                return self.paths[slot]
+
+            yield key, size, slot, get_path
+        finally:
+            self.release([slot])
+
+
+    def copy_upload(self, upload, slot):
+
+        """
+        Copy an upload to a file for the workers, the slot's upload file
+        (see release). Returns the hash of the audio and its size.
+        """
+
+        with tempfile.NamedTemporaryFile(suffix='.wav', dir=SHARED_DIR, delete=False) as f:
+            self.paths[slot] = f.name
+            key = hash_file(upload, copy_to=f)
+            return key, f.tell()
+
+
+    def take_slot(self):
+        with self.lock:
+            if not self.free_slots:
+                raise PoolBusy('Server busy. Try again shortly.')
+            slot = self.free_slots.pop()
+            self.holders[slot] = 1
+            self.paths[slot] = None
+        self.job_started[slot] = 0
+        self.job_abandoned[slot] = 0
+        return slot
+
+
+    def release(self, slots):
+
+        """
+        Let go of slots, for their request or their job. The last to let go
+        of a slot frees it and removes its upload file.
+        """
+
+        paths = []
+        with self.lock:
+            for slot in slots:
+                self.holders[slot] -= 1
+                if not self.holders[slot]:
+                    paths.append(self.paths[slot])
+                    self.paths[slot] = None
+                    self.free_slots.append(slot)
+        for path in paths:
+            if path:
+                os.remove(path)
+
+
+    def analyze(self, path, slot, session=False):
+        if session:
+            return self.run(analyze_session_file, (path, self.timeout, self.session_max_duration, self.truncate), slot)
+        if self.batcher is None:
+            return self.run(analyze_file, (path, self.timeout, self.max_duration, self.truncate, self.multi_frame), slot)
+        return self.wait(self.batcher.submit(path, slot))
+
+
+    def run(self, func, args, slot):
+
+        """
+        Run a job in a worker for the request holding `slot` and wait for
+        its result.
+        """
+
+        request = make_request(slot)
+        self.start(func, args, [request])
+        return self.wait(request)
+
+
+    def start(self, func, args, requests, split=None):
+
+        """
+        Send a job to a worker for `requests` (see make_request), whose
+        slots it holds until done. The job's result is `split` into one per
+        request if given, otherwise every request gets it.
+        """
+
+        slots = [request['slot'] for request in requests]
+        with self.lock:
+            self.pending += 1
+            for slot in slots:
+                self.holders[slot] += 1
+                self.job_slots.append(slot)
+
+        def done(outcome):
+            result, error = outcome
+            results = split(result) if split is not None and error is None else [outcome] * len(requests)
+            with self.lock:
+                self.pending -= 1
+                for slot in slots:
+                    self.job_slots.remove(slot)
+            self.release(slots)
+            for request, request_result in zip(requests, results):
+                request['result'] = request_result
+                request['done'].set()
+
+        self.pool.apply_async(run_job, (slots, func, args), callback=done)
+
+
+    def wait(self, request):
+
+        """
+        Wait for the result of a request's job, raising its error: for a
+        worker to start it (see get_start_wait), then for the job timeout
+        and some (see get_wait). A job given up on before it started is
+        skipped (see run_job).
+        """
+
+        done = request['done']
+        slot = request['slot']
+        wait = self.get_wait()
+
+        if wait is not None:
+            deadline = timeit.default_timer() + self.get_start_wait()
+            while not self.job_started[slot] and not done.is_set():
+                remaining = deadline - timeit.default_timer()
+                if remaining <= 0:
+                    break
+                done.wait(min(remaining, START_POLL_SEC))
+            if self.job_started[slot]:
+                done.wait(max(self.job_started[slot] + wait - time.time(), 0))
+
+        if not done.wait(None if wait is None else 0):
+            self.job_abandoned[slot] = 1
+            raise JobTimeout('Rating timed out.')
+
+        result, error = request['result']
+        if error is not None:
+            raise error
+        return result
+
+
+    def get_wait(self):
+
+        """
+        Get how long to wait for a job's result once a worker started it:
+        the job timeout and some.
+        """
+
+        return self.timeout + TIMEOUT_GRACE_SEC if self.timeout else None
+
+
+    def get_start_wait(self):
+
+        """
+        Get how long to wait for a worker to start a job: as long as the
+        jobs that can be ahead of it, one per other slot, take at most.
+        """
+
+        return self.get_wait() * ((self.workers + self.queue_size) // self.workers)
+
+
+    def get_in_flight(self):
+
+        """
+        Get the number of workers busy with a job.
+        """
+
+        return min(self.pending, self.workers)
+
+
+    def get_queue_depth(self):
+
+        """
+        Get the number of requests waiting for a worker: collected for a
+        batch, or in a job no worker has started yet.
+        """
+
+        with self.lock:
+            depth = sum(1 for slot in self.job_slots if not self.job_started[slot])
+        if self.batcher is not None:
+            depth += self.batcher.get_queue_depth()
+        return depth
+
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        self.pool.terminate()
+        self.pool.join()